@@ -39,6 +39,12 @@ balena = Balena({
     "request_limit": str(300), # the number of requests per request_limit_interval that the SDK should respect, defaults to unlimited.
     "request_limit_interval": str(60), # the timespan that the request_limit should apply to in seconds, defaults to 60s (1 minute).
     "retry_rate_limited_request": False, # awaits and retry once a request is rate limited (429)
+    "request_compression_threshold": str(64 * 1024), # gzip request bodies of at least this size in bytes, defaults to never.
+    "response_cache_size": str(16 * 1024 * 1024), # memory used to cache GET responses for revalidation, 0 disables it.
+    "response_cache_on_disk": False, # also cache GET responses under the cache_directory, shared by all processes.
+    "resource_cache_enabled": False, # serve rarely changing resources from a cache under the cache_directory.
+    "resource_cache_size": str(64 * 1024 * 1024), # disk used by the resource cache.
+    "image_cache_size": str(4 * 1024 * 1024 * 1024), # disk used to cache downloaded OS images, see image_cache_time.
 })
 ```
 
@@ -74,6 +80,41 @@ If you would like the SDK to use this header and wait and automatically retry th
 balena = Balena({"retry_rate_limited_request": True})
 ```
 
+API responses are always requested compressed. Large request bodies (e.g. bulk updates) can be
+gzipped as well by setting `request_compression_threshold`, and the bandwidth savings can be checked with:
+
+```python
+balena.pine.get_transfer_stats()
+```
+
+GET responses that carry an ETag or Last-Modified header are cached and revalidated with conditional requests,
+so unchanged resources are answered with a 304 and no body. Cached responses are never used without revalidation.
+
+Resources that (almost) never change, like device types, cpu architectures, membership roles, final releases and
+images, and OS host apps, can in addition be kept in a persistent cache under the cache_directory by enabling
+`resource_cache_enabled`. They are then served without any request until they expire (after an hour to a week,
+depending on the resource), so changes made by other clients, e.g. the dashboard, are not seen until then.
+Only writes done through the SDK drop the affected entries. The caches can be dropped with:
+
+```python
+balena.pine.clear_cache()
+```
+
+OS images that are flashed over and over can be kept in a local image cache under the cache_directory, keyed by
+device type, version and configuration, so they are only downloaded once every `image_cache_time`:
+
+```python
+path = balena.models.os.get_cached_image("raspberrypi3", "latest", {"developmentMode": True})
+```
+
+Many small independent pine operations can be grouped in OData $batch requests, their results are futures that
+are resolved when leaving the block:
+
+```python
+with balena.pine.batch() as batch:
+    notes = [batch.patch({"resource": "release", "id": id, "body": {"note": "tested"}}) for id in release_ids]
+```
+
 If you feel something is missing, not clear or could be improved, [please don't
 hesitate to open an issue in GitHub](https://github.com/balena-io/balena-sdk-python/issues), we'll be happy to help.
 """  # noqa: E501
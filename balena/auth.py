@@ -1,5 +1,6 @@
 from . import exceptions
 from .balena_auth import request
+from .http_cache import get_response_cache
 from .settings import Settings
 from typing import TypedDict, Optional, Literal, Union, cast
 from typing_extensions import Unpack
@@ -77,6 +78,16 @@ class Auth:
 
         return self._actor_details_cache
 
+    def __clear_caches(self) -> None:
+        """
+        Drop the details and the cached responses of the previous actor.
+        """
+        self._actor_details_cache = None
+        self._user_actor_id_cache = None
+        response_cache = get_response_cache(self.__settings)
+        if response_cache is not None:
+            response_cache.clear()
+
     def whoami(self) -> Optional[WhoamiResult]:
         """
         Return current logged in username.
@@ -135,8 +146,7 @@ class Auth:
             ... balena.auth.login(username='<your email>', password='<your password>')
         """
         token = self.authenticate(**credentials)
-        self._actor_details_cache = None
-        self._user_actor_id_cache = None
+        self.__clear_caches()
         self.__settings.set(TOKEN_KEY, token)
 
     def login_with_token(self, token: str) -> None:
@@ -157,8 +167,7 @@ class Auth:
             >>> balena.auth.login_with_token(auth_token)
 
         """
-        self._actor_details_cache = None
-        self._user_actor_id_cache = None
+        self.__clear_caches()
         self.__settings.set(TOKEN_KEY, token)
 
     def is_logged_in(self) -> bool:
@@ -244,8 +253,7 @@ class Auth:
             # If you are logged in.
             >>> balena.auth.logout()
         """
-        self._actor_details_cache = None
-        self._user_actor_id_cache = None
+        self.__clear_caches()
         self.__settings.remove(TOKEN_KEY)
 
     def register(self, **creentials: Unpack[CredentialsType]) -> str:
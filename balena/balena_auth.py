@@ -1,12 +1,14 @@
 import os
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 from urllib.parse import urljoin
 
 import jwt
 import requests
 
 from . import exceptions
+from .codec import decode_body
+from .http_cache import get_response_cache
 from .settings import Settings
 import balena
 
@@ -66,6 +68,7 @@ def request(
     return_raw: bool = False,
     stream: bool = False,
     send_token: bool = True,
+    headers: Optional[Dict[str, str]] = None,
 ) -> Any:
     if endpoint is None:
         endpoint = settings.get("api_endpoint")
@@ -78,20 +81,41 @@ def request(
     if token is None and send_token:
         raise exceptions.NotLoggedIn()
     try:
-        headers = {"X-Balena-Client": f"balena-python-sdk/{balena.__version__}"}
+        headers = {**(headers or {}), "X-Balena-Client": f"balena-python-sdk/{balena.__version__}"}
         if send_token:
             headers["Authorization"] = f"Bearer {token}"
 
+        cache = None
+        cached = None
+        if method == "GET" and not return_raw and not stream:
+            cache = get_response_cache(settings)
+        if cache is not None:
+            url = requests.Request(method, url, params=qs).prepare().url or url
+            qs = None
+            cached = cache.get(token, url)
+            if cached is not None:
+                headers.update(cached.get_validators())
+
         req = requests.request(method=method, url=url, params=qs, json=body, headers=headers, stream=stream)
 
         if return_raw:
             return req
 
-        try:
-            return req.json()
-        except Exception:
-            return req.content.decode()
-
+        if cache is not None:
+            if req.status_code == 304 and cached is not None:
+                content = cached.body
+            else:
+                content = req.content
+                if req.ok:
+                    cache.put(token, url, req.headers.get("etag"), req.headers.get("last-modified"), content)
+        else:
+            content = req.content
+
+        return decode_body(content)
+
+    except requests.RequestException:
+        # network errors are not authentication errors, callers may retry them
+        raise
     except Exception as e:
         if not send_token:
             raise e
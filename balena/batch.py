@@ -0,0 +1,272 @@
+import json
+import re
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pine_client.client import Params
+from requests.utils import requote_uri
+
+from .codec import decode_body
+from .exceptions import RequestError
+
+# Operations sent per $batch request
+DEFAULT_BATCH_SIZE = 100
+
+BOUNDARY_PATTERN = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+STATUS_LINE_PATTERN = re.compile(r"^HTTP/\d(?:\.\d)?\s+(\d{3})")
+
+# An operation of a batch: method, path of the URL and body
+BatchRequest = Tuple[str, str, Optional[Any]]
+# The response of an operation of a batch: status code and body
+BatchResponse = Tuple[int, bytes]
+# Sends the encoded operations of a batch and returns the content type and content of the response
+SendBatch = Callable[[bytes, str], Tuple[str, bytes]]
+
+
+def encode_batch(operations: List[BatchRequest], boundary: str) -> bytes:
+    """
+    Encode operations as the multipart/mixed body of an OData $batch request, one application/http part per
+    operation, identified by its index in the Content-ID header.
+    """
+    parts = []
+    for index, (method, path, body) in enumerate(operations):
+        lines = [
+            f"--{boundary}",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            f"Content-ID: {index}",
+            "",
+            f"{method} {requote_uri(path)} HTTP/1.1",
+            "Accept: application/json",
+        ]
+        content = b""
+        if body is not None:
+            content = json.dumps(body, allow_nan=False).encode()
+            lines.append("Content-Type: application/json")
+        lines += ["", ""]
+        parts.append("\r\n".join(lines).encode() + content + b"\r\n")
+    return b"".join(parts) + f"--{boundary}--\r\n".encode()
+
+
+def _split_headers(content: bytes) -> Tuple[List[str], bytes]:
+    for separator in (b"\r\n\r\n", b"\n\n"):
+        head, found, body = content.partition(separator)
+        if found:
+            return head.decode("latin-1").splitlines(), body
+    return content.decode("latin-1").splitlines(), b""
+
+
+def _get_header(headers: List[str], name: str) -> Optional[str]:
+    for header in headers:
+        key, _, value = header.partition(":")
+        if key.strip().lower() == name:
+            return value.strip()
+    return None
+
+
+def decode_batch(content_type: str, content: bytes) -> List[Tuple[Optional[str], BatchResponse]]:
+    """
+    Decode the multipart/mixed body of an OData $batch response, including the responses nested in change sets.
+
+    Returns:
+        List[Tuple[Optional[str], BatchResponse]]: the Content-ID and response of every operation, in order.
+    """
+    match = BOUNDARY_PATTERN.search(content_type)
+    if match is None:
+        raise RequestError(body=f"Invalid batch response: {content_type}", status_code=200)
+
+    delimiter = f"--{match.group(1)}".encode()
+    responses: List[Tuple[Optional[str], BatchResponse]] = []
+    # the first chunk is the preamble, and the last delimiter is followed by "--" and the epilogue
+    for part in content.split(delimiter)[1:]:
+        if part.startswith(b"--"):
+            break
+        # the line break before a delimiter belongs to the delimiter
+        part = part[2:] if part.startswith(b"\r\n") else part.lstrip(b"\n")
+        part = part[:-2] if part.endswith(b"\r\n") else part
+        part_headers, part_body = _split_headers(part)
+
+        part_type = _get_header(part_headers, "content-type") or ""
+        if part_type.lower().startswith("multipart/"):
+            responses += decode_batch(part_type, part_body)
+            continue
+
+        response_head, response_body = _split_headers(part_body)
+        status = STATUS_LINE_PATTERN.match(response_head[0] if response_head else "")
+        if status is None:
+            raise RequestError(body=f"Invalid batch response part: {part_body[:100]!r}", status_code=200)
+        content_id = _get_header(part_headers, "content-id") or _get_header(response_head, "content-id")
+        responses.append((content_id, (int(status.group(1)), response_body)))
+    return responses
+
+
+class _Operation:
+    def __init__(
+        self,
+        method: str,
+        params: Params,
+        future: "Future[Any]",
+        transform: Callable[[Any], Any],
+        on_error: Optional[Callable[[RequestError], bool]] = None,
+    ):
+        self.method = method
+        self.params = params
+        self.future = future
+        self.transform = transform
+        # handles a failed operation, returns whether it was handled e.g. by queueing another one
+        self.on_error = on_error
+
+
+class PineBatch:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    Collects pine operations and sends them in OData $batch requests of up to `max_size` operations once the
+    batch is flushed, which happens when leaving its `with` block. Every operation returns a future, resolved
+    with the same result the pine client would have returned, or failed with the RequestError of the operation.
+    Upserts that hit an existing resource are patched in a follow-up batch.
+    The operations of a batch are independent, they are neither ordered nor atomic.
+    """
+
+    def __init__(
+        self,
+        compile_path: Callable[[Params], str],
+        send: SendBatch,
+        transform_get_result: Callable[[Params], Callable[[Any], Any]],
+        on_write: Callable[[str], None],
+        max_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.__compile_path = compile_path
+        self.__send = send
+        self.__transform_get_result = transform_get_result
+        self.__on_write = on_write
+        self.__max_size = max(1, max_size)
+        self.__pending: List[_Operation] = []
+
+    def __enter__(self) -> "PineBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            for operation in self.__pending:
+                operation.future.cancel()
+            self.__pending = []
+
+    def __queue(
+        self,
+        method: str,
+        params: Params,
+        transform: Callable[[Any], Any] = lambda result: result,
+        on_error: Optional[Callable[[RequestError], bool]] = None,
+        future: Optional["Future[Any]"] = None,
+    ) -> "Future[Any]":
+        if future is None:
+            future = Future()
+        self.__pending.append(_Operation(method, params, future, transform, on_error))
+        return future
+
+    def get(self, params: Params) -> "Future[Any]":
+        return self.__queue("GET", params, self.__transform_get_result(params))
+
+    def post(self, params: Params) -> "Future[Any]":
+        return self.__queue("POST", params)
+
+    def put(self, params: Params) -> "Future[Any]":
+        return self.__queue("PUT", params)
+
+    def patch(self, params: Params) -> "Future[Any]":
+        return self.__queue("PATCH", params)
+
+    def delete(self, params: Params) -> "Future[Any]":
+        return self.__queue("DELETE", params)
+
+    def upsert(self, params: Params) -> "Future[Any]":
+        natural_key = params.get("id")
+        body = params.get("body")
+        if not isinstance(natural_key, dict) or len(natural_key) == 0:
+            raise Exception("The id property must be an object with the natural key of the model")
+        if body is None:
+            raise Exception("The body property is missing")
+
+        remaining_params = {k: v for k, v in params.items() if k not in ("id", "body")}
+        future: "Future[Any]" = Future()
+
+        def patch_existing(error: RequestError) -> bool:
+            # same as the pine client, a unique constraint violation means the resource exists
+            if error.status_code != 409 or not re.search(r"unique", error.message, re.IGNORECASE):
+                return False
+            options = remaining_params.get("options", {})
+            dollar_filter = (
+                natural_key if options.get("$filter") is None else {"$and": [options["$filter"], natural_key]}
+            )
+            self.__queue(
+                "PATCH",
+                {**remaining_params, "options": {**options, "$filter": dollar_filter}, "body": body},
+                future=future,
+            )
+            return True
+
+        return self.__queue(
+            "POST", {**remaining_params, "body": {**natural_key, **body}}, on_error=patch_existing, future=future
+        )
+
+    def flush(self) -> None:
+        """
+        Send the pending operations, and the follow-up ones they lead to, and resolve their futures.
+        A failure of a whole $batch request fails the futures of its operations and is raised.
+        """
+        while self.__pending:
+            size = self.__max_size
+            operations = self.__pending[:size]
+            del self.__pending[:size]
+            try:
+                self.__send_operations(operations)
+            except Exception:
+                for operation in self.__pending:
+                    operation.future.cancel()
+                self.__pending = []
+                raise
+
+    def __send_operations(self, operations: List[_Operation]) -> None:
+        requests = [
+            (operation.method, self.__compile_path(operation.params), operation.params.get("body"))
+            for operation in operations
+        ]
+        boundary = f"batch_{uuid.uuid4().hex}"
+        try:
+            content_type, content = self.__send(
+                encode_batch(requests, boundary), f"multipart/mixed; boundary={boundary}"
+            )
+            responses = decode_batch(content_type, content)
+        except Exception as e:
+            for operation in operations:
+                operation.future.set_exception(e)
+            raise
+        finally:
+            for method, path, _ in requests:
+                if method != "GET":
+                    self.__on_write(path)
+
+        responses_by_id: Dict[str, BatchResponse] = {}
+        for index, (content_id, response) in enumerate(responses):
+            responses_by_id[content_id if content_id is not None else str(index)] = response
+
+        for index, operation in enumerate(operations):
+            response = responses_by_id.get(str(index))
+            if response is None:
+                operation.future.set_exception(RequestError(body="Missing batch response", status_code=500))
+                continue
+
+            status_code, body = response
+            try:
+                if status_code >= 400:
+                    error = RequestError(body=body.decode(errors="replace"), status_code=status_code)
+                    if operation.on_error is None or not operation.on_error(error):
+                        raise error
+                    continue
+                operation.future.set_result(operation.transform(decode_body(body)))
+            except Exception as e:
+                operation.future.set_exception(e)
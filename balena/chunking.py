@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+from pine_client.utils import escape_value
+from requests.utils import requote_uri
+
+from . import exceptions
+
+# Longest URL sent for a chunk, well below the limits of the usual proxies and servers
+DEFAULT_MAX_URL_LENGTH = 4096
+# Chunks requested at once
+DEFAULT_CHUNK_CONCURRENCY = 4
+
+
+def get_url_length(url: str) -> int:
+    """
+    Length of a URL once it is percent-encoded for the wire.
+    """
+    return len(requote_uri(url))
+
+
+def chunk_by_url_length(
+    values: List[Any], get_chunk_url_length: Callable[[List[Any]], int], max_url_length: int = DEFAULT_MAX_URL_LENGTH
+) -> List[List[Any]]:
+    """
+    Split the values of an `$in` filter into chunks whose request URL fits `max_url_length`.
+    The chunks are packed from the encoded length of each value, and the URL of every chunk is checked once,
+    splitting the ones that still do not fit. A single value is never split, even if its URL is too long.
+    """
+    if not values:
+        return []
+
+    # the values of an $in filter are joined with ", "
+    value_lengths = [get_url_length(f", {escape_value(value)}") for value in values]
+    base_length = get_chunk_url_length(values[:1]) - value_lengths[0]
+
+    chunks: List[List[Any]] = []
+    chunk: List[Any] = []
+    length = base_length
+    for value, value_length in zip(values, value_lengths):
+        if chunk and length + value_length > max_url_length:
+            chunks.append(chunk)
+            chunk = []
+            length = base_length
+        chunk.append(value)
+        length += value_length
+    chunks.append(chunk)
+
+    fitting: List[List[Any]] = []
+    while chunks:
+        chunk = chunks.pop(0)
+        if len(chunk) > 1 and get_chunk_url_length(chunk) > max_url_length:
+            half = len(chunk) // 2
+            chunks[:0] = [chunk[:half], chunk[half:]]
+        else:
+            fitting.append(chunk)
+    return fitting
+
+
+def run_in_chunks(
+    request_chunk: Callable[[List[Any]], Any],
+    chunks: List[List[Any]],
+    concurrency: int = DEFAULT_CHUNK_CONCURRENCY,
+) -> List[Any]:
+    """
+    Request every chunk, at most `concurrency` at once, and return their results in the order of the chunks.
+    The failure of a lone chunk is raised as is. With several chunks, all of them are requested and their failures,
+    even a single one, are raised together in a ChunkedRequestError, along with the results of the other chunks.
+    """
+    if len(chunks) <= 1:
+        return [request_chunk(chunk) for chunk in chunks]
+
+    results = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+        futures = [executor.submit(request_chunk, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append((chunk, e))
+
+    if errors:
+        raise exceptions.ChunkedRequestError(errors, results, len(chunks))
+    return results
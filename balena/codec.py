@@ -0,0 +1,62 @@
+"""
+JSON decoding of API response bodies and log lines.
+
+The fastest installed decoder is used automatically (orjson, available through the
+`balena-sdk[fast-json]` extra), falling back to the standard library json module.
+Bodies are decoded straight from bytes, without building an intermediate str.
+The logs history, decoded item by item as it is received, always uses the json module.
+"""
+
+import json
+from typing import Any, Callable, Optional, Union
+
+JsonDecoder = Callable[[Union[bytes, str]], Any]
+
+
+def __get_default_decoder() -> JsonDecoder:
+    try:
+        import orjson
+
+        return orjson.loads
+    except ImportError:
+        return json.loads
+
+
+__decoder: JsonDecoder = __get_default_decoder()
+
+
+def get_json_decoder() -> JsonDecoder:
+    """
+    Get the decoder currently used for API responses and log lines.
+    Decoders take bytes (or str) and raise a ValueError on invalid input.
+    """
+    return __decoder
+
+
+def set_json_decoder(decoder: Optional[JsonDecoder] = None) -> None:
+    """
+    Replace the decoder used for API responses and log lines.
+
+    Args:
+        decoder (Optional[JsonDecoder]): a callable that decodes JSON from bytes (or str)
+            and raises a ValueError on invalid input, None restores the default decoder.
+
+    Examples:
+        >>> import ujson
+        >>> from balena.codec import set_json_decoder
+        >>> set_json_decoder(ujson.loads)
+    """
+    global __decoder
+    __decoder = decoder if decoder is not None else __get_default_decoder()
+
+
+def decode_json(data: Union[bytes, str]) -> Any:
+    return __decoder(data)
+
+
+def decode_body(content: bytes) -> Any:
+    # API responses that are not JSON, e.g. "OK", are returned as text
+    try:
+        return __decoder(content)
+    except Exception:
+        return content.decode()
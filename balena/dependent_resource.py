@@ -1,5 +1,6 @@
 from typing import Any, Callable, Generic, List, Optional, TypeVar
 
+from . import exceptions
 from .pine import PineClient
 from .types import AnyObject
 from .utils import is_id, merge
@@ -32,7 +33,30 @@ class DependentResource(Generic[T]):
             }
         )
 
+    def __get_parent_ids(self, parent_ids: List[int]) -> List[int]:
+        for parent_id in parent_ids:
+            if not is_id(parent_id):
+                raise exceptions.InvalidParameter(self.parent_resource_name, parent_id)
+        return list(dict.fromkeys(parent_ids))
+
     def _get_all_by_parent(self, parent_param: Any, options: AnyObject = {}) -> List[T]:
+        if isinstance(parent_param, list):
+            # the resources of many parents are fetched with chunked $in filters
+            return self.__pine.chunked(
+                "get",
+                self.__get_parent_ids(parent_param),
+                lambda chunk: {
+                    "resource": self.resource_name,
+                    "options": merge(
+                        {
+                            "$filter": {self.parent_resource_name: {"$in": chunk}},
+                            "$orderby": f"{self.resource_key_field} asc",
+                        },
+                        options,
+                    ),
+                },
+            )
+
         parent_id = parent_param if is_id(parent_param) else self.get_resource_id(parent_param)
 
         get_options = {
@@ -71,6 +95,17 @@ class DependentResource(Generic[T]):
         )
 
     def _remove(self, parent_param: Any, key: str) -> None:
+        if isinstance(parent_param, list):
+            self.__pine.chunked(
+                "delete",
+                self.__get_parent_ids(parent_param),
+                lambda chunk: {
+                    "resource": self.resource_name,
+                    "options": {"$filter": {self.parent_resource_name: {"$in": chunk}, self.resource_key_field: key}},
+                },
+            )
+            return
+
         parent_id = parent_param if is_id(parent_param) else self.get_resource_id(parent_param)
 
         dollar_filter = {self.parent_resource_name: parent_id, self.resource_key_field: key}
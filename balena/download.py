@@ -0,0 +1,226 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Any, Callable, List, Optional, Tuple
+
+import requests
+
+from . import exceptions
+
+# Number of parallel range requests
+DEFAULT_SEGMENTS = 4
+# Segments are not split below this size
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# The progress of the segments is persisted every time this many bytes have been written
+STATE_SAVE_INTERVAL = 16 * 1024 * 1024
+MAX_SEGMENT_RETRIES = 5
+MAX_RETRY_DELAY = 30
+
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes\s+(\d+)-(\d+)/(\d+|\*)$")
+
+# Called with the number of bytes downloaded so far and the total size, if known
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+# Opens a streamed response for an inclusive byte range
+OpenStream = Callable[[Tuple[int, int]], requests.Response]
+
+
+def _get_total_size(response: requests.Response) -> Optional[int]:
+    if response.status_code == 206:
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get("content-range", ""))
+        if match is not None and match.group(3) != "*":
+            return int(match.group(3))
+        return None
+
+    content_length = response.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and not response.headers.get("content-encoding"):
+        return int(content_length)
+    return None
+
+
+def _check_response(response: requests.Response) -> None:
+    if not response.ok:
+        raise exceptions.RequestError(body=response.content.decode(errors="replace"), status_code=response.status_code)
+
+
+class RangedDownload:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    Downloads a file with parallel HTTP range requests into a preallocated `<path>.part` file, and keeps the
+    progress of every segment in `<path>.part.json`, so that an interrupted download resumes where it stopped.
+    Segments that fail are retried from where they stopped. Servers that do not honor range requests get a
+    single sequential download, which starts over when interrupted.
+    The file is only moved to `path` once it is complete, and when `verify_size` is set once its size matches
+    the total announced by the server (Content-Range or Content-Length). The `estimated_size` is only used to
+    report the progress of downloads whose total is not announced.
+    """
+
+    def __init__(
+        self,
+        open_stream: OpenStream,
+        path: str,
+        key: str,
+        segments: int = DEFAULT_SEGMENTS,
+        progress: Optional[ProgressCallback] = None,
+        verify_size: bool = True,
+        estimated_size: Optional[int] = None,
+    ):
+        self.__open_stream = open_stream
+        self.__path = path
+        self.__part_path = f"{path}.part"
+        self.__state_path = f"{path}.part.json"
+        self.__key = key
+        self.__segments = max(1, segments)
+        self.__progress = progress
+        self.__verify_size = verify_size
+        self.__estimated_size = estimated_size
+
+        self.__lock = Lock()
+        self.__failed = Event()
+        self.__total: Optional[int] = None
+        self.__ranges: List[List[int]] = []
+        self.__downloaded = 0
+        self.__unsaved = 0
+
+    def run(self) -> int:
+        """
+        Returns:
+            int: size of the downloaded file.
+        """
+        ranges = self.__load_state()
+        if ranges is not None:
+            self.__ranges = ranges
+            self.__downloaded = sum(next_byte - start for start, _, next_byte in ranges)
+            self.__run_segments()
+        else:
+            # the probe response is the whole file when the server does not honor range requests
+            response = self.__open_stream((0, 0))
+            with response:
+                _check_response(response)
+                self.__total = _get_total_size(response)
+                if response.status_code == 206 and self.__total is not None:
+                    self.__create_part_file(self.__total)
+                    self.__ranges = self.__split(self.__total)
+                    self.__save_state()
+                else:
+                    self.__download_sequentially(response)
+
+            if self.__ranges:
+                self.__run_segments()
+
+        size = os.path.getsize(self.__part_path)
+        if self.__verify_size and self.__total is not None and size != self.__total:
+            raise exceptions.OsDownloadError(f"downloaded {size} bytes instead of {self.__total}")
+
+        os.replace(self.__part_path, self.__path)
+        self.__remove_state()
+        return size
+
+    def __load_state(self) -> Optional[List[List[int]]]:
+        try:
+            with open(self.__state_path) as f:
+                state = json.load(f)
+            if state["key"] != self.__key or os.path.getsize(self.__part_path) != state["total"]:
+                return None
+            self.__total = int(state["total"])
+            return [[int(start), int(end), int(next_byte)] for start, end, next_byte in state["ranges"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def __save_state(self) -> None:
+        tmp_path = f"{self.__state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": self.__key, "total": self.__total, "ranges": self.__ranges}, f)
+        os.replace(tmp_path, self.__state_path)
+        self.__unsaved = 0
+
+    def __remove_state(self) -> None:
+        try:
+            os.remove(self.__state_path)
+        except OSError:
+            pass
+
+    def __create_part_file(self, total: int) -> None:
+        with open(self.__part_path, "wb") as f:
+            try:
+                os.posix_fallocate(f.fileno(), 0, total)  # type: ignore[attr-defined]
+            except (AttributeError, OSError):
+                f.truncate(total)
+
+    def __split(self, total: int) -> List[List[int]]:
+        count = max(1, min(self.__segments, total // MIN_SEGMENT_SIZE))
+        size = -(-total // count)
+        return [[start, min(start + size, total) - 1, start] for start in range(0, total, size)]
+
+    def __advance(self, written: int) -> None:
+        with self.__lock:
+            self.__downloaded += written
+            self.__unsaved += written
+            if self.__ranges and self.__unsaved >= STATE_SAVE_INTERVAL:
+                self.__save_state()
+            if self.__progress is not None:
+                self.__progress(self.__downloaded, self.__total if self.__total is not None else self.__estimated_size)
+
+    def __download_sequentially(self, response: requests.Response) -> None:
+        self.__remove_state()
+        with open(self.__part_path, "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                self.__advance(len(chunk))
+
+    def __run_segments(self) -> None:
+        pending = [segment for segment in self.__ranges if segment[2] <= segment[1]]
+        try:
+            if pending:
+                with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                    for future in [executor.submit(self.__download_segment, segment) for segment in pending]:
+                        future.result()
+        finally:
+            with self.__lock:
+                self.__save_state()
+
+    def __download_segment(self, segment: List[int]) -> None:
+        retries = 0
+        with open(self.__part_path, "r+b", buffering=0) as f:
+            while segment[2] <= segment[1] and not self.__failed.is_set():
+                start = segment[2]
+                try:
+                    self.__download_range(f, segment)
+                    if segment[2] == start and not self.__failed.is_set():
+                        raise exceptions.OsDownloadError("the server returned an empty range")
+                except (requests.RequestException, exceptions.RequestError, exceptions.OsDownloadError) as e:
+                    # only attempts that made no progress count towards the retry limit
+                    retries = 1 if segment[2] > start else retries + 1
+                    if retries > MAX_SEGMENT_RETRIES:
+                        self.__failed.set()
+                        if isinstance(e, exceptions.BalenaException):
+                            raise
+                        raise exceptions.OsDownloadError(str(e))
+                    time.sleep(min(2**retries, MAX_RETRY_DELAY))
+                except BaseException:
+                    self.__failed.set()
+                    raise
+
+    def __download_range(self, f: Any, segment: List[int]) -> None:
+        response = self.__open_stream((segment[2], segment[1]))
+        with response:
+            _check_response(response)
+            if response.status_code != 206:
+                raise exceptions.OsDownloadError("the server stopped honoring range requests")
+
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if self.__failed.is_set():
+                    return
+                chunk = chunk[: segment[1] - segment[2] + 1]
+                f.seek(segment[2])
+                f.write(chunk)
+                # a single writer per segment, the lock only guards the persisted state
+                segment[2] += len(chunk)
+                self.__advance(len(chunk))
+                if segment[2] > segment[1]:
+                    return
@@ -455,6 +455,46 @@ class OsUpdateError(BalenaException):
         self.message = Message.OS_UPDATE_ERROR.format(message=message)
 
 
+class OsDownloadError(BalenaException):
+    """
+
+    Args:
+        message (str): message.
+
+    Attributes:
+        message (str): error message.
+
+    """
+
+    def __init__(self, message):
+        super(OsDownloadError, self).__init__()
+        self.message = Message.OS_DOWNLOAD_ERROR.format(message=message)
+
+
+class ChunkedRequestError(BalenaException):
+    """
+    Exception type for requests split in chunks, some of which failed.
+
+    Args:
+        errors (List[Tuple[List[Any], Exception]]): the values of every failed chunk, with its error.
+        results (List[Any]): results of the chunks that succeeded.
+        total (int): number of chunks.
+
+    Attributes:
+        message (str): error message.
+
+    """
+
+    def __init__(self, errors, results, total):
+        super(ChunkedRequestError, self).__init__()
+        first_error = errors[0][1]
+        self.message = Message.CHUNKED_REQUEST_ERROR.format(
+            failed=len(errors), total=total, message=getattr(first_error, "message", str(first_error))
+        )
+        self.errors = errors
+        self.results = results
+
+
 class BuilderRequestError(BalenaException):
     """
     Args:
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import os.path as Path
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, NamedTuple, Optional, cast
+from weakref import WeakKeyDictionary
+
+from .exceptions import InvalidOption
+from .resource_cache import get_cache_scope
+from .settings import Settings, is_enabled
+
+# Default size of the in memory tier, in bytes of cached bodies
+DEFAULT_RESPONSE_CACHE_SIZE = 16 * 1024 * 1024
+
+# Bodies bigger than this fraction of the in memory tier are only kept on disk
+MAX_ENTRY_FRACTION = 4
+
+
+class CachedResponse(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: bytes
+
+    def get_validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    Stores the bodies of GET responses along with their validators (ETag / Last-Modified) so they can
+    be revalidated with conditional requests. Entries are never served without revalidation, a 304
+    response costs no body transfer.
+    Entries are keyed by the actor scope of the token (see `get_cache_scope`) and the url, since a
+    304 does not tell whether the cached body is one the actor may see. The in memory tier is dropped
+    whenever the scope changes.
+    The in memory tier is a LRU bounded by the total size of the bodies, the optional disk tier stores
+    one file per key and is safe to share between processes.
+    """
+
+    def __init__(self, max_size: int, directory: Optional[str] = None):
+        self.__max_size = max_size
+        self.__size = 0
+        self.__entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.__lock = Lock()
+        self.__directory = directory
+        self.__scope: Optional[str] = None
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __path(self, key: str) -> str:
+        return Path.join(cast(str, self.__directory), hashlib.sha256(key.encode()).hexdigest())
+
+    def __remember(self, key: str, response: CachedResponse) -> None:
+        previous = self.__entries.pop(key, None)
+        if previous is not None:
+            self.__size -= len(previous.body)
+
+        if len(response.body) * MAX_ENTRY_FRACTION > self.__max_size:
+            return
+
+        self.__entries[key] = response
+        self.__size += len(response.body)
+        while self.__size > self.__max_size:
+            _, evicted = self.__entries.popitem(last=False)
+            self.__size -= len(evicted.body)
+
+    def __read(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(self.__path(key), "rb") as f:
+                stored_key, etag, last_modified = f.readline().decode().rstrip("\n").split("\t")
+                if stored_key != key:
+                    return None
+                return CachedResponse(etag or None, last_modified or None, f.read())
+        except (OSError, ValueError):
+            return None
+
+    def __write(self, key: str, response: CachedResponse) -> None:
+        # write to a temporary file and move it in place, concurrent readers see either version
+        directory = cast(str, self.__directory)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(f"{key}\t{response.etag or ''}\t{response.last_modified or ''}\n".encode())
+                f.write(response.body)
+            os.replace(tmp_path, self.__path(key))
+        except OSError:
+            pass
+
+    def __key(self, token: Optional[str], url: str) -> str:
+        scope = get_cache_scope(token)
+        with self.__lock:
+            if scope != self.__scope:
+                self.__entries.clear()
+                self.__size = 0
+                self.__scope = scope
+        return f"{scope} {url}"
+
+    def get(self, token: Optional[str], url: str) -> Optional[CachedResponse]:
+        key = self.__key(token, url)
+        with self.__lock:
+            response = self.__entries.get(key)
+            if response is not None:
+                self.__entries.move_to_end(key)
+                return response
+
+        if self.__directory is None:
+            return None
+
+        response = self.__read(key)
+        if response is not None:
+            with self.__lock:
+                self.__remember(key, response)
+        return response
+
+    def put(
+        self, token: Optional[str], url: str, etag: Optional[str], last_modified: Optional[str], body: bytes
+    ) -> None:
+        if etag is None and last_modified is None:
+            self.discard(token, url)
+            return
+
+        key = self.__key(token, url)
+        response = CachedResponse(etag, last_modified, body)
+        with self.__lock:
+            self.__remember(key, response)
+
+        if self.__directory is not None:
+            self.__write(key, response)
+
+    def discard(self, token: Optional[str], url: str) -> None:
+        key = self.__key(token, url)
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__size -= len(previous.body)
+
+        if self.__directory is not None:
+            try:
+                os.remove(self.__path(key))
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """
+        Drop all the entries, including the ones of the disk tier, e.g. on logout.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+
+        if self.__directory is not None:
+            try:
+                names = os.listdir(self.__directory)
+            except OSError:
+                names = []
+            for name in names:
+                try:
+                    os.remove(Path.join(self.__directory, name))
+                except OSError:
+                    pass
+
+
+__caches: "WeakKeyDictionary[Settings, Optional[ResponseCache]]" = WeakKeyDictionary()
+__caches_lock = Lock()
+
+
+def get_response_cache(settings: Settings) -> Optional[ResponseCache]:
+    """
+    Get the response cache shared by all the requests done with these settings,
+    None if it is disabled (`response_cache_size` set to 0).
+    The disk tier, under `cache_directory`, is enabled by the `response_cache_on_disk` setting.
+    """
+    with __caches_lock:
+        if settings in __caches:
+            return __caches[settings]
+
+        try:
+            max_size = int(settings.get("response_cache_size"))
+        except InvalidOption:
+            max_size = DEFAULT_RESPONSE_CACHE_SIZE
+
+        directory = None
+        try:
+            if is_enabled(settings.get("response_cache_on_disk")):
+                directory = Path.join(str(settings.get("cache_directory")), "responses")
+        except InvalidOption:
+            pass
+
+        cache = ResponseCache(max_size, directory) if max_size > 0 or directory is not None else None
+        __caches[settings] = cache
+        return cache
@@ -3,6 +3,7 @@ from typing import Literal, Optional
 from semver.version import Version
 
 from . import exceptions
+from .utils import parse_semver
 
 # The HUP process itself as well as policies set minimum bounds on current/target
 # versions that it can update. These variables allow enforcement of these minimums.
@@ -25,12 +26,12 @@ def get_hup_action_type(device_type: str, current_version: Optional[str], target
     """
 
     try:
-        parsed_current_ver = Version.parse(current_version)  # type: ignore
+        parsed_current_ver = parse_semver(current_version)  # type: ignore
     except Exception:
         raise exceptions.OsUpdateError("Invalid current balenaOS version")
 
     try:
-        parsed_target_ver = Version.parse(target_version)
+        parsed_target_ver = parse_semver(target_version)
     except Exception:
         raise exceptions.OsUpdateError("Invalid target balenaOS version")
 
@@ -45,16 +46,16 @@ def get_hup_action_type(device_type: str, current_version: Optional[str], target
             "Updates cannot be performed between development and production balenaOS variants"
         )
 
-    if Version.parse(target_version).compare(current_version) < 0:
+    if parsed_target_ver.compare(parsed_current_ver) < 0:
         raise exceptions.OsUpdateError("OS downgrades are not allowed")
 
-    if Version.parse(target_version).compare(current_version) == 0:
+    if parsed_target_ver.compare(parsed_current_ver) == 0:
         raise exceptions.OsUpdateError("Current OS version matches Target OS version")
 
-    if Version.parse(current_version).compare(MIN_CURRENT_VERSION) < 0:
+    if parsed_current_ver.compare(parse_semver(MIN_CURRENT_VERSION)) < 0:
         raise exceptions.OsUpdateError("Current balenaOS version must be at least {0}".format(MIN_CURRENT_VERSION))
 
-    if Version.parse(target_version).compare(MIN_TARGET_VERSION) < 0:
+    if parsed_target_ver.compare(parse_semver(MIN_TARGET_VERSION)) < 0:
         raise exceptions.OsUpdateError("Target balenaOS version must be at least {0}".format(MIN_TARGET_VERSION))
 
     return "resinhup{from_v}{to_v}".format(from_v=parsed_current_ver.major, to_v=parsed_target_ver.major)
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import os.path as Path
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, DefaultDict, Dict, Iterator, Optional
+from weakref import WeakKeyDictionary
+
+from .exceptions import InvalidOption
+from .settings import Settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover, windows
+    fcntl = None  # type: ignore
+
+# Default size of the image cache, in bytes of cached images
+DEFAULT_IMAGE_CACHE_SIZE = 4 * 1024 * 1024 * 1024
+
+# Default time images are kept for, in seconds
+DEFAULT_IMAGE_CACHE_TIME = 7 * 24 * 60 * 60
+
+IMAGE_SUFFIX = ".img"
+# Suffixes of the cached files, one per `fileType` an image can be downloaded as
+IMAGE_SUFFIXES = (IMAGE_SUFFIX, ".zip", ".gz")
+# Suffixes of the files of downloads in progress, see RangedDownload
+PARTIAL_SUFFIXES = (".part", ".part.json", ".part.json.tmp")
+
+
+def get_image_key(query: Dict[str, Any]) -> str:
+    """
+    Content address of an image, derived from everything that makes up its content: the API endpoint,
+    the device type slug, the normalized version and the download options.
+    """
+    return hashlib.sha256(json.dumps(query, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class OsImageCache:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    Store of downloaded OS images, one file per content address, named after the file type it was downloaded as.
+    Images are only published, with an atomic rename, once they are complete, so concurrent readers never see
+    partial files, and readers that already opened or mapped an image keep reading it even if it is evicted.
+    Images expire `ttl` seconds after being downloaded, and the least recently used ones are evicted once the
+    store outgrows its size. Fills of the same image are serialized across threads and processes.
+    """
+
+    def __init__(self, directory: str, max_size: int, ttl: float):
+        self.__directory = directory
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__locks: DefaultDict[str, Lock] = defaultdict(Lock)
+        self.__locks_lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, key: str, suffix: str = IMAGE_SUFFIX) -> str:
+        if suffix not in IMAGE_SUFFIXES:
+            raise ValueError(f"Unsupported image suffix {suffix}")
+        return Path.join(self.__directory, f"{key}{suffix}")
+
+    def get(self, key: str, suffix: str = IMAGE_SUFFIX) -> Optional[str]:
+        """
+        Path of a cached image, None if it is not cached or expired.
+        """
+        path = self.get_path(key, suffix)
+        now = time.time()
+        try:
+            stat = os.stat(path)
+            if now - stat.st_mtime >= self.__ttl:
+                os.remove(path)
+                return None
+            # the access time orders the eviction, the modification time the expiry
+            os.utime(path, (now, stat.st_mtime))
+        except OSError:
+            return None
+        return path
+
+    def fill(self, key: str, download: Callable[[str], Any], suffix: str = IMAGE_SUFFIX) -> str:
+        """
+        Get the path of an image, downloading it to the given path first when it is not cached.
+        The download must only create the file once it is complete.
+        """
+        with self.__lock(key):
+            path = self.get(key, suffix)
+            if path is None:
+                path = self.get_path(key, suffix)
+                download(path)
+                os.utime(path)
+        self.evict(keep=path)
+        return path
+
+    @contextmanager
+    def __lock(self, key: str) -> Iterator[None]:
+        with self.__locks_lock:
+            lock = self.__locks[key]
+
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            with open(Path.join(self.__directory, f"{key}.lock"), "a") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Drop the expired images and abandoned downloads, then the least recently used images
+        until the cache fits its size.
+        """
+        now = time.time()
+        images = []
+        size = 0
+        with os.scandir(self.__directory) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                    if now - stat.st_mtime >= self.__ttl and entry.path != keep:
+                        if entry.name.endswith(IMAGE_SUFFIXES) or entry.name.endswith(PARTIAL_SUFFIXES):
+                            os.remove(entry.path)
+                    elif entry.name.endswith(IMAGE_SUFFIXES):
+                        images.append((stat.st_atime, stat.st_size, entry.path))
+                        size += stat.st_size
+                except OSError:
+                    pass
+
+        for _, image_size, path in sorted(images):
+            if size <= self.__max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                size -= image_size
+            except OSError:
+                # e.g. mapped images can not be removed on windows
+                pass
+
+    def clear(self) -> None:
+        with os.scandir(self.__directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(IMAGE_SUFFIXES):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+
+__caches: "WeakKeyDictionary[Settings, Optional[OsImageCache]]" = WeakKeyDictionary()
+__caches_lock = Lock()
+
+
+def get_os_image_cache(settings: Settings) -> Optional[OsImageCache]:
+    """
+    Get the OS image cache shared by all the downloads done with these settings, stored under `cache_directory`.
+    Images expire after `image_cache_time` and the cache is bounded by `image_cache_size`.
+    None if there is no cache directory (in memory settings).
+    """
+    with __caches_lock:
+        if settings in __caches:
+            return __caches[settings]
+
+        try:
+            max_size = int(settings.get("image_cache_size"))
+        except InvalidOption:
+            max_size = DEFAULT_IMAGE_CACHE_SIZE
+
+        try:
+            ttl = int(settings.get("image_cache_time")) / 1000
+        except (InvalidOption, ValueError):
+            ttl = DEFAULT_IMAGE_CACHE_TIME
+
+        cache = None
+        try:
+            cache = OsImageCache(Path.join(str(settings.get("cache_directory")), "images"), max_size, ttl)
+        except (InvalidOption, OSError):
+            pass
+
+        __caches[settings] = cache
+        return cache
@@ -0,0 +1,300 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+from threading import Lock, Timer
+from typing import Any, Iterable, List, Optional, TypedDict
+
+# Buffered appends are committed once this many lines are pending...
+APPEND_COMMIT_SIZE = 500
+# ...or once the oldest pending line is this old, in seconds
+APPEND_COMMIT_INTERVAL = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log (
+    uuid TEXT NOT NULL,
+    created_at INTEGER,
+    timestamp INTEGER,
+    service_id INTEGER,
+    is_std_err INTEGER,
+    is_system INTEGER,
+    message TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS log_line ON log (
+    uuid, ifnull(created_at, -1), ifnull(timestamp, -1), ifnull(service_id, -1), is_std_err, ifnull(message, '')
+);
+CREATE INDEX IF NOT EXISTS log_uuid_timestamp ON log (uuid, timestamp);
+CREATE INDEX IF NOT EXISTS log_service_id_timestamp ON log (service_id, timestamp);
+CREATE INDEX IF NOT EXISTS log_is_std_err_timestamp ON log (is_std_err, timestamp);
+CREATE TABLE IF NOT EXISTS device_sync (
+    uuid TEXT PRIMARY KEY,
+    last_created_at INTEGER
+);
+"""
+
+# The first index treated the lines without createdAt as distinct (sqlite NULLs are), so they were stored again
+# on every sync. Their copies are dropped before the NULL-safe index is created.
+MIGRATION = """
+DROP INDEX IF EXISTS log_unique;
+DELETE FROM log WHERE rowid NOT IN (
+    SELECT min(rowid) FROM log GROUP BY
+        uuid, ifnull(created_at, -1), ifnull(timestamp, -1), ifnull(service_id, -1), is_std_err, ifnull(message, '')
+);
+"""
+
+INSERT_LOG = """
+INSERT OR IGNORE INTO log (uuid, created_at, timestamp, service_id, is_std_err, is_system, message)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_LAST_CREATED_AT = """
+INSERT INTO device_sync (uuid, last_created_at) VALUES (?, ?)
+ON CONFLICT (uuid) DO UPDATE SET last_created_at = max(last_created_at, excluded.last_created_at)
+"""
+
+
+class StoredLog(TypedDict):
+    uuid: str
+    createdAt: int
+    timestamp: int
+    serviceId: Optional[int]
+    isStdErr: bool
+    isSystem: bool
+    message: str
+
+
+def _to_ms(date: datetime) -> int:
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp() * 1000)
+
+
+class LogStore:
+    """
+    Local archive of device logs backed by sqlite, indexed by device uuid, service id,
+    timestamp and stderr flag.
+    It can be fed by log subscriptions (`append`) or by history syncs (`balena.logs.sync_history`),
+    and keeps track of the last synced line of every device so later syncs only store new lines.
+
+    Args:
+        path (str): path of the sqlite database file, `:memory:` for an in memory store.
+
+    Examples:
+        >>> from balena.log_store import LogStore
+        >>> store = LogStore('/home/example/.balena/logs.db')
+        >>> balena.logs.sync_history(store, '8deb12a7d7592c2b7f9e44735c2b0a41')
+        >>> balena.logs.subscribe_application('myorg/myapp', store.append)
+        >>> store.query(uuid='8deb12a7d7592c2b7f9e44735c2b0a41', contains='error', is_std_err=True)
+    """
+
+    def __init__(self, path: str):
+        self.__lock = Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__migrate()
+        self.__connection.executescript(SCHEMA)
+        self.__pending = 0
+        self.__pending_since = 0.0
+        self.__commit_timer: Optional[Timer] = None
+        self.__closed = False
+
+    def __migrate(self) -> None:
+        index = self.__connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'log_unique'"
+        ).fetchone()
+        if index is not None:
+            self.__connection.executescript(MIGRATION)
+
+    def __row(self, uuid: str, log: Any):
+        return (
+            uuid,
+            log.get("createdAt"),
+            log.get("timestamp"),
+            log.get("serviceId"),
+            int(bool(log.get("isStdErr"))),
+            int(bool(log.get("isSystem"))),
+            log.get("message"),
+        )
+
+    def __track(self, uuid: str, log: Any) -> None:
+        created_at = log.get("createdAt")
+        if created_at is not None:
+            self.__connection.execute(UPDATE_LAST_CREATED_AT, (uuid, created_at))
+
+    def __commit(self) -> None:
+        if self.__commit_timer is not None:
+            self.__commit_timer.cancel()
+            self.__commit_timer = None
+        self.__connection.commit()
+        self.__pending = 0
+
+    def __commit_pending(self) -> None:
+        with self.__lock:
+            if not self.__closed and self.__pending > 0:
+                self.__commit()
+
+    def add(self, uuid: str, logs: Iterable[Any]) -> int:
+        """
+        Store a batch of logs of a device, ignoring the ones that are already stored.
+
+        Args:
+            uuid (str): device uuid.
+            logs (Iterable[Log]): the logs to store, it can be a generator.
+
+        Returns:
+            int: number of stored logs.
+        """
+        last_created_at = None
+
+        def rows():
+            nonlocal last_created_at
+            for log in logs:
+                created_at = log.get("createdAt")
+                if created_at is not None and (last_created_at is None or created_at > last_created_at):
+                    last_created_at = created_at
+                yield self.__row(uuid, log)
+
+        with self.__lock:
+            changes = self.__connection.total_changes
+            self.__connection.executemany(INSERT_LOG, rows())
+            stored = self.__connection.total_changes - changes
+            if last_created_at is not None:
+                self.__connection.execute(UPDATE_LAST_CREATED_AT, (uuid, last_created_at))
+            self.__commit()
+
+        return stored
+
+    def append(self, log: Any, uuid: Optional[str] = None) -> None:
+        """
+        Store a single log line, meant to be used as a log subscription callback.
+        Lines are committed in batches, at the latest `APPEND_COMMIT_INTERVAL` seconds after they are appended,
+        call `flush` to commit them right away.
+
+        Args:
+            log (Log): the log line, it must contain a `uuid` when the uuid argument is not provided,
+                as the lines delivered by `balena.logs.subscribe_application` do.
+            uuid (Optional[str]): device uuid.
+        """
+        uuid = uuid or log["uuid"]
+
+        with self.__lock:
+            self.__connection.execute(INSERT_LOG, self.__row(uuid, log))
+            self.__track(uuid, log)
+
+            now = time.monotonic()
+            if self.__pending == 0:
+                self.__pending_since = now
+                # the last batch is committed even when no further line arrives
+                self.__commit_timer = Timer(APPEND_COMMIT_INTERVAL, self.__commit_pending)
+                self.__commit_timer.daemon = True
+                self.__commit_timer.start()
+            self.__pending += 1
+
+            if self.__pending >= APPEND_COMMIT_SIZE or now - self.__pending_since >= APPEND_COMMIT_INTERVAL:
+                self.__commit()
+
+    def flush(self) -> None:
+        """
+        Commit the lines stored with `append`.
+        """
+        with self.__lock:
+            self.__commit()
+
+    def get_last_created_at(self, uuid: str) -> Optional[int]:
+        """
+        Get the creation timestamp of the most recent stored log of a device.
+
+        Args:
+            uuid (str): device uuid.
+
+        Returns:
+            Optional[int]: timestamp in milliseconds, None if no log of the device is stored.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT last_created_at FROM device_sync WHERE uuid = ?", (uuid,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def query(
+        self,
+        uuid: Optional[str] = None,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        service_id: Optional[int] = None,
+        is_std_err: Optional[bool] = None,
+        is_system: Optional[bool] = None,
+        contains: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[StoredLog]:
+        """
+        Query the stored logs, ordered by timestamp.
+
+        Args:
+            uuid (Optional[str]): only logs of this device.
+            from_date (Optional[datetime]): only logs with a timestamp newer than or equal to this date.
+            to_date (Optional[datetime]): only logs with a timestamp older than or equal to this date.
+            service_id (Optional[int]): only logs of this service.
+            is_std_err (Optional[bool]): only stderr (True) or stdout (False) logs.
+            is_system (Optional[bool]): only system (True) or service (False) logs.
+            contains (Optional[str]): only logs whose message contains this text (case sensitive).
+            limit (Optional[int]): maximum number of logs to return.
+
+        Returns:
+            List[StoredLog]: the matching logs.
+        """
+        conditions = []
+        params: List[Any] = []
+
+        if uuid is not None:
+            conditions.append("uuid = ?")
+            params.append(uuid)
+        if from_date is not None:
+            conditions.append("timestamp >= ?")
+            params.append(_to_ms(from_date))
+        if to_date is not None:
+            conditions.append("timestamp <= ?")
+            params.append(_to_ms(to_date))
+        if service_id is not None:
+            conditions.append("service_id = ?")
+            params.append(service_id)
+        if is_std_err is not None:
+            conditions.append("is_std_err = ?")
+            params.append(int(is_std_err))
+        if is_system is not None:
+            conditions.append("is_system = ?")
+            params.append(int(is_system))
+        if contains is not None:
+            conditions.append("instr(message, ?) > 0")
+            params.append(contains)
+
+        sql = "SELECT uuid, created_at, timestamp, service_id, is_std_err, is_system, message FROM log"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp, created_at"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self.__lock:
+            rows = self.__connection.execute(sql, params).fetchall()
+
+        return [
+            {
+                "uuid": row[0],
+                "createdAt": row[1],
+                "timestamp": row[2],
+                "serviceId": row[3],
+                "isStdErr": bool(row[4]),
+                "isSystem": bool(row[5]),
+                "message": row[6],
+            }
+            for row in rows
+        ]
+
+    def close(self) -> None:
+        """
+        Commit pending lines and close the store.
+        """
+        with self.__lock:
+            self.__commit()
+            self.__closed = True
+            self.__connection.close()
@@ -1,18 +1,49 @@
+import codecs
+import gzip
 import json
-from collections import defaultdict
-from threading import Thread
+import os
+import random
+import re
+import string
+import time
+from collections import defaultdict, deque
+from threading import Event, Lock, Thread
 from urllib.parse import urljoin
-from typing import Union, Optional, Literal, Callable, TypedDict, Any, List, cast
+from typing import (
+    Union,
+    Optional,
+    Literal,
+    Callable,
+    TypedDict,
+    Any,
+    Deque,
+    Dict,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    Pattern,
+    Set,
+    Tuple,
+    cast,
+)
 
 from twisted.internet import reactor
+from twisted.internet.defer import Deferred, DeferredSemaphore
 from twisted.internet.protocol import Protocol
-from twisted.web.client import Agent
+from twisted.web.client import Agent, readBody
 from twisted.web.http_headers import Headers
 
+from . import exceptions
+from .codec import get_json_decoder
+from .log_store import LogStore
 from .settings import Settings
+from .models.application import Application
 from .models.device import Device
+from .models.service import Service
 from .balena_auth import request, get_token
 from .pine import PineClient
+from .utils import is_id
 
 
 class Log(TypedDict):
@@ -24,28 +55,207 @@ class Log(TypedDict):
     serviceId: Optional[int]
 
 
+class ApplicationLog(Log):
+    uuid: str
+
+
+class LogFilters(TypedDict, total=False):
+    service: Union[int, str, List[Union[int, str]]]
+    is_system: bool
+    is_std_err: bool
+    message: Union[str, Pattern]
+
+
+# Maximum number of device log streams that are being opened at the same time
+DEFAULT_STREAM_CONCURRENCY = 50
+# How often (in seconds) the device list of a subscribed application is refreshed
+DEFAULT_FLEET_REFRESH_INTERVAL = 60
+# Reconnection backoff bounds, in seconds
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+# Number of historical lines requested when resuming a dropped stream
+RESUME_BACKLOG_COUNT = 1000
+# Number of most recent lines remembered to discard duplicates after resuming
+DEDUP_WINDOW = 256
+# Status codes for which reconnecting is pointless
+PERMANENT_ERROR_STATUS_CODES = [401, 403, 404]
+# Size of the chunks read from the logs history response body
+HISTORY_CHUNK_SIZE = 64 * 1024
+
+# A JSON string can not contain an unescaped quote, so these byte patterns can only match the actual keys
+SERVICE_ID_PATTERN = re.compile(rb'"serviceId":(null|-?[0-9]+)')
+# Characters that are neither regex special characters nor escaped by JSON encoders
+LITERAL_SAFE_CHARACTERS = set(string.ascii_letters + string.digits + " _-:,;=!@#%~")
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Incrementally decode the items of a JSON array received in chunks,
+    keeping in memory only the chunk being processed and the item being decoded.
+    This path stays on the standard library json module rather than the decoder set in `balena.codec`:
+    the end of an item in the buffer is only known by decoding it with `JSONDecoder.raw_decode`, while the
+    pluggable decoders only take complete documents. Log streams, which are newline delimited, do use it.
+    """
+
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    finished = False
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+
+        while not finished:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                finished = True
+                break
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the item is not complete yet, wait for the next chunk
+                break
+
+            if not isinstance(item, (dict, list, str)):
+                # a number may continue in the next chunk, it is only complete once a delimiter follows it
+                delimiter = end
+                while delimiter < len(buffer) and buffer[delimiter] in " \t\r\n":
+                    delimiter += 1
+                if delimiter >= len(buffer) or (delimiter == end and buffer[end] in "0123456789.eE+-"):
+                    break
+                if buffer[delimiter] not in ",]":
+                    raise ValueError(f"Expected ',' or ']' after a JSON array item at {delimiter}")
+            pos = end
+            yield item
+
+        buffer = buffer[pos:]
+
+    if not finished and (started or buffer.strip()):
+        raise ValueError("Unexpected end of JSON array")
+
+
+class LogLineFilter:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    `precheck` cheaply rejects raw log lines that can not match before they get decoded,
+    while `matches` performs the exact check on a decoded log.
+    The precheck only applies to the newline delimited lines of log streams. The history is a single JSON
+    array whose items are only delimited by decoding them, so its logs are always decoded before filtering.
+    """
+
+    def __init__(
+        self,
+        service_ids: Optional[Set[int]] = None,
+        is_system: Optional[bool] = None,
+        is_std_err: Optional[bool] = None,
+        message: Optional[Union[str, Pattern]] = None,
+    ):
+        self.service_ids = service_ids
+        self.is_system = is_system
+        self.is_std_err = is_std_err
+        self.message = re.compile(message) if isinstance(message, str) else message
+
+        self.__rejected_flags = []
+        if is_system is not None:
+            self.__rejected_flags.append(b'"isSystem":false' if is_system else b'"isSystem":true')
+        if is_std_err is not None:
+            self.__rejected_flags.append(b'"isStdErr":false' if is_std_err else b'"isStdErr":true')
+
+        # A plain literal message pattern must appear verbatim in the encoded line
+        self.__message_literal = None
+        if (
+            self.message is not None
+            and self.message.pattern
+            and isinstance(self.message.pattern, str)
+            and not self.message.flags & (re.IGNORECASE | re.VERBOSE)
+            and all(c in LITERAL_SAFE_CHARACTERS for c in self.message.pattern)
+        ):
+            self.__message_literal = self.message.pattern.encode()
+
+    def precheck(self, line: bytes) -> bool:
+        for flag in self.__rejected_flags:
+            if flag in line:
+                return False
+
+        if self.service_ids is not None:
+            match = SERVICE_ID_PATTERN.search(line)
+            if match is not None:
+                value = match.group(1)
+                if (None if value == b"null" else int(value)) not in self.service_ids:
+                    return False
+
+        if self.__message_literal is not None and self.__message_literal not in line:
+            return False
+
+        return True
+
+    def matches(self, log: Any) -> bool:
+        if self.is_system is not None and bool(log.get("isSystem")) != self.is_system:
+            return False
+        if self.is_std_err is not None and bool(log.get("isStdErr")) != self.is_std_err:
+            return False
+        if self.service_ids is not None and log.get("serviceId") not in self.service_ids:
+            return False
+        if self.message is not None and not self.message.search(log.get("message") or ""):
+            return False
+        return True
+
+
+class LogStreamMetrics(TypedDict):
+    uuid: str
+    connected: bool
+    reconnects: int
+    last_gap: float
+    total_gap: float
+    lines: int
+    duplicates: int
+
+
 class StreamingParser(Protocol):
     """
     This is low level class and is not meant to be used by end users directly.
     """
 
-    def __init__(self, callback, error):
+    def __init__(self, callback, error, on_connection_lost=None, line_filter=None):
         self.callback = callback
         self.error = error
+        self.on_connection_lost = on_connection_lost
+        self.line_filter = line_filter
         self.pending = b""
         self.is_running = True
 
     def dataReceived(self, data):
-        obj = {}
         self.pending += data
 
         lines = self.pending.split(b"\n")
         self.pending = lines.pop()
 
+        line_filter = self.line_filter
+        decode = get_json_decoder()
         for line in lines:
+            if not line:
+                continue
+
+            if line_filter is not None and not line_filter.precheck(line):
+                continue
+
             try:
-                if line:
-                    obj = json.loads(line)
+                obj = decode(line)
             except Exception as e:
                 self.transport.stopProducing()  # type: ignore
                 self.transport.loseConnection()  # type: ignore
@@ -54,23 +264,228 @@ class StreamingParser(Protocol):
                     self.error(e)
                 break
 
+            if line_filter is not None and not line_filter.matches(obj):
+                continue
+
             if self.is_running:
                 self.callback(obj)
 
     def connectionLost(self, reason):
-        pass
+        if self.on_connection_lost:
+            self.on_connection_lost(reason)
+
+
+class LogStream:
+    """
+    This is low level class and is not meant to be used by end users directly.
 
+    A single device log stream. Unless reconnect is disabled, a dropped connection is
+    re-established with exponential backoff, and the stream resumes after the last seen
+    log line by fetching a short backlog and discarding the lines that were already delivered.
+    All methods except `get_metrics` must be called from the reactor thread.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        uuid: str,
+        callback: Callable[[Log], None],
+        error: Optional[Callable[[Any], None]] = None,
+        count: Optional[Union[int, Literal["all"]]] = None,
+        semaphore: Optional[DeferredSemaphore] = None,
+        reconnect: bool = True,
+        line_filter: Optional[LogLineFilter] = None,
+    ):
+        self.uuid = uuid
+        self.__settings = settings
+        self.__callback = callback
+        self.__error = error
+        self.__count = count
+        self.__semaphore = semaphore
+        self.__reconnect = reconnect
+        self.__line_filter = line_filter
+
+        self.__stopped = False
+        self.__pending: Optional[Deferred] = None
+        self.__delayed_call: Any = None
+        self.__protocol: Optional[StreamingParser] = None
+        self.__attempt = 0
+        self.__connected_at: Optional[float] = None
+        self.__disconnected_at: Optional[float] = None
+
+        self.__resuming = False
+        self.__last_created_at: Optional[int] = None
+        self.__recent: Deque[Tuple] = deque(maxlen=DEDUP_WINDOW)
+        self.__recent_keys: Set[Tuple] = set()
+
+        self.__metrics: LogStreamMetrics = {
+            "uuid": uuid,
+            "connected": False,
+            "reconnects": 0,
+            "last_gap": 0.0,
+            "total_gap": 0.0,
+            "lines": 0,
+            "duplicates": 0,
+        }
+
+    def get_metrics(self) -> LogStreamMetrics:
+        return cast(LogStreamMetrics, {**self.__metrics})
+
+    def start(self) -> None:
+        self.__connect(self.__count)
+
+    def stop(self) -> None:
+        self.__stopped = True
+
+        if self.__delayed_call is not None and self.__delayed_call.active():
+            self.__delayed_call.cancel()
+        self.__delayed_call = None
+
+        if self.__pending is not None:
+            self.__pending.cancel()
+            self.__pending = None
+
+        if self.__protocol is not None:
+            self.__protocol.is_running = False
+            self.__protocol.transport.stopProducing()  # type: ignore
+            self.__protocol.transport.loseConnection()  # type: ignore
+            self.__protocol = None
+
+        self.__metrics["connected"] = False
 
-def cbRequest(response, callback, error):
-    protocol = StreamingParser(callback, error)
-    response.deliverBody(protocol)
-    return protocol
+    def __connect(self, count: Optional[Union[int, Literal["all"]]]) -> None:
+        query = "stream=1"
+        if count:
+            query = f"stream=1&count={count}"
 
+        url = urljoin(cast(str, self.__settings.get("api_endpoint")), f"/device/v2/{self.uuid}/logs?{query}")
+        headers = Headers({"Authorization": [f"Bearer {get_token(self.__settings)}"]})
 
-def cbDrop(protocol):
-    protocol.is_running = False
-    protocol.transport.stopProducing()
-    protocol.transport.loseConnection()
+        agent = Agent(reactor)
+        if self.__semaphore is None:
+            d = agent.request(b"GET", url.encode(), headers, None)
+        else:
+            # The semaphore is released as soon as the response headers arrive,
+            # so it only bounds the number of connections being established.
+            d = self.__semaphore.run(agent.request, b"GET", url.encode(), headers, None)
+
+        self.__pending = d
+        d.addCallbacks(self.__on_response, self.__on_failure)
+
+    def __on_response(self, response) -> None:
+        self.__pending = None
+
+        if response.code != 200:
+            readBody(response).addBoth(lambda body: self.__on_status_error(response.code, body))
+            return
+
+        self.__protocol = StreamingParser(self.__on_log, self.__error, self.__on_connection_lost, self.__line_filter)
+        response.deliverBody(self.__protocol)
+
+        now = time.monotonic()
+        self.__connected_at = now
+        self.__metrics["connected"] = True
+        if self.__disconnected_at is not None:
+            gap = now - self.__disconnected_at
+            self.__metrics["last_gap"] = gap
+            self.__metrics["total_gap"] += gap
+            self.__disconnected_at = None
+
+    def __on_status_error(self, status_code: int, body: Any) -> None:
+        if self.__stopped:
+            return
+
+        if self.__error:
+            self.__error(
+                exceptions.RequestError(body=body.decode() if isinstance(body, bytes) else "", status_code=status_code)
+            )
+
+        if status_code in PERMANENT_ERROR_STATUS_CODES:
+            self.__stopped = True
+            return
+
+        self.__on_disconnected()
+
+    def __on_failure(self, failure) -> None:
+        self.__pending = None
+        if self.__stopped:
+            return
+
+        if not self.__reconnect and self.__error:
+            self.__error(failure.value)
+
+        self.__on_disconnected()
+
+    def __on_connection_lost(self, reason) -> None:
+        self.__protocol = None
+        if self.__stopped:
+            return
+
+        self.__metrics["connected"] = False
+        self.__on_disconnected()
+
+    def __on_disconnected(self) -> None:
+        now = time.monotonic()
+        if self.__disconnected_at is None:
+            self.__disconnected_at = now
+
+        # a connection that stayed up for a while resets the backoff
+        if self.__connected_at is not None and now - self.__connected_at > MAX_RECONNECT_DELAY:
+            self.__attempt = 0
+        self.__connected_at = None
+
+        if not self.__reconnect:
+            return
+
+        delay = min(MAX_RECONNECT_DELAY, MIN_RECONNECT_DELAY * 2**self.__attempt)
+        # jitter the delay so that the streams of a whole fleet do not reconnect at once
+        delay = delay * random.uniform(0.5, 1)
+        self.__attempt += 1
+        self.__metrics["reconnects"] += 1
+        self.__delayed_call = reactor.callLater(delay, self.__resume)  # type: ignore
+
+    def __resume(self) -> None:
+        self.__delayed_call = None
+        if self.__stopped:
+            return
+
+        if self.__last_created_at is None:
+            self.__connect(self.__count)
+        else:
+            self.__resuming = True
+            self.__connect(RESUME_BACKLOG_COUNT)
+
+    def __on_log(self, log: Log) -> None:
+        key = (
+            log.get("createdAt"),
+            log.get("timestamp"),
+            log.get("serviceId"),
+            log.get("isStdErr"),
+            log.get("message"),
+        )
+        if key in self.__recent_keys:
+            self.__metrics["duplicates"] += 1
+            return
+
+        created_at = log.get("createdAt") or log.get("timestamp")
+        if self.__resuming and created_at is not None and self.__last_created_at is not None:
+            if created_at < self.__last_created_at:
+                self.__metrics["duplicates"] += 1
+                return
+            if created_at > self.__last_created_at:
+                self.__resuming = False
+
+        if len(self.__recent) == self.__recent.maxlen:
+            self.__recent_keys.discard(self.__recent[0])
+        self.__recent.append(key)
+        self.__recent_keys.add(key)
+
+        if created_at is not None and (self.__last_created_at is None or created_at > self.__last_created_at):
+            self.__last_created_at = created_at
+
+        self.__attempt = 0
+        self.__metrics["lines"] += 1
+        self.__callback(log)
 
 
 class Subscription:
@@ -87,30 +502,107 @@ class Subscription:
         callback: Callable[[Log], None],
         error: Optional[Callable[[Any], None]] = None,
         count: Optional[Union[int, Literal["all"]]] = None,
-    ):
-        query = "stream=1"
-        if count:
-            query = f"stream=1&count={count}"
-
-        url = urljoin(cast(str, self.__settings.get("api_endpoint")), f"/device/v2/{uuid}/logs?{query}")
-        headers = Headers({"Authorization": [f"Bearer {get_token(self.__settings)}"]})
-
-        agent = Agent(reactor)
-        req = agent.request(b"GET", url.encode(), headers, None)
-        req.addCallback(cbRequest, callback, error)
+        semaphore: Optional[DeferredSemaphore] = None,
+        reconnect: bool = True,
+        line_filter: Optional[LogLineFilter] = None,
+    ) -> LogStream:
+        stream = LogStream(self.__settings, uuid, callback, error, count, semaphore, reconnect, line_filter)
+        reactor.callFromThread(stream.start)  # type: ignore
         self.run()
 
-        return req
+        return stream
 
     def run(self):
         if not reactor.running:  # type: ignore
             Thread(target=reactor.run, args=(False,)).start()  # type: ignore
 
-    def stop(self, d):
-        reactor.callFromThread(d.addCallback, cbDrop)  # type: ignore
+    def stop(self, stream: LogStream):
+        reactor.callFromThread(stream.stop)  # type: ignore
 
     def stop_all(self):
-        reactor.stop()  # type: ignore
+        reactor.callFromThread(reactor.stop)  # type: ignore
+
+
+class ApplicationSubscription:
+    """
+    This is low level class and is not meant to be used by end users directly.
+    """
+
+    def __init__(
+        self,
+        app_id: int,
+        device: Device,
+        subscription_handler: Subscription,
+        callback: Callable[[ApplicationLog], None],
+        error: Optional[Callable[[Any], None]],
+        count: Optional[Union[int, Literal["all"]]],
+        concurrency: int,
+        reconnect: bool = True,
+        line_filter: Optional[LogLineFilter] = None,
+    ):
+        self.app_id = app_id
+        self.__device = device
+        self.__subscription_handler = subscription_handler
+        self.__callback = callback
+        self.__error = error
+        self.__count = count
+        self.__reconnect = reconnect
+        self.__line_filter = line_filter
+        self.__semaphore = DeferredSemaphore(concurrency)
+        self.__streams: Dict[str, LogStream] = {}
+        self.__lock = Lock()
+        self.__stopped = Event()
+
+    def __tagged_callback(self, uuid: str) -> Callable[[Log], None]:
+        def cb(log):
+            log["uuid"] = uuid
+            self.__callback(log)
+
+        return cb
+
+    def sync(self) -> None:
+        devices = self.__device.get_all({"$select": "uuid", "$filter": {"belongs_to__application": self.app_id}})
+        uuids = set(d["uuid"] for d in devices)
+
+        with self.__lock:
+            if self.__stopped.is_set():
+                return
+
+            for uuid in uuids - self.__streams.keys():
+                self.__streams[uuid] = self.__subscription_handler.add(
+                    uuid,
+                    self.__tagged_callback(uuid),
+                    self.__error,
+                    self.__count,
+                    self.__semaphore,
+                    self.__reconnect,
+                    self.__line_filter,
+                )
+
+            for uuid in self.__streams.keys() - uuids:
+                self.__subscription_handler.stop(self.__streams.pop(uuid))
+
+    def watch(self, interval: float) -> None:
+        def run():
+            while not self.__stopped.wait(interval):
+                try:
+                    self.sync()
+                except Exception as e:
+                    if self.__error:
+                        self.__error(e)
+
+        Thread(target=run, daemon=True).start()
+
+    def stop(self) -> None:
+        with self.__lock:
+            self.__stopped.set()
+            for stream in self.__streams.values():
+                self.__subscription_handler.stop(stream)
+            self.__streams = {}
+
+    def get_streams(self) -> List[LogStream]:
+        with self.__lock:
+            return list(self.__streams.values())
 
 
 class Logs:
@@ -121,47 +613,308 @@ class Logs:
 
     def __init__(self, pine: PineClient, settings: Settings):
         self.__subscriptions = defaultdict(list)
+        self.__application_subscriptions: Dict[int, ApplicationSubscription] = {}
         self.__settings = settings
         self.__device = Device(pine, settings)
+        self.__application = Application(pine, settings)
+        self.__service = Service(pine, settings)
+        self.__service_ids: Dict[Tuple[int, str], int] = {}
         self.__subscription_handler = Subscription(settings)
 
     def __exit__(self, exc_type, exc_value, traceback):
         reactor.stop()  # type: ignore
 
+    def __get_service_id(self, app_id: int, service: Union[int, str]) -> int:
+        if is_id(service):
+            return int(service)
+
+        key = (app_id, cast(str, service))
+        if key not in self.__service_ids:
+            # a single lookup caches the ids of all the services of the application
+            for s in self.__service.get_all_by_application(app_id, {"$select": ["id", "service_name"]}):
+                self.__service_ids[(app_id, s["service_name"])] = s["id"]
+
+        if key not in self.__service_ids:
+            raise exceptions.ServiceNotFound(service)
+
+        return self.__service_ids[key]
+
+    def __get_line_filter(self, app_id: int, filters: Optional[LogFilters]) -> Optional[LogLineFilter]:
+        if not filters:
+            return None
+
+        service_ids = None
+        if "service" in filters:
+            services = filters["service"] if isinstance(filters["service"], list) else [filters["service"]]
+            service_ids = set(self.__get_service_id(app_id, service) for service in services)
+
+        return LogLineFilter(service_ids, filters.get("is_system"), filters.get("is_std_err"), filters.get("message"))
+
+    def __get_device(
+        self, uuid_or_id: Union[str, int], filters: Optional[LogFilters] = None
+    ) -> Tuple[str, Optional[LogLineFilter]]:
+        device = self.__device.get(uuid_or_id, {"$select": ["uuid", "belongs_to__application"]})
+        return device["uuid"], self.__get_line_filter(device["belongs_to__application"]["__id"], filters)
+
     def subscribe(
         self,
         uuid_or_id: Union[str, int],
         callback: Callable[[Log], None],
         error: Optional[Callable[[Any], None]] = None,
         count: Optional[Union[int, Literal["all"]]] = None,
+        reconnect: bool = True,
+        filters: Optional[LogFilters] = None,
     ) -> None:
         """
         Subscribe to device logs.
+        Dropped connections are re-established with exponential backoff, resuming after the
+        last received line without delivering it twice.
 
         Args:
             uuid_or_id (Union[str, int]): device uuid (string) or id (int)
             callback (Callable[[Log], None]): this callback is called on receiving a message.
             error (Optional[Callable[[Any], None]]): this callback is called on an error event.
             count (Optional[Union[int, Literal["all"]]]): number of historical messages to include.
+            reconnect (bool): whether to reconnect when the connection drops, defaults to True.
+            filters (Optional[LogFilters]): only deliver the logs matching all the given filters:
+                service (service id or name, or a list of them), is_system, is_std_err and message (regex).
+                Lines that can not match are discarded before being decoded whenever possible.
+
+        Examples:
+            >>> balena.logs.subscribe('8deb12a7d7592c2b7f9e44735c2b0a41', print, filters={'is_std_err': True})
+            >>> balena.logs.subscribe('8deb12a7d7592c2b7f9e44735c2b0a41', print, filters={'service': 'main'})
         """
 
-        uuid = self.__device.get(uuid_or_id, {"$select": "uuid"})["uuid"]
-        self.__subscriptions[uuid].append(self.__subscription_handler.add(uuid, callback, error, count))
+        uuid, line_filter = self.__get_device(uuid_or_id, filters)
+        self.__subscriptions[uuid].append(
+            self.__subscription_handler.add(uuid, callback, error, count, reconnect=reconnect, line_filter=line_filter)
+        )
+
+    def subscribe_application(
+        self,
+        slug_or_uuid_or_id: Union[str, int],
+        callback: Callable[[ApplicationLog], None],
+        error: Optional[Callable[[Any], None]] = None,
+        count: Optional[Union[int, Literal["all"]]] = None,
+        concurrency: int = DEFAULT_STREAM_CONCURRENCY,
+        refresh_interval: Optional[float] = DEFAULT_FLEET_REFRESH_INTERVAL,
+        reconnect: bool = True,
+        filters: Optional[LogFilters] = None,
+    ) -> None:
+        """
+        Subscribe to the logs of all devices of an application.
+        The device uuids are resolved with a single query and the logs of all devices are
+        delivered to the same callback, tagged with the `uuid` of the device that emitted them.
+        Devices that join or leave the application are picked up every `refresh_interval` seconds.
 
-    def history(self, uuid_or_id: Union[str, int], count: Optional[Union[int, Literal["all"]]] = None) -> List[Log]:
+        Args:
+            slug_or_uuid_or_id (Union[str, int]): application slug (string), uuid (string) or id (number)
+            callback (Callable[[ApplicationLog], None]): this callback is called on receiving a message.
+            error (Optional[Callable[[Any], None]]): this callback is called on an error event.
+            count (Optional[Union[int, Literal["all"]]]): number of historical messages to include per device.
+            concurrency (int): maximum number of device log streams being opened at the same time, defaults to 50.
+            refresh_interval (Optional[float]): seconds between device list refreshes, None disables refreshing.
+            reconnect (bool): whether to reconnect the device streams when they drop, defaults to True.
+            filters (Optional[LogFilters]): only deliver the logs matching all the given filters,
+                see `subscribe`.
+
+        Examples:
+            >>> balena.logs.subscribe_application('myorg/myapp', lambda log: print(log['uuid'], log['message']))
+        """
+
+        app_id = self.__application.get_id(slug_or_uuid_or_id)
+        self.unsubscribe_application(app_id)
+
+        subscription = ApplicationSubscription(
+            app_id,
+            self.__device,
+            self.__subscription_handler,
+            callback,
+            error,
+            count,
+            concurrency,
+            reconnect,
+            self.__get_line_filter(app_id, filters),
+        )
+        subscription.sync()
+        if refresh_interval:
+            subscription.watch(refresh_interval)
+
+        self.__application_subscriptions[app_id] = subscription
+
+    def history(
+        self,
+        uuid_or_id: Union[str, int],
+        count: Optional[Union[int, Literal["all"]]] = None,
+        filters: Optional[LogFilters] = None,
+    ) -> List[Log]:
         """
         Get device logs history.
 
         Args:
             uuid_or_id (Union[str, int]): device uuid (string) or id (int)
             count (Optional[Union[int, Literal["all"]]]): number of historical messages to include.
+            filters (Optional[LogFilters]): only return the logs matching all the given filters, see `subscribe`.
+                The count applies before filtering.
         """
-        uuid = self.__device.get(uuid_or_id, {"$select": "uuid"})["uuid"]
+        uuid, line_filter = self.__get_device(uuid_or_id, filters)
         qs = {}
         if count is not None:
             qs["count"] = count
 
-        return request(method="GET", settings=self.__settings, path=f"/device/v2/{uuid}/logs", qs=qs)
+        logs = request(method="GET", settings=self.__settings, path=f"/device/v2/{uuid}/logs", qs=qs)
+        if line_filter is None:
+            return logs
+
+        # the history is decoded as a whole, see LogLineFilter for why it is not prechecked
+        return [log for log in logs if line_filter.matches(log)]
+
+    def iter_history(
+        self,
+        uuid_or_id: Union[str, int],
+        count: Optional[Union[int, Literal["all"]]] = None,
+        filters: Optional[LogFilters] = None,
+    ) -> Iterator[Log]:
+        """
+        Iterate over the device logs history.
+        The response is streamed and decoded incrementally, so memory usage does not grow with the
+        number of log lines, which makes it suitable for `count="all"` on chatty devices.
+
+        Args:
+            uuid_or_id (Union[str, int]): device uuid (string) or id (int)
+            count (Optional[Union[int, Literal["all"]]]): number of historical messages to include.
+            filters (Optional[LogFilters]): only yield the logs matching all the given filters, see `subscribe`.
+                The count applies before filtering.
+
+        Examples:
+            >>> for log in balena.logs.iter_history('8deb12a7d7592c2b7f9e44735c2b0a41', count='all'):
+            ...     print(log['message'])
+        """
+        uuid, line_filter = self.__get_device(uuid_or_id, filters)
+        logs = self.__iter_history(uuid, count)
+        if line_filter is None:
+            return logs
+
+        return (log for log in logs if line_filter.matches(log))
+
+    def __iter_history(
+        self, uuid: str, count: Optional[Union[int, Literal["all"]]] = None, start: Optional[int] = None
+    ) -> Iterator[Log]:
+        qs: Dict[str, Any] = {}
+        if count is not None:
+            qs["count"] = count
+        if start is not None:
+            qs["start"] = start
+
+        response = request(
+            method="GET",
+            settings=self.__settings,
+            path=f"/device/v2/{uuid}/logs",
+            qs=qs,
+            return_raw=True,
+            stream=True,
+        )
+
+        with response:
+            if not response.ok:
+                raise exceptions.RequestError(body=response.content.decode(), status_code=response.status_code)
+
+            yield from iter_json_array(response.iter_content(chunk_size=HISTORY_CHUNK_SIZE))
+
+    def export_history(
+        self,
+        uuid_or_id: Union[str, int],
+        path: str,
+        count: Optional[Union[int, Literal["all"]]] = None,
+        compress: bool = False,
+        max_bytes: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Export the device logs history to disk as newline delimited JSON (one log per line).
+        The logs are streamed to disk as they are received, so memory usage stays constant.
+
+        Args:
+            uuid_or_id (Union[str, int]): device uuid (string) or id (int)
+            path (str): path of the file to write.
+            count (Optional[Union[int, Literal["all"]]]): number of historical messages to include.
+            compress (bool): gzip compress the written files, defaults to False.
+            max_bytes (Optional[int]): rotate to a new file once the current one reaches (approximately) this size.
+                Rotated files get an index before the extension, e.g. `logs.1.ndjson`, `logs.2.ndjson`.
+
+        Returns:
+            List[str]: the paths of the written files.
+
+        Examples:
+            >>> balena.logs.export_history('8deb12a7d7592c2b7f9e44735c2b0a41', 'logs.ndjson.gz', 'all', compress=True)
+        """
+
+        root, ext = os.path.splitext(path)
+        if ext == ".gz":
+            root, inner_ext = os.path.splitext(root)
+            ext = inner_ext + ext
+
+        paths: List[str] = []
+        raw: Optional[IO[bytes]] = None
+        out: Optional[IO[bytes]] = None
+
+        def open_next():
+            file_path = path if not paths else f"{root}.{len(paths)}{ext}"
+            paths.append(file_path)
+            raw_file = open(file_path, "wb")
+            return raw_file, gzip.GzipFile(fileobj=raw_file, mode="wb") if compress else raw_file
+
+        def close():
+            if out is not None and out is not raw:
+                out.close()
+            if raw is not None:
+                raw.close()
+
+        try:
+            raw, out = open_next()
+            for log in self.iter_history(uuid_or_id, count):
+                if max_bytes is not None and raw.tell() >= max_bytes:
+                    close()
+                    raw, out = open_next()
+                out.write(json.dumps(log).encode() + b"\n")
+        finally:
+            close()
+
+        return paths
+
+    def sync_history(
+        self,
+        store: LogStore,
+        uuid_or_id: Union[str, int],
+        count: Optional[Union[int, Literal["all"]]] = "all",
+    ) -> int:
+        """
+        Store the device logs history in a local log store.
+        The creation time of the last line already stored for the device is sent as the `start` of the history,
+        so repeated syncs only fetch and add new lines.
+
+        Args:
+            store (LogStore): the local log store.
+            uuid_or_id (Union[str, int]): device uuid (string) or id (int)
+            count (Optional[Union[int, Literal["all"]]]): number of historical messages to fetch, defaults to 'all'.
+
+        Returns:
+            int: number of stored lines.
+
+        Examples:
+            >>> from balena.log_store import LogStore
+            >>> store = LogStore('logs.db')
+            >>> balena.logs.sync_history(store, '8deb12a7d7592c2b7f9e44735c2b0a41')
+        """
+        uuid = self.__device.get(uuid_or_id, {"$select": "uuid"})["uuid"]
+        last_created_at = store.get_last_created_at(uuid)
+
+        logs = self.__iter_history(uuid, count, last_created_at)
+        if last_created_at is not None:
+            # the older lines of a history that does not honor the start are dropped as well, while the lines
+            # created in the same millisecond as the last stored one are deduplicated by the store
+            logs = (log for log in logs if (log.get("createdAt") or 0) >= last_created_at)
+
+        return store.add(uuid, logs)
 
     def unsubscribe(self, uuid_or_id: Union[str, int]) -> None:
         """
@@ -172,18 +925,52 @@ class Logs:
         """
         uuid = self.__device.get(uuid_or_id, {"$select": "uuid"})["uuid"]
         if uuid in self.__subscriptions:
-            for d in self.__subscriptions[uuid]:
-                self.__subscription_handler.stop(d)
+            for stream in self.__subscriptions[uuid]:
+                self.__subscription_handler.stop(stream)
             del self.__subscriptions[uuid]
 
+    def unsubscribe_application(self, slug_or_uuid_or_id: Union[str, int]) -> None:
+        """
+        Unsubscribe from the logs of all devices of an application.
+
+        Args:
+            slug_or_uuid_or_id (Union[str, int]): application slug (string), uuid (string) or id (number)
+        """
+        app_id = self.__application.get_id(slug_or_uuid_or_id)
+        subscription = self.__application_subscriptions.pop(app_id, None)
+        if subscription is not None:
+            subscription.stop()
+
     def unsubscribe_all(self) -> None:
         """
         Unsubscribe all subscribed devices.
         """
         for device in self.__subscriptions:
-            for d in self.__subscriptions[device]:
-                self.__subscription_handler.stop(d)
-        self.__subscriptions = {}
+            for stream in self.__subscriptions[device]:
+                self.__subscription_handler.stop(stream)
+        self.__subscriptions = defaultdict(list)
+
+        for subscription in self.__application_subscriptions.values():
+            subscription.stop()
+        self.__application_subscriptions = {}
+
+    def get_stream_metrics(self) -> List[LogStreamMetrics]:
+        """
+        Get the connection metrics of all active log streams, including the ones
+        opened by application subscriptions.
+
+        Returns:
+            List[LogStreamMetrics]: per stream device uuid, connection state, number of reconnects,
+            last and total time spent disconnected (in seconds), delivered lines and discarded duplicates.
+
+        Examples:
+            >>> balena.logs.get_stream_metrics()
+        """
+        streams = [stream for device_streams in self.__subscriptions.values() for stream in device_streams]
+        for subscription in self.__application_subscriptions.values():
+            streams += subscription.get_streams()
+
+        return [stream.get_metrics() for stream in streams]
 
     def stop(self) -> None:
         """
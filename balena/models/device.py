@@ -2,22 +2,31 @@ import binascii
 import datetime
 import os
 import re
-from typing import Any, Callable, List, Optional, TypedDict, Union, cast
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Tuple, TypedDict, Union, cast
 from urllib.parse import urljoin
 
 from deprecated import deprecated
 import requests
-from semver.version import Version
-from semver import compare as semver_compare
-from json.decoder import JSONDecodeError
 
 from .. import exceptions
 from ..auth import Auth
 from ..balena_auth import request
+from ..codec import decode_json
 from ..dependent_resource import DependentResource
 from ..hup import get_hup_action_type
 from ..pine import PineClient
 from ..resources import Message
+from ..rollout import (
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_POLL_INTERVAL,
+    DEFAULT_STALL_TIMEOUT,
+    DEFAULT_UPDATE_TIMEOUT,
+    DEFAULT_WAVE_SIZE,
+    OsUpdateRollout,
+    OsUpdateRolloutState,
+)
 from ..settings import Settings
 from ..types import AnyObject
 from ..types.models import BaseTagType, DeviceMetricsType, EnvironmentVariableBase, TypeDevice, TypeDeviceWithServices
@@ -29,7 +38,9 @@ from ..utils import (
     is_full_uuid,
     is_id,
     is_provisioned,
+    is_valid_semver,
     merge,
+    parse_semver,
     with_supervisor_locked_error,
 )
 from .application import Application
@@ -47,6 +58,33 @@ OVERRIDE_LOCK_ENV_VAR = "RESIN_OVERRIDE_LOCK"
 MIN_SUPERVISOR_MC_API = "7.0.0"
 MIN_OS_MC = "2.12.0"
 MIN_SUPERVISOR_APPS_API = "1.8.0-alpha.0"
+# Supervisor commands of a bulk action running at once
+DEFAULT_BULK_CONCURRENCY = 10
+BULK_ACTIONS = [
+    "ping",
+    "identify",
+    "restart_application",
+    "reboot",
+    "shutdown",
+    "purge",
+    "update",
+    "start_service",
+    "stop_service",
+    "restart_service",
+]
+BULK_FORCE_ACTIONS = ["reboot", "shutdown", "update"]
+BULK_SERVICE_ACTIONS = ["start_service", "stop_service", "restart_service"]
+ROLLOUT_DEVICE_FIELDS = [
+    "id",
+    "uuid",
+    "is_online",
+    "os_version",
+    "os_variant",
+    "is_of__device_type",
+    "provisioning_state",
+    "provisioning_progress",
+    "status",
+]
 
 
 class LocationType(TypedDict):
@@ -85,6 +123,22 @@ class SupervisorStateType(TypedDict):
     download_progress: str
 
 
+class DeviceBatchResult(TypedDict):
+    # devices the operation was applied to
+    updated: List[Union[str, int]]
+    # devices the operation was rejected for, with the reason
+    failed: Dict[Union[str, int], str]
+
+
+class DeviceActionResult(TypedDict):
+    # the device as given
+    target: Union[str, int]
+    # response of the supervisor, None when the action failed
+    response: Any
+    # why the action failed, e.g. SupervisorLocked when the device holds its update lock
+    error: Optional[Exception]
+
+
 class Device:
     """
     This class implements device model for balena python SDK.
@@ -160,11 +214,8 @@ class Device:
         self,
         uuid_or_id_or_ids: Union[str, int, List[int]],
         body: Any,
-        fn: Optional[Callable] = None,
+        method: Literal["patch", "delete"] = "patch",
     ) -> None:
-        if fn is None:
-            fn = self.__pine.patch
-
         if isinstance(uuid_or_id_or_ids, (int, str)):
             if is_id(uuid_or_id_or_ids):
                 resource_id = uuid_or_id_or_ids
@@ -173,7 +224,7 @@ class Device:
             else:
                 raise exceptions.InvalidParameter("uuid_or_id_or_ids", uuid_or_id_or_ids)
 
-            fn(
+            getattr(self.__pine, method)(
                 {
                     "resource": "device",
                     "id": resource_id,
@@ -181,32 +232,54 @@ class Device:
                 }
             )
         else:
-            chunk_size = 200
-            chunked_devices = [
-                uuid_or_id_or_ids[i : i + chunk_size]  # noqa: E203 type: ignore
-                for i in range(0, len(uuid_or_id_or_ids), chunk_size)
-            ]
-            for chunk in chunked_devices:
-                fn(
-                    {
-                        "resource": "device",
-                        "options": {"$filter": {"id": {"$in": chunk}}},
-                        "body": body,
-                    }
-                )
+            self.__pine.chunked(
+                method,
+                uuid_or_id_or_ids,
+                lambda chunk: {
+                    "resource": "device",
+                    "options": {"$filter": {"id": {"$in": chunk}}},
+                    "body": body,
+                },
+            )
+
+    def __get_many(self, uuids_or_ids: List[Union[str, int]], options: AnyObject) -> Dict[Union[str, int], Any]:
+        """
+        Fetch devices by id or full uuid with chunked `$in` filters, keyed by the given id or uuid.
+        Devices that are not found are left out.
+        """
+        ids = []
+        uuids = []
+        for uuid_or_id in uuids_or_ids:
+            if is_id(uuid_or_id):
+                ids.append(uuid_or_id)
+            elif is_full_uuid(uuid_or_id):
+                uuids.append(uuid_or_id)
+            else:
+                raise exceptions.InvalidParameter("uuids_or_ids", uuid_or_id)
+
+        devices = {}
+        for field, values in (("id", ids), ("uuid", uuids)):
+            for device in self.__pine.chunked(
+                "get",
+                list(dict.fromkeys(values)),
+                lambda chunk: {
+                    "resource": "device",
+                    "options": merge({"$filter": {field: {"$in": chunk}}}, merge(options, {"$select": field})),
+                },
+            ):
+                devices[device[field]] = device
+        return devices
 
     def __check_local_mode_supported(self, device: TypeDevice):
         if not is_provisioned(device):
             raise exceptions.LocalModeError(Message.DEVICE_NOT_PROVISIONED)
 
-        if not (
-            Version.parse(normalize_balena_semver(device["os_version"])) >= Version.parse(LOCAL_MODE_MIN_OS_VERSION)
-        ):
+        if not (parse_semver(normalize_balena_semver(device["os_version"])) >= parse_semver(LOCAL_MODE_MIN_OS_VERSION)):
             raise exceptions.LocalModeError(Message.DEVICE_OS_NOT_SUPPORT_LOCAL_MODE)
 
         if not (
-            Version.parse(normalize_balena_semver(device["supervisor_version"]))
-            >= Version.parse(LOCAL_MODE_MIN_SUPERVISOR_VERSION)
+            parse_semver(normalize_balena_semver(device["supervisor_version"]))
+            >= parse_semver(LOCAL_MODE_MIN_SUPERVISOR_VERSION)
         ):
             raise exceptions.LocalModeError(Message.DEVICE_SUPERVISOR_NOT_SUPPORT_LOCAL_MODE)
 
@@ -248,7 +321,7 @@ class Device:
                 if (
                     res.group(1)
                     and (not res.group(2) or device_info["os_variant"] == res.group(2))
-                    and semver_compare(parsed_current_ver, res.group(1)) == 0
+                    and parse_semver(parsed_current_ver).compare(parse_semver(res.group(1))) == 0
                 ):
                     return
             except Exception:
@@ -590,7 +663,7 @@ class Device:
         Args:
             uuid_or_id_or_ids (Union[str, int, List[int]]): device uuid (str) or id (int) or ids (List[int])
         """
-        self.__set(uuid_or_id_or_ids, body=None, fn=self.__pine.delete)
+        self.__set(uuid_or_id_or_ids, body=None, method="delete")
 
     def deactivate(self, uuid_or_id_or_ids: Union[str, int, List[int]]) -> None:
         """
@@ -667,7 +740,6 @@ class Device:
 
         self.set_custom_location(uuid_or_id_or_ids, {"latitude": "", "longitude": ""})
 
-    # TODO: enable device batching
     def move(
         self,
         uuid_or_id: Union[str, int],
@@ -683,40 +755,65 @@ class Device:
         Examples:
             >>> balena.models.device.move(123, 'RPI1Test')
         """
-        application_options = {
-            "$select": "id",
-            "$expand": {
-                "is_for__device_type": {
-                    "$select": "is_of__cpu_architecture",
-                    "$expand": {"is_of__cpu_architecture": {"$select": "slug"}},
-                }
-            },
-        }
+        app = self.__application.get(app_slug_or_uuid_or_id, {"$select": ["id", "is_for__device_type"]})
+        device = self.get(uuid_or_id, {"$select": "is_of__device_type"})
 
-        app = self.__application.get(app_slug_or_uuid_or_id, application_options)
-        app_cpu_arch_slug = app["is_for__device_type"][0]["is_of__cpu_architecture"][0]["slug"]
+        # checked against the device type compatibility matrix, without further requests
+        if not self.__device_type.is_compatible_with(
+            device["is_of__device_type"]["__id"], app["is_for__device_type"]["__id"]
+        ):
+            raise exceptions.IncompatibleApplication(app_slug_or_uuid_or_id)
 
-        device_options = {
-            "$select": "is_of__device_type",
-            "$expand": {
-                "is_of__device_type": {
-                    "$select": "is_of__cpu_architecture",
-                    "$expand": {
-                        "is_of__cpu_architecture": {
-                            "$select": "slug",
-                        }
-                    },
-                }
-            },
-        }
+        self.__set(uuid_or_id, {"belongs_to__application": app["id"]})
 
-        device = self.get(uuid_or_id, device_options)
-        device_cpu_arch_slug = device["is_of__device_type"][0]["is_of__cpu_architecture"][0]["slug"]
+    def move_many(
+        self,
+        uuids_or_ids: List[Union[str, int]],
+        app_slug_or_uuid_or_id: Union[str, int],
+    ) -> DeviceBatchResult:
+        """
+        Move several devices to another application.
+        The devices are fetched and moved in chunks, and their compatibility with the application is checked
+        against the device type compatibility matrix, so the number of requests grows with the number of chunks
+        instead of devices. Devices that are not found or are incompatible are reported and left in place.
 
-        if not self.__device_os.is_architecture_compatible_with(app_cpu_arch_slug, device_cpu_arch_slug):
-            raise exceptions.IncompatibleApplication(app_slug_or_uuid_or_id)
+        Args:
+            uuids_or_ids (List[Union[str, int]]): device full uuids (str) or ids (int).
+            app_slug_or_uuid_or_id (Union[str, int]): application slug (string), uuid (string) or id (number).
 
-        self.__set(uuid_or_id, {"belongs_to__application": app["id"]})
+        Returns:
+            DeviceBatchResult: the moved devices, and the reason each of the other ones was rejected.
+
+        Examples:
+            >>> balena.models.device.move_many([123, '8deb12a7d7592c2b7f9e44735c2b0a41'], 'RPI1Test')
+        """
+        app = self.__application.get(app_slug_or_uuid_or_id, {"$select": ["id", "is_for__device_type"]})
+        app_device_type_id = app["is_for__device_type"]["__id"]
+        devices = self.__get_many(uuids_or_ids, {"$select": ["id", "is_of__device_type"]})
+
+        result: DeviceBatchResult = {"updated": [], "failed": {}}
+        compatibility: Dict[int, bool] = {}
+        ids = []
+        for uuid_or_id in uuids_or_ids:
+            device = devices.get(uuid_or_id)
+            if device is None:
+                result["failed"][uuid_or_id] = exceptions.DeviceNotFound(uuid_or_id).message
+                continue
+
+            device_type_id = device["is_of__device_type"]["__id"]
+            if device_type_id not in compatibility:
+                compatibility[device_type_id] = self.__device_type.is_compatible_with(
+                    device_type_id, app_device_type_id
+                )
+            if not compatibility[device_type_id]:
+                result["failed"][uuid_or_id] = exceptions.IncompatibleApplication(app_slug_or_uuid_or_id).message
+                continue
+
+            ids.append(device["id"])
+            result["updated"].append(uuid_or_id)
+
+        self.__set(list(dict.fromkeys(ids)), {"belongs_to__application": app["id"]})
+        return result
 
     def __supervisor_request(self, method: str, path: str, body: Optional[AnyObject] = None):
         params = {"apikey": self.__supervisor_api_key}
@@ -728,8 +825,8 @@ class Device:
 
         if req.ok:
             try:
-                return req.json()
-            except JSONDecodeError:
+                return decode_json(req.content)
+            except ValueError:
                 return req.content.decode()
         else:
             raise exceptions.RequestError(body=req.content.decode(), status_code=req.status_code)
@@ -835,8 +932,8 @@ class Device:
             device = self.get(uuid_or_id, restart_request)
             device_id = device["id"]
 
-            if not Version.is_valid(device["supervisor_version"]) or (
-                Version.parse(device["supervisor_version"]) < Version.parse("7.0.0")
+            if not is_valid_semver(device["supervisor_version"]) or (
+                parse_semver(device["supervisor_version"]) < parse_semver("7.0.0")
             ):
                 return request(
                     method="POST",
@@ -1210,6 +1307,121 @@ class Device:
 
         with_supervisor_locked_error(__restart_service)
 
+    def bulk(
+        self,
+        action: str,
+        uuids_or_ids: List[Union[str, int]],
+        *,  # Force keyword arguments after this point
+        concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        force: bool = False,
+        image_id: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Iterator[DeviceActionResult]:
+        """
+        Run a supervisor command on several devices.
+        The devices and their applications are resolved upfront with chunked queries, and the commands run through
+        a pool of at most `concurrency` workers that follows the `request_limit` settings. A device that fails,
+        e.g. with SupervisorLocked while it holds its update lock, does not stop the others.
+
+        Args:
+            action (str): one of ping, identify, restart_application, reboot, shutdown, purge, update,
+                start_service, stop_service or restart_service.
+            uuids_or_ids (List[Union[str, int]]): device full uuids (str) or ids (int).
+            concurrency (int): maximum number of commands running at once, defaults to 10.
+            force (bool): override the update lock, only for reboot, shutdown and update.
+            image_id (Optional[int]): id of the image of the service, only for the service actions.
+            progress (Optional[Callable[[int, int], None]]): called with the number of devices done and the total.
+
+        Returns:
+            Iterator[DeviceActionResult]: the result of every device, as soon as it is done.
+
+        Examples:
+            >>> for result in balena.models.device.bulk('reboot', [123, '8deb12a7d7592c2b7f9e44735c2b0a41']):
+            ...     print(result['target'], result['error'])
+        """
+
+        if action not in BULK_ACTIONS:
+            raise exceptions.InvalidParameter("action", action)
+        if force and action not in BULK_FORCE_ACTIONS:
+            raise exceptions.InvalidParameter("force", force)
+        should_force = self.__should_force(force)
+        if action in BULK_SERVICE_ACTIONS and image_id is None:
+            raise exceptions.InvalidParameter("image_id", image_id)
+
+        targets = list(dict.fromkeys(uuids_or_ids))
+        devices = self.__get_many(targets, {"$select": ["id", "uuid", "supervisor_version", "belongs_to__application"]})
+
+        def run(target: Union[str, int]) -> DeviceActionResult:
+            try:
+                device = devices.get(target)
+                if device is None:
+                    raise exceptions.DeviceNotFound(target)
+                path, body = self.__get_bulk_request(action, device, should_force, image_id)
+                return {"target": target, "response": self.__post_bulk_request(path, body), "error": None}
+            except Exception as e:
+                return {"target": target, "response": None, "error": e}
+
+        def results() -> Iterator[DeviceActionResult]:
+            remaining = iter(targets)
+            running: "set[Future[DeviceActionResult]]" = set()
+            done = 0
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                try:
+                    # only a window of commands is submitted, so that an abandoned iteration stops early
+                    for target in remaining:
+                        running.add(executor.submit(run, target))
+                        if len(running) >= max(1, concurrency):
+                            break
+                    while running:
+                        finished, running = wait(running, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            done += 1
+                            if progress is not None:
+                                progress(done, len(targets))
+                            yield future.result()
+                            next_target = next(remaining, None)
+                            if next_target is not None:
+                                running.add(executor.submit(run, next_target))
+                finally:
+                    for future in running:
+                        future.cancel()
+
+        return results()
+
+    def __get_bulk_request(
+        self, action: str, device: Any, should_force: AnyObject, image_id: Optional[int]
+    ) -> Tuple[str, AnyObject]:
+        device_id = device["id"]
+        app_id = device["belongs_to__application"]["__id"]
+
+        if action == "ping":
+            return "/supervisor/ping", {"method": "GET", "deviceId": device_id, "appId": app_id}
+        if action == "identify":
+            return "/supervisor/v1/blink", {"uuid": device["uuid"]}
+        if action == "restart_application":
+            if not is_valid_semver(device["supervisor_version"]) or (
+                parse_semver(device["supervisor_version"]) < parse_semver("7.0.0")
+            ):
+                return f"device/{device_id}/restart", {}
+            return "/supervisor/v1/restart", {"deviceId": device_id, "appId": app_id, "data": {"appId": app_id}}
+        if action == "reboot":
+            return "/supervisor/v1/reboot", {"deviceId": device_id, "data": should_force}
+        if action == "purge":
+            return "/supervisor/v1/purge", {"deviceId": device_id, "appId": app_id, "data": {"appId": app_id}}
+        if action in BULK_SERVICE_ACTIONS:
+            ensure_version_compatibility(device["supervisor_version"] or "", MIN_SUPERVISOR_MC_API, "supervisor")
+            return f"/supervisor/v2/applications/{app_id}/{action.replace('_', '-')}", {
+                "deviceId": device_id,
+                "appId": app_id,
+                "data": {"appId": app_id, "imageId": image_id},
+            }
+        # shutdown and update
+        return f"/supervisor/v1/{action}", {"deviceId": device_id, "appId": app_id, "data": should_force}
+
+    def __post_bulk_request(self, path: str, body: AnyObject) -> Any:
+        # shares the rate limit and the retries of the pine requests
+        return with_supervisor_locked_error(lambda: self.__pine.api_request("POST", path, body))
+
     def get_supervisor_target_state(self, uuid_or_id: Union[str, int]) -> Any:
         """
         Get the supervisor target state on a device
@@ -1302,42 +1514,26 @@ class Device:
             "$expand": {"is_of__cpu_architecture": {"$select": "slug"}},
         }
 
-        application_options = {
-            "$select": "id",
-            "$expand": {"is_for__device_type": device_type_options},
-        }
-
-        # TODO: paralelize this 4 requests
+        # TODO: paralelize this 3 requests
         user_id = self.__auth.get_user_info()["id"]
         api_key = self.__application.generate_provisioning_key(application_slug_or_uuid_or_id)
 
-        app = self.__application.get(application_slug_or_uuid_or_id, application_options)
-        if isinstance(device_type_slug, str):
-            device_type = self.__device_type.get(
-                device_type_slug,
-                {
-                    "$select": "slug",
-                    "$expand": {"is_of__cpu_architecture": {"$select": "slug"}},
-                },
-            )
-        else:
-            device_type = None
+        app = self.__application.get(application_slug_or_uuid_or_id, {"$select": ["id", "is_for__device_type"]})
+        # the device types are resolved from the device type index, without further requests
+        app_device_type = self.__device_type.get(app["is_for__device_type"]["__id"], device_type_options)
 
-        if device_type is not None:
-            is_compatible_parameter = self.__device_os.is_architecture_compatible_with(
-                device_type["is_of__cpu_architecture"][0]["slug"],
-                app["is_for__device_type"][0]["is_of__cpu_architecture"][0]["slug"],
-            )
+        if isinstance(device_type_slug, str):
+            device_type = self.__device_type.get(device_type_slug, {"$select": ["id", "slug"]})
 
-            if not is_compatible_parameter:
-                app_type_slug = app["is_for__device_type"][0]["is_of__cpu_architecture"][0]["slug"]
+            if not self.__device_type.is_compatible_with(device_type["id"], app["is_for__device_type"]["__id"]):
+                app_type_slug = app_device_type["is_of__cpu_architecture"][0]["slug"]
 
                 err_msg = f"{device_type_slug} is not compactible with application {app_type_slug} device typ"
                 raise exceptions.InvalidDeviceType(err_msg)
 
             device_type = device_type["slug"]
         else:
-            device_type = app["is_for__device_type"][0]["slug"]
+            device_type = app_device_type["slug"]
 
         return request(
             method="POST",
@@ -1622,7 +1818,6 @@ class Device:
 
         return not bool(self.get(uuid_or_id, {"$select": "is_pinned_on__release"})["is_pinned_on__release"])
 
-    # TODO: enable device batching
     def pin_to_release(
         self,
         uuid_or_id: Union[str, int],
@@ -1671,6 +1866,74 @@ class Device:
             }
         )
 
+    def pin_many_to_release(
+        self,
+        uuids_or_ids: List[Union[str, int]],
+        full_release_hash_or_id: Union[str, int],
+    ) -> DeviceBatchResult:
+        """
+        Configures several devices to run a particular release
+        and not get updated when the current application release changes.
+        The release is resolved once and the devices are fetched and pinned in chunks, so the number of requests
+        grows with the number of chunks instead of devices. Devices that are not found or do not belong to the
+        application of the release are reported and left untouched.
+
+        Args:
+            uuids_or_ids (List[Union[str, int]]): device full uuids (str) or ids (int).
+            full_release_hash_or_id (Union[str, int]) : the hash of a successful release (string) or id (number)
+
+        Returns:
+            DeviceBatchResult: the pinned devices, and the reason each of the other ones was rejected.
+
+        Examples:
+            >>> balena.models.device.pin_many_to_release([123, 456], '45c90004de73557ded7274d4896a6db90ea61e36')
+        """
+        release_filter: AnyObject = {"status": "success"}
+        if is_id(full_release_hash_or_id):
+            release_filter["id"] = full_release_hash_or_id
+        else:
+            release_filter["commit"] = full_release_hash_or_id
+
+        releases = self.__pine.get(
+            {
+                "resource": "release",
+                "options": {
+                    "$select": ["id", "belongs_to__application"],
+                    "$filter": release_filter,
+                    "$orderby": "created_at desc",
+                },
+            }
+        )
+        if len(releases) == 0:
+            raise exceptions.ReleaseNotFound(full_release_hash_or_id)
+
+        # the latest matching release of each application, like pin_to_release
+        release_by_app: Dict[int, int] = {}
+        for release in releases:
+            release_by_app.setdefault(release["belongs_to__application"]["__id"], release["id"])
+
+        devices = self.__get_many(uuids_or_ids, {"$select": ["id", "belongs_to__application"]})
+
+        result: DeviceBatchResult = {"updated": [], "failed": {}}
+        ids_by_release: Dict[int, List[int]] = {}
+        for uuid_or_id in uuids_or_ids:
+            device = devices.get(uuid_or_id)
+            if device is None:
+                result["failed"][uuid_or_id] = exceptions.DeviceNotFound(uuid_or_id).message
+                continue
+
+            release_id = release_by_app.get(device["belongs_to__application"]["__id"])
+            if release_id is None:
+                result["failed"][uuid_or_id] = exceptions.ReleaseNotFound(full_release_hash_or_id).message
+                continue
+
+            ids_by_release.setdefault(release_id, []).append(device["id"])
+            result["updated"].append(uuid_or_id)
+
+        for release_id, ids in ids_by_release.items():
+            self.__set(list(dict.fromkeys(ids)), {"is_pinned_on__release": release_id})
+        return result
+
     def track_application_release(self, uuid_or_id_or_ids: Union[str, int, List[int]]) -> None:
         """
         Configure a specific device to track the current application release.
@@ -1681,7 +1944,6 @@ class Device:
 
         self.__set(uuid_or_id_or_ids, {"is_pinned_on__release": None})
 
-    # TODO: enable device batching
     def pin_to_supervisor_release(
         self,
         uuid_or_id: Union[str, int],
@@ -1725,6 +1987,74 @@ class Device:
             }
         )
 
+    def pin_many_to_supervisor_release(
+        self,
+        uuids_or_ids: List[Union[str, int]],
+        supervisor_version_or_id: Union[str, int],
+    ) -> DeviceBatchResult:
+        """
+        Set several devices to run a particular supervisor release.
+        The devices are fetched and pinned in chunks and grouped by cpu architecture, so the supervisor release
+        is only resolved once per architecture. Devices that are not found, whose architecture has no such
+        supervisor release, or whose supervisor or host OS is too old, are reported and left untouched.
+
+        Args:
+            uuids_or_ids (List[Union[str, int]]): device full uuids (str) or ids (int).
+            supervisor_version_or_id (Union[str, int]): the version of a released supervisor (string) or id (number)
+
+        Returns:
+            DeviceBatchResult: the pinned devices, and the reason each of the other ones was rejected.
+
+        Examples:
+            >>> balena.models.device.pin_many_to_supervisor_release([123, 456], 'v13.0.0')
+        """
+        devices = self.__get_many(
+            uuids_or_ids, {"$select": ["id", "supervisor_version", "os_version", "is_of__device_type"]}
+        )
+
+        release_options = {
+            "$top": 1,
+            "$select": "id",
+            "$filter": {"id" if is_id(supervisor_version_or_id) else "raw_version": supervisor_version_or_id},
+        }
+        # the cpu architectures come from the device type index, the releases are resolved once per architecture
+        release_by_arch: Dict[int, Optional[int]] = {}
+
+        result: DeviceBatchResult = {"updated": [], "failed": {}}
+        ids_by_release: Dict[int, List[int]] = {}
+        for uuid_or_id in uuids_or_ids:
+            device = devices.get(uuid_or_id)
+            if device is None:
+                result["failed"][uuid_or_id] = exceptions.DeviceNotFound(uuid_or_id).message
+                continue
+
+            cpu_arch_id = self.__device_type.get(
+                device["is_of__device_type"]["__id"], {"$select": "is_of__cpu_architecture"}
+            )["is_of__cpu_architecture"]["__id"]
+            if cpu_arch_id not in release_by_arch:
+                releases = self.__device_os.get_supervisor_releases_for_cpu_architecture(cpu_arch_id, release_options)
+                release_by_arch[cpu_arch_id] = releases[0]["id"] if len(releases) > 0 else None
+
+            release_id = release_by_arch[cpu_arch_id]
+            if release_id is None:
+                result["failed"][uuid_or_id] = f"Supervisor release not found {supervisor_version_or_id}"
+                continue
+
+            try:
+                # devices that are not provisioned yet have no versions to check
+                ensure_version_compatibility(device["supervisor_version"] or "", MIN_SUPERVISOR_MC_API, "supervisor")
+                ensure_version_compatibility(device["os_version"] or "", MIN_OS_MC, "host OS")
+            except ValueError as e:
+                result["failed"][uuid_or_id] = str(e)
+                continue
+
+            ids_by_release.setdefault(release_id, []).append(device["id"])
+            result["updated"].append(uuid_or_id)
+
+        for release_id, ids in ids_by_release.items():
+            self.__set(list(dict.fromkeys(ids)), {"should_be_managed_by__release": release_id})
+        return result
+
     def start_os_update(
         self,
         uuid_or_id: Union[str, int],
@@ -1772,21 +2102,144 @@ class Device:
         if not [v for v in available_versions if target_os_version == v["raw_version"]]:
             raise exceptions.InvalidParameter("target_os_version", target_os_version)
 
-        data = {"parameters": {"target_version": target_os_version}}
-
-        url_base = self.__config.get_all()["deviceUrlsBase"]
         if not isinstance(run_detached, bool):
             raise ValueError(f"run_detached must be True or False, got {type(run_detached)}: {run_detached}")
+
+        return self.__start_os_update_action(
+            device["uuid"], target_os_version, run_detached, self.__config.get_all()["deviceUrlsBase"]
+        )
+
+    def __start_os_update_action(
+        self, uuid: str, target_os_version: str, run_detached: bool, url_base: str
+    ) -> HUPStatusResponse:
+        data = {"parameters": {"target_version": target_os_version}}
         action_api_version = "v2" if run_detached is True else self.__settings.get("device_actions_endpoint_version")
 
         return request(
             method="POST",
             settings=self.__settings,
-            path=f"{device['uuid']}/{self.__device_os.OS_UPDATE_ACTION_NAME}",
+            path=f"{uuid}/{self.__device_os.OS_UPDATE_ACTION_NAME}",
             body=data,
             endpoint=f"https://actions.{url_base}/{action_api_version}/",
         )
 
+    def rollout_os_update(
+        self,
+        uuids_or_ids: List[Union[str, int]],
+        target_os_version: str,
+        *,  # Force keyword arguments after this point
+        wave_size: int = DEFAULT_WAVE_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        failure_threshold: float = DEFAULT_FAILURE_THRESHOLD,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        update_timeout: float = DEFAULT_UPDATE_TIMEOUT,
+        state_path: Optional[str] = None,
+        progress: Optional[Callable[[OsUpdateRolloutState], None]] = None,
+        run_detached: bool = True,
+        stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+        min_failure_sample: Optional[int] = None,
+    ) -> OsUpdateRolloutState:
+        """
+        Update the OS of a set of devices in staged waves, and wait for the updates to finish.
+
+        All the devices are validated upfront, like `start_os_update` does, against the cached OS versions of
+        their device types. The devices of each wave must be online when the wave starts, at most
+        `max_concurrency` updates run at once, and the next wave only starts once all the updates of the current
+        one finished. The progress of the running updates is polled with a single query for all of them, and
+        an update whose device status and provisioning progress do not change for `stall_timeout` fails.
+        The rollout pauses once the share of failed updates reaches `failure_threshold`, from
+        `min_failure_sample` finished updates on.
+
+        When a `state_path` is given, the state of the rollout is saved there after every step, and calling it
+        again with the same path resumes an interrupted or paused rollout (accepting the failures so far)
+        instead of starting over.
+
+        Args:
+            uuids_or_ids (List[Union[str, int]]): device full uuids (str) or ids (int).
+            target_os_version (str): semver-compatible version for the target devices, see `start_os_update`.
+            wave_size (int): number of devices per wave, defaults to 50.
+            max_concurrency (int): maximum number of updates running at once, defaults to 10.
+            failure_threshold (float): share of failed updates that pauses the rollout, defaults to 0.1.
+            poll_interval (float): seconds between progress polls, defaults to 30.
+            update_timeout (float): seconds after which a running update is considered failed, defaults to 3600.
+            state_path (Optional[str]): file the state of the rollout is saved to, and resumed from.
+            progress (Optional[Callable[[OsUpdateRolloutState], None]]): called with the state after every poll.
+            run_detached (bool): run the updates in detached mode, defaults to True.
+            stall_timeout (float): seconds without any progress after which a running update is considered failed,
+                defaults to 900.
+            min_failure_sample (Optional[int]): finished updates from which the failure threshold applies, defaults
+                to the wave size.
+
+        Returns:
+            OsUpdateRolloutState: the final state, with a "completed" or "paused" status.
+
+        Examples:
+            >>> state = balena.models.device.rollout_os_update(uuids, '2.89.0+rev1', state_path='rollout.json')
+            >>> state['status'], len(state['succeeded']), state['failed']
+        """
+        if target_os_version is None:
+            raise exceptions.InvalidParameter("target_os_version", None)
+
+        # the deviceUrlsBase and the OS catalogs are only fetched once for all the devices
+        url_base = self.__config.get_all()["deviceUrlsBase"]
+        available_versions: Dict[str, set] = {}
+
+        def fetch_devices(keys: List[Union[str, int]]) -> Dict[Union[str, int], Any]:
+            devices = self.__get_many(keys, {"$select": ROLLOUT_DEVICE_FIELDS})
+            for device in devices.values():
+                device["is_of__device_type"] = [
+                    self.__device_type.get(device["is_of__device_type"]["__id"], {"$select": "slug"})
+                ]
+
+            slugs = {device["is_of__device_type"][0]["slug"] for device in devices.values()}
+            missing = [slug for slug in slugs if slug not in available_versions]
+            if missing:
+                self.__device_os.prefetch_os_versions(missing)
+                for slug in missing:
+                    available_versions[slug] = {
+                        v["raw_version"] for v in self.__device_os.get_available_os_versions(slug)
+                    }
+            return devices
+
+        def validate_device(device: Any, online: bool) -> Optional[str]:
+            try:
+                self.__check_os_update_target(device, target_os_version, "start" if online else "validate")
+                if target_os_version not in available_versions[device["is_of__device_type"][0]["slug"]]:
+                    raise exceptions.InvalidParameter("target_os_version", target_os_version)
+            except exceptions.BalenaException as e:
+                return e.message
+            return None
+
+        target_version = re.sub(r"\.(dev|prod)$", "", target_os_version)
+
+        def get_update_status(device: Any) -> Optional[Literal["succeeded", "failed"]]:
+            try:
+                current_version = normalize_balena_semver(device["os_version"] or "")
+                if parse_semver(current_version).compare(parse_semver(target_version)) == 0:
+                    return "succeeded"
+            except ValueError:
+                pass
+            if any("fail" in (device[field] or "").lower() for field in ("provisioning_state", "status")):
+                return "failed"
+            return None
+
+        return OsUpdateRollout(
+            target_os_version,
+            fetch_devices,
+            validate_device,
+            lambda uuid: self.__start_os_update_action(uuid, target_os_version, run_detached, url_base),
+            get_update_status,
+            wave_size,
+            max_concurrency,
+            failure_threshold,
+            poll_interval,
+            update_timeout,
+            state_path,
+            progress,
+            stall_timeout,
+            min_failure_sample,
+        ).run(uuids_or_ids)
+
     def pin_to_os_release(
         self,
         uuid_or_id: Union[str, int],
@@ -2031,12 +2484,14 @@ class DeviceTag(DependentResource[BaseTagType]):
             )
         )
 
-    def get_all_by_device(self, uuid_or_id: Union[str, int], options: AnyObject = {}) -> List[BaseTagType]:
+    def get_all_by_device(
+        self, uuid_or_id: Union[str, int, List[int]], options: AnyObject = {}
+    ) -> List[BaseTagType]:
         """
-        Get all device tags for a device.
+        Get all device tags for a device, or for several devices with chunked requests.
 
         Args:
-            uuid_or_id (Union[str, int]): device uuid (string) or id (number)
+            uuid_or_id (Union[str, int, List[int]]): device uuid (string) or id (number) or ids (List[int])
             options (AnyObject): extra pine options to use
 
         Returns:
@@ -2044,8 +2499,12 @@ class DeviceTag(DependentResource[BaseTagType]):
 
         Examples:
             >>> balena.models.device.tags.get_all_by_device('a03ab646ca5a4f11b4d05c1f1c3b4e72')
+            >>> balena.models.device.tags.get_all_by_device([123, 456])
         """
 
+        if isinstance(uuid_or_id, list):
+            return super(DeviceTag, self)._get_all_by_parent(uuid_or_id, options)
+
         id = self.__device.get(uuid_or_id, {"$select": "id"})["id"]
         return super(DeviceTag, self)._get_all_by_parent(id, options)
 
@@ -2112,19 +2571,23 @@ class DeviceTag(DependentResource[BaseTagType]):
         device_id = uuid_or_id if is_id(uuid_or_id) else self.__device.get(uuid_or_id, {"$select": "id"})["id"]
         super(DeviceTag, self)._set(device_id, tag_key, value)
 
-    def remove(self, uuid_or_id: Union[str, int], tag_key: str) -> None:
+    def remove(self, uuid_or_id: Union[str, int, List[int]], tag_key: str) -> None:
         """
-        Remove a device tag.
+        Remove a device tag, from a device or from several devices with chunked requests.
 
         Args:
-            uuid_or_id (Union[str, int]): device uuid or device id.
+            uuid_or_id (Union[str, int, List[int]]): device uuid or device id or ids (List[int]).
             tag_key (str): tag key.
 
         Examples:
             >>> balena.models.device.tags.remove('f5213eac0d63ac477', 'testtag')
+            >>> balena.models.device.tags.remove([123, 456], 'testtag')
         """
 
-        device_id = uuid_or_id if is_id(uuid_or_id) else self.__device.get(uuid_or_id, {"$select": "id"})["id"]
+        if isinstance(uuid_or_id, list) or is_id(uuid_or_id):
+            device_id = uuid_or_id
+        else:
+            device_id = self.__device.get(uuid_or_id, {"$select": "id"})["id"]
         super(DeviceTag, self)._remove(device_id, tag_key)
 
 
@@ -2253,12 +2716,14 @@ class DeviceEnvVariable(DependentResource[EnvironmentVariableBase]):
             pine,
         )
 
-    def get_all_by_device(self, uuid_or_id: Union[str, int], options: AnyObject = {}) -> List[EnvironmentVariableBase]:
+    def get_all_by_device(
+        self, uuid_or_id: Union[str, int, List[int]], options: AnyObject = {}
+    ) -> List[EnvironmentVariableBase]:
         """
-        Get all device environment variables.
+        Get all device environment variables, of a device or of several devices with chunked requests.
 
         Args:
-            uuid_or_id (Union[str, int]): device uuid (string) or id (int)
+            uuid_or_id (Union[str, int, List[int]]): device uuid (string) or id (int) or ids (List[int])
             options (AnyObject): extra pine options to use
 
         Returns:
@@ -2266,6 +2731,7 @@ class DeviceEnvVariable(DependentResource[EnvironmentVariableBase]):
 
         Examples:
             >>> balena.models.device.env_var.get_all_by_device('8deb12a7d7592c2b7f9e44735c2b0a41')
+            >>> balena.models.device.env_var.get_all_by_device([2184, 2185])
         """
         return super(DeviceEnvVariable, self)._get_all_by_parent(uuid_or_id, options)
 
@@ -2334,16 +2800,17 @@ class DeviceEnvVariable(DependentResource[EnvironmentVariableBase]):
         """
         super(DeviceEnvVariable, self)._set(uuid_or_id, env_var_name, value)
 
-    def remove(self, uuid_or_id: Union[str, int], key: str) -> None:
+    def remove(self, uuid_or_id: Union[str, int, List[int]], key: str) -> None:
         """
-        Remove a device environment variable.
+        Remove a device environment variable, from a device or from several devices with chunked requests.
 
         Args:
-            uuid_or_id (Union[str, int]): device uuid (string) or id (int)
+            uuid_or_id (Union[str, int, List[int]]): device uuid (string) or id (int) or ids (List[int])
             key (str): environment variable name.
 
         Examples:
             >>> balena.models.device.env_var.remove(2184, 'test_env4')
+            >>> balena.models.device.env_var.remove([2184, 2185], 'test_env4')
         """
         super(DeviceEnvVariable, self)._remove(uuid_or_id, key)
 
@@ -1,12 +1,175 @@
-from typing import List, Union
+import copy
+import time
+from threading import Lock
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
+from weakref import WeakKeyDictionary
 
 from .. import exceptions
+from ..balena_auth import get_token
 from ..pine import PineClient
+from ..resource_cache import get_cache_scope
 from ..settings import Settings
 from ..types import AnyObject
 from ..types.models import DeviceTypeType
 from ..utils import merge
 
+# Architectures that can run, in addition to their own, the applications built for other architectures
+ARCH_COMPATIBILITY_MAP = {"aarch64": ["armv7hf", "rpi"], "armv7hf": ["rpi"]}
+
+# Seconds the device type catalog is used for before it is fetched again
+DEVICE_TYPE_CATALOG_TTL = 60 * 60
+
+# Navigation resources expanded in the catalog, lookups that expand a subset of them are served from it
+CATALOG_EXPANSIONS: Dict[str, Dict[str, Any]] = {
+    "device_type_alias": {"$select": ["is_referenced_by__alias"]},
+    "is_of__cpu_architecture": {"$select": ["id", "slug"]},
+    "is_default_for__application": {"$select": ["id", "is_archived"], "$filter": {"is_host": True}},
+}
+
+
+def _as_list(value: Union[str, List[str]]) -> List[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _get_architecture(device_type: Dict[str, Any]) -> str:
+    return device_type["is_of__cpu_architecture"][0]["slug"]
+
+
+def _is_architecture_compatible(device_architecture: str, application_architecture: str) -> bool:
+    if device_architecture == application_architecture:
+        return True
+    return application_architecture in ARCH_COMPATIBILITY_MAP.get(device_architecture, [])
+
+
+def _is_servable(options: AnyObject) -> bool:
+    if not set(options) <= {"$select", "$expand"}:
+        return False
+
+    expand = options.get("$expand", {})
+    if not isinstance(expand, dict):
+        return False
+
+    for name, expand_options in expand.items():
+        catalog_options = CATALOG_EXPANSIONS.get(name)
+        if (
+            catalog_options is None
+            or not isinstance(expand_options, dict)
+            or not set(expand_options) <= {"$select", "$filter"}
+            or expand_options.get("$filter") != catalog_options.get("$filter")
+            or not set(_as_list(expand_options.get("$select", []))) <= set(catalog_options["$select"])
+            or "$select" not in expand_options
+        ):
+            return False
+
+    select = options.get("$select")
+    # reverse navigation resources can only be expanded
+    if select is not None and any(
+        field in CATALOG_EXPANSIONS and field not in expand and field != "is_of__cpu_architecture"
+        for field in _as_list(select)
+    ):
+        return False
+    return True
+
+
+def _project(device_type: Dict[str, Any], options: AnyObject) -> Any:
+    expand = options.get("$expand", {})
+    select = options.get("$select")
+    if select is not None:
+        fields = _as_list(select)
+    else:
+        fields = [key for key in device_type if key not in CATALOG_EXPANSIONS] + ["is_of__cpu_architecture"]
+
+    result = {}
+    for field in fields + [name for name in expand if name not in fields]:
+        if field in expand:
+            expand_fields = _as_list(expand[field]["$select"])
+            result[field] = [{key: item[key] for key in expand_fields} for item in device_type[field]]
+        elif field == "is_of__cpu_architecture":
+            result[field] = {"__id": device_type[field][0]["id"]}
+        elif field in device_type:
+            result[field] = device_type[field]
+    return copy.deepcopy(result)
+
+
+class DeviceTypeCatalog:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    Index of all the device types, with their aliases, cpu architecture and host apps expanded,
+    for constant time lookups by id, slug, alias or name.
+    Aliases are only resolved by `get`, like `DeviceType.get` does, while `get_by_slug_or_name` only matches
+    the slug or the name, like `DeviceType.get_by_slug_or_name` does.
+    It also holds the architecture compatibility matrix: for every device type, the ids of the device types
+    whose devices can run applications built for it.
+    """
+
+    def __init__(self, device_types: List[Dict[str, Any]]):
+        self.__device_types = device_types
+        self.__by_id: Dict[int, Dict[str, Any]] = {}
+        self.__by_slug: Dict[str, Dict[str, Any]] = {}
+        self.__by_alias: Dict[str, Dict[str, Any]] = {}
+        self.__by_name: Dict[str, Dict[str, Any]] = {}
+        ids_by_arch: Dict[str, List[int]] = {}
+
+        for device_type in device_types:
+            self.__by_id[device_type["id"]] = device_type
+            self.__by_name.setdefault(device_type["name"], device_type)
+            self.__by_slug[device_type["slug"]] = device_type
+            self.__by_alias[device_type["slug"]] = device_type
+            for alias in device_type.get("device_type_alias", []):
+                self.__by_alias.setdefault(alias["is_referenced_by__alias"], device_type)
+            ids_by_arch.setdefault(_get_architecture(device_type), []).append(device_type["id"])
+
+        compatible_by_arch = {
+            arch: frozenset(
+                device_type_id
+                for device_arch, ids in ids_by_arch.items()
+                if _is_architecture_compatible(device_arch, arch)
+                for device_type_id in ids
+            )
+            for arch in ids_by_arch
+        }
+        self.__compatible: Dict[int, FrozenSet[int]] = {
+            device_type["id"]: compatible_by_arch[_get_architecture(device_type)] for device_type in device_types
+        }
+
+    def get_compatible_ids(self, application_device_type_id: int) -> Optional[FrozenSet[int]]:
+        """
+        Ids of the device types that can run applications of a device type, None if it is unknown.
+        """
+        return self.__compatible.get(application_device_type_id)
+
+    def get(self, id_or_slug: Union[str, int]) -> Optional[Dict[str, Any]]:
+        if isinstance(id_or_slug, str):
+            return self.__by_alias.get(id_or_slug)
+        return self.__by_id.get(id_or_slug)
+
+    def get_by_slug_or_name(self, slug_or_name: str) -> Optional[Dict[str, Any]]:
+        return self.__by_name.get(slug_or_name) or self.__by_slug.get(slug_or_name)
+
+    def get_all(self) -> List[Dict[str, Any]]:
+        return self.__device_types
+
+
+__catalogs: "WeakKeyDictionary[Settings, Tuple[float, str, DeviceTypeCatalog]]" = WeakKeyDictionary()
+__catalogs_lock = Lock()
+
+
+def _get_cached_catalog(settings: Settings, scope: str) -> Optional[DeviceTypeCatalog]:
+    with __catalogs_lock:
+        entry = __catalogs.get(settings)
+    if entry is None or entry[0] <= time.monotonic() or entry[1] != scope:
+        return None
+    return entry[2]
+
+
+def _set_cached_catalog(settings: Settings, scope: str, catalog: Optional[DeviceTypeCatalog]) -> None:
+    with __catalogs_lock:
+        if catalog is None:
+            __catalogs.pop(settings, None)
+        else:
+            __catalogs[settings] = (time.monotonic() + DEVICE_TYPE_CATALOG_TTL, scope, catalog)
+
 
 class DeviceType:
     """
@@ -18,9 +181,94 @@ class DeviceType:
         self.__pine = pine
         self.__settings = settings
 
+    def get_catalog(self) -> DeviceTypeCatalog:
+        """
+        Get the index of all the device types, fetched with a single request and kept in memory for an hour.
+        Lookups by id, slug, alias or name that only select fields, or expand the cpu architecture, the aliases
+        or the host apps, are served from it without any request.
+
+        Returns:
+            DeviceTypeCatalog: the device type index.
+
+        Examples:
+            >>> balena.models.device_type.get_catalog().get('raspberrypi3')
+        """
+        scope = get_cache_scope(get_token(self.__settings))
+        catalog = _get_cached_catalog(self.__settings, scope)
+        if catalog is None:
+            catalog = DeviceTypeCatalog(self.get_all({"$expand": copy.deepcopy(CATALOG_EXPANSIONS)}))
+            _set_cached_catalog(self.__settings, scope, catalog)
+        return catalog
+
+    def refresh_catalog(self) -> None:
+        """
+        Drop the device type index, so it is fetched again on the next lookup.
+
+        Examples:
+            >>> balena.models.device_type.refresh_catalog()
+        """
+        _set_cached_catalog(self.__settings, "", None)
+
+    def is_compatible_with(
+        self, device_type_id_or_slug: Union[str, int], application_device_type_id_or_slug: Union[str, int]
+    ) -> bool:
+        """
+        Whether devices of a device type can run the applications of another one, e.g. when moving a device
+        to an application or registering it to one, based on their cpu architectures.
+        Device types in the device type index are checked against its precomputed compatibility matrix
+        without any request.
+
+        Args:
+            device_type_id_or_slug (Union[str, int]): device type slug or alias (string) or id (int) of the device.
+            application_device_type_id_or_slug (Union[str, int]): device type slug or alias (string) or id (int)
+            of the application.
+
+        Returns:
+            bool: whether the device type can run the applications of the other one.
+
+        Examples:
+            >>> balena.models.device_type.is_compatible_with('raspberrypi4-64', 'raspberrypi3')
+            True
+        """
+        catalog = self.get_catalog()
+        device_type = catalog.get(device_type_id_or_slug)
+        application_device_type = catalog.get(application_device_type_id_or_slug)
+        if device_type is not None and application_device_type is not None:
+            compatible_ids = catalog.get_compatible_ids(application_device_type["id"])
+            return compatible_ids is not None and device_type["id"] in compatible_ids
+
+        options = {"$select": "id", "$expand": {"is_of__cpu_architecture": {"$select": "slug"}}}
+        return _is_architecture_compatible(
+            _get_architecture(self.get(device_type_id_or_slug, options)),
+            _get_architecture(self.get(application_device_type_id_or_slug, options)),
+        )
+
+    def get_compatible_device_types(self, application_device_type_id_or_slug: Union[str, int]) -> List[str]:
+        """
+        Get the slugs of the device types whose devices can run the applications of a device type.
+
+        Args:
+            application_device_type_id_or_slug (Union[str, int]): device type slug or alias (string) or id (int).
+
+        Returns:
+            List[str]: device type slugs.
+
+        Examples:
+            >>> balena.models.device_type.get_compatible_device_types('raspberry-pi')
+        """
+        catalog = self.get_catalog()
+        application_device_type = catalog.get(application_device_type_id_or_slug)
+        if application_device_type is None:
+            raise exceptions.InvalidDeviceType(application_device_type_id_or_slug)
+
+        compatible_ids = catalog.get_compatible_ids(application_device_type["id"]) or frozenset()
+        return [device_type["slug"] for device_type in catalog.get_all() if device_type["id"] in compatible_ids]
+
     def get(self, id_or_slug: Union[str, int], options: AnyObject = {}) -> DeviceTypeType:
         """
         Get a single device type.
+        Lookups that only select fields, or expand what the device type index holds, are served from it,
+        see `get_catalog`.
 
         Args:
             id_or_slug (Union[str, int]): device type slug or alias (string) or id (int).
@@ -33,6 +281,11 @@ class DeviceType:
         if id_or_slug is None:
             raise exceptions.InvalidDeviceType(id_or_slug)
 
+        if _is_servable(options):
+            device_type = self.get_catalog().get(id_or_slug)
+            if device_type is not None:
+                return _project(device_type, options)
+
         if isinstance(id_or_slug, str):
             device_types = self.get_all(
                 merge(
@@ -136,6 +389,7 @@ class DeviceType:
     def get_by_slug_or_name(self, slug_or_name: str, options: AnyObject = {}) -> DeviceTypeType:
         """
         Get a single device type by slug or name.
+        Device type aliases are not matched, `get` resolves them.
 
         Args:
             slug_or_name (str): device type slug or name.
@@ -145,6 +399,11 @@ class DeviceType:
             DeviceTypeType: Returns the device type
         """
 
+        if _is_servable(options):
+            device_type = self.get_catalog().get_by_slug_or_name(slug_or_name)
+            if device_type is not None:
+                return _project(device_type, options)
+
         device_types = self.get_all(
             merge(
                 {
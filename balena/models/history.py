@@ -46,16 +46,17 @@ class DeviceHistory:
 
     def get_all_by_device(
         self,
-        uuid_or_id: Union[str, int],
+        uuid_or_id: Union[str, int, List[Union[str, int]]],
         from_date: datetime = datetime.utcnow() + timedelta(days=-7),
         to_date: Optional[datetime] = None,
         options: AnyObject = {},
     ) -> List[DeviceHistoryType]:
         """
-        Get all device history entries for a device.
+        Get all device history entries for a device, or for several devices with chunked requests.
 
         Args:
-            uuid_or_id (str): device uuid (32 / 62 digits string) or id (number) __note__: No short IDs supported
+            uuid_or_id (Union[str, int, List[Union[str, int]]]): device uuid (32 / 62 digits string) or id (number),
+                or a list of them __note__: No short IDs supported
             from_date (datetime): history entries newer than or equal to this timestamp. Defaults to 7 days ago
             to_date (datetime): history entries younger or equal to this date.
             options (AnyObject): extra pine options to use
@@ -66,6 +67,7 @@ class DeviceHistory:
         Examples:
             >>> balena.models.device.history.get_all_by_device('6046335305c8142883a4466d30abe211')
             >>> balena.models.device.history.get_all_by_device(11196426)
+            >>> balena.models.device.history.get_all_by_device([11196426, '6046335305c8142883a4466d30abe211'])
             >>> balena.models.device.history.get_all_by_device(
             ...     11196426, from_date=datetime.utcnow() + timedelta(days=-5)
             ... )
@@ -77,6 +79,9 @@ class DeviceHistory:
 
         """
         dollar_filter = history_timerange_filter_with_guard(from_date, to_date)
+        if isinstance(uuid_or_id, list):
+            return self.__get_all_by_devices(uuid_or_id, dollar_filter, options)
+
         if is_id(uuid_or_id):
             dollar_filter = {**dollar_filter, "tracks__device": uuid_or_id}
         elif is_full_uuid(uuid_or_id):
@@ -86,6 +91,31 @@ class DeviceHistory:
 
         return self.__pine.get({"resource": "device_history", "options": merge({"$filter": dollar_filter}, options)})
 
+    def __get_all_by_devices(
+        self, uuids_or_ids: List[Union[str, int]], dollar_filter: AnyObject, options: AnyObject
+    ) -> List[DeviceHistoryType]:
+        ids = []
+        uuids = []
+        for uuid_or_id in uuids_or_ids:
+            if is_id(uuid_or_id):
+                ids.append(uuid_or_id)
+            elif is_full_uuid(uuid_or_id):
+                uuids.append(uuid_or_id)
+            else:
+                raise exceptions.InvalidParameter("uuid_or_id", uuid_or_id)
+
+        entries: List[DeviceHistoryType] = []
+        for field, values in (("tracks__device", ids), ("uuid", uuids)):
+            entries += self.__pine.chunked(
+                "get",
+                list(dict.fromkeys(values)),
+                lambda chunk: {
+                    "resource": "device_history",
+                    "options": merge({"$filter": {**dollar_filter, field: {"$in": chunk}}}, options),
+                },
+            )
+        return entries
+
     def get_all_by_application(
         self,
         slug_or_uuid_or_id: Union[str, int],
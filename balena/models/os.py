@@ -1,20 +1,36 @@
+import json
+import mmap
 import re
+import time
 from collections import defaultdict
-from typing import Any, Dict, List, Literal, Optional, TypedDict, Union
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, TypedDict, Union
 from typing_extensions import NotRequired
-
-from semver.version import Version
+from weakref import WeakKeyDictionary
 
 from .. import exceptions
 from ..balena_auth import request
+from ..download import DEFAULT_SEGMENTS, ProgressCallback, RangedDownload
 from ..hup import get_hup_action_type
+from ..image_cache import IMAGE_SUFFIX, IMAGE_SUFFIXES, get_image_key, get_os_image_cache
 from ..pine import PineClient
 from ..types import AnyObject
 from ..types.models import ReleaseType
-from ..utils import compare, merge, normalize_balena_semver, is_id
+from ..utils import (
+    compare,
+    compile_semver_range,
+    get_device_os_semver_with_variant,
+    get_semver_precedence,
+    is_id,
+    is_valid_semver,
+    merge,
+    normalize_balena_semver,
+    parse_semver,
+)
 from ..settings import Settings
 from .application import Application
-from .device_type import DeviceType
+from .device_type import ARCH_COMPATIBILITY_MAP, DeviceType
 
 
 class DownloadConfig(TypedDict):
@@ -43,42 +59,26 @@ class ImgConfigOptions(TypedDict, total=False):
     developmentMode: Optional[bool]
 
 
-NETWORK_WIFI = "wifi"
-NETWORK_ETHERNET = "ethernet"
-
-NETWORK_TYPES = [NETWORK_WIFI, NETWORK_ETHERNET]
-
-ARCH_COMPATIBILITY_MAP = {"aarch64": ["armv7hf", "rpi"], "armv7hf": ["rpi"]}
-
-VERSION_RANGE_CHAR_LIST = ["x", "X", "*"]
-
-
-def cmp_to_key(mycmp):
-    "Convert a cmp= function into a key= function"
-
-    class K:
-        def __init__(self, obj, *args):
-            self.obj = obj
-
-        def __lt__(self, other):
-            return mycmp(self.obj, other.obj) < 0
+class OsUpdateVersions(TypedDict):
+    versions: List[str]
+    recommended: Optional[str]
+    current: Optional[str]
 
-        def __gt__(self, other):
-            return mycmp(self.obj, other.obj) > 0
 
-        def __eq__(self, other):
-            return mycmp(self.obj, other.obj) == 0
+class OsUpdatePlan(OsUpdateVersions):
+    id: int
+    uuid: str
+    device_type: Optional[str]
+    # current OS version of the device including its variant, None if unknown
+    os_version: Optional[str]
 
-        def __le__(self, other):
-            return mycmp(self.obj, other.obj) <= 0
 
-        def __ge__(self, other):
-            return mycmp(self.obj, other.obj) >= 0
+NETWORK_WIFI = "wifi"
+NETWORK_ETHERNET = "ethernet"
 
-        def __ne__(self, other):
-            return mycmp(self.obj, other.obj) != 0
+NETWORK_TYPES = [NETWORK_WIFI, NETWORK_ETHERNET]
 
-    return K
+VERSION_RANGE_CHAR_LIST = ["x", "X", "*"]
 
 
 def get_rev_version(semver_version):
@@ -103,88 +103,133 @@ def is_development_version(semver_version):
     return False
 
 
-def compare_balena_version(version_a, version_b):
+@lru_cache(maxsize=16384)
+def get_balena_version_sort_key(version: Optional[str]) -> tuple:
     """
-    Based on https://github.com/balena-io-modules/balena-semver#compare
+    Total order sort key of a balenaOS version, computed once per version string.
+    Ordering by this key is the same as ordering with `compare_balena_version`: missing versions first,
+    then the ones that are not valid semver, then by semver, rev, dev flag and lexically.
 
     """
 
-    if not version_a:
-        return 0 if not version_b else -1
+    if not version:
+        return (0,)
+
+    normalized_version = normalize_balena_semver(version)
+    if not is_valid_semver(normalized_version):
+        return (1,)
+
+    semver_obj = parse_semver(normalized_version)
+    return (
+        2,
+        *get_semver_precedence(normalized_version),
+        get_rev_version(semver_obj),
+        is_development_version(semver_obj),
+        normalized_version,
+    )
+
+
+def compare_balena_version(version_a, version_b):
+    """
+    Based on https://github.com/balena-io-modules/balena-semver#compare
 
-    if not version_b:
-        return 1
+    """
 
-    normalized_version_a = normalize_balena_semver(version_a)
-    normalized_version_b = normalize_balena_semver(version_b)
+    return compare(get_balena_version_sort_key(version_a), get_balena_version_sort_key(version_b))
 
-    is_valid_semver_version_a = Version.is_valid(normalized_version_a)
-    is_valid_semver_version_b = Version.is_valid(normalized_version_b)
 
-    if not is_valid_semver_version_a or not is_valid_semver_version_b:
-        if is_valid_semver_version_a:
-            # verison b not valid semver
-            return 1
+def sort_version(x, y):
+    """
+    Sort returned objects from device_os.get_supported_versions method.
+    """
 
-        if is_valid_semver_version_b:
-            # version a not valid semver
-            return -1
+    return compare_balena_version(x["raw_version"], y["raw_version"])
 
-        return compare(is_valid_semver_version_a, is_valid_semver_version_b)
 
-    version_a_semver_obj = Version.parse(normalized_version_a)
-    version_b_semver_obj = Version.parse(normalized_version_b)
+@lru_cache(maxsize=256)
+def _compile_balena_version_range(version_range: Optional[str]) -> Optional[Callable[[tuple], bool]]:
+    if not version_range:
+        return None
 
-    semver_compare_result = version_a_semver_obj.compare(version_b_semver_obj)
+    if is_valid_semver(version_range):
+        return compile_semver_range(f">={version_range}")
 
-    if semver_compare_result != 0:
-        return semver_compare_result
+    if version_range[-1] in VERSION_RANGE_CHAR_LIST:
+        # version range contains 'x', 'X' or '*'
+        min_ver = f"{version_range[:-1]}0"
+        if is_valid_semver(min_ver):
+            max_ver = parse_semver(min_ver).next_version("minor")
+            return compile_semver_range(f">={min_ver} <{max_ver}")
 
-    rev_result = compare(
-        get_rev_version(version_a_semver_obj),
-        get_rev_version(version_b_semver_obj),
-    )
+    return None
 
-    if rev_result != 0:
-        return rev_result
 
-    dev_result = compare(
-        is_development_version(version_a_semver_obj),
-        is_development_version(version_b_semver_obj),
-    )
+def bsemver_match_range(version, version_range):
+    if not is_valid_semver(version):
+        return False
 
-    if dev_result != 0:
-        return dev_result
+    try:
+        matches = _compile_balena_version_range(version_range)
+    except Exception:
+        return False
 
-    # We can ignore the localeCompare since this is only for balena OS version.
-    return compare(normalized_version_a, normalized_version_b)
+    return matches is not None and matches(get_semver_precedence(version))
 
 
-def sort_version(x, y):
-    """
-    Sort returned objects from device_os.get_supported_versions method.
+class OsVersionsCache:
     """
+    This is low level class and is not meant to be used by end users directly.
 
-    return compare_balena_version(x["raw_version"], y["raw_version"])
+    OS versions by device type slug, shared by all the DeviceOs instances that use the same settings.
+    """
 
+    def __init__(self):
+        self.__lock = Lock()
+        self.__entries: Dict[Tuple[bool, str], Tuple[float, List[Any]]] = {}
 
-def bsemver_match_range(version, version_range):
-    if Version.is_valid(version):
-        try:
-            parsed_version = Version.parse(version)
-            if Version.is_valid(version_range):
-                if version_range and parsed_version.match(f">={version_range}"):
-                    return True
-            else:
-                if version_range[-1] in VERSION_RANGE_CHAR_LIST:
-                    # version range contains 'x', 'X' or '*'
-                    min_ver = f"{version_range[:-1]}0"
-                    max_ver = str(Version.parse(min_ver).next_version("minor"))
-                    if parsed_version.match(f">={min_ver}") and parsed_version.match(f"<{max_ver}"):
-                        return True
-        except Exception:
-            return False
-    return False
+    def get(self, listed_by_default: bool, device_types: List[str]):
+        """
+        Returns:
+            tuple: copies of the cached OS versions by device type, and the device types that are not cached.
+        """
+        now = time.monotonic()
+        versions_by_dt: Dict[str, List[Any]] = defaultdict(list)
+        missing = []
+        with self.__lock:
+            for device_type in device_types:
+                entry = self.__entries.get((listed_by_default, device_type))
+                if entry is None or entry[0] <= now:
+                    missing.append(device_type)
+                elif entry[1]:
+                    versions_by_dt[device_type] = [dict(version) for version in entry[1]]
+        return versions_by_dt, missing
+
+    def put(self, listed_by_default: bool, versions_by_dt: Dict[str, List[Any]], ttl: float) -> None:
+        expires_at = time.monotonic() + ttl
+        with self.__lock:
+            for device_type, versions in versions_by_dt.items():
+                self.__entries[(listed_by_default, device_type)] = (expires_at, [dict(v) for v in versions])
+
+    def invalidate(self, device_types: Optional[List[str]] = None) -> None:
+        with self.__lock:
+            if device_types is None:
+                self.__entries.clear()
+                return
+            for key in [key for key in self.__entries if key[1] in device_types]:
+                del self.__entries[key]
+
+
+__os_versions_caches: "WeakKeyDictionary[Settings, OsVersionsCache]" = WeakKeyDictionary()
+__os_versions_caches_lock = Lock()
+
+
+def get_os_versions_cache(settings: Settings) -> OsVersionsCache:
+    with __os_versions_caches_lock:
+        cache = __os_versions_caches.get(settings)
+        if cache is None:
+            cache = OsVersionsCache()
+            __os_versions_caches[settings] = cache
+        return cache
 
 
 class DeviceOs:
@@ -209,10 +254,17 @@ class DeviceOs:
         self.__settings = settings
         self.__device_type = DeviceType(pine, settings)
         self.__application = Application(pine, settings, False)
+        self.__os_versions_cache = get_os_versions_cache(settings)
+
+        try:
+            self.__os_versions_cache_time = int(settings.get("image_cache_time")) / 1000
+        except (exceptions.InvalidOption, ValueError):
+            self.__os_versions_cache_time = 0
 
     def get_available_os_versions(self, device_type: Union[str, List[str]]):
         """
-        Get the supported OS versions for the provided device type(s)
+        Get the supported OS versions for the provided device type(s).
+        Versions are cached by device type for `image_cache_time`.
 
         Args:
             device_type (Union[str, List[str]]): device type slug.
@@ -230,6 +282,34 @@ class DeviceOs:
 
         return versions_by_dt
 
+    def prefetch_os_versions(self, device_types: List[str]) -> None:
+        """
+        Fetch the OS versions of several device types with a single request and cache them,
+        so that later lookups for any of them, e.g. when updating the OS of a fleet, are served from the cache.
+
+        Args:
+            device_types (List[str]): device type slugs.
+
+        Examples:
+            >>> balena.models.os.prefetch_os_versions(['raspberrypi3', 'raspberrypi4-64', 'intel-nuc'])
+        """
+        self.__get_all_os_versions(device_types, True)
+
+    def clear_os_versions_cache(self, device_type: Optional[Union[str, List[str]]] = None) -> None:
+        """
+        Drop the cached OS versions, so they are fetched again on the next lookup.
+
+        Args:
+            device_type (Optional[Union[str, List[str]]]): device type slug(s), all device types if omitted.
+
+        Examples:
+            >>> balena.models.os.clear_os_versions_cache('raspberrypi3')
+        """
+        if device_type is None:
+            self.__os_versions_cache.invalidate()
+        else:
+            self.__os_versions_cache.invalidate(device_type if isinstance(device_type, list) else [device_type])
+
     def get_all_os_versions(self, device_type: Union[str, List[str]], options: AnyObject = {}):
         """
         Get all OS versions for the provided device type(s), inlcuding invalidated ones
@@ -333,11 +413,11 @@ class DeviceOs:
         if version_or_range in versions:
             return version_or_range
 
-        parsed_versions = [Version.parse(v) for v in versions if Version.is_valid(v)]
-        satisfying_versions = [v for v in parsed_versions if v.match(version_or_range)]
+        matches = compile_semver_range(version_or_range)
+        satisfying_versions = [v for v in versions if is_valid_semver(v) and matches(get_semver_precedence(v))]
         if not satisfying_versions:
             return None
-        return str(max(satisfying_versions))
+        return str(parse_semver(max(satisfying_versions, key=get_semver_precedence)))
 
     def download(
         self,
@@ -364,6 +444,157 @@ class DeviceOs:
             ...        for chunk in stream.iter_content(chunk_size=8192):
             ...            f.write(chunk)
         """
+        return request(
+            method="GET",
+            settings=self.__settings,
+            path="/download",
+            qs=self.__get_download_query(device_type, version, options),
+            return_raw=True,
+            stream=True,
+        )
+
+    def download_to(
+        self,
+        path: str,
+        device_type: str,
+        version: str = "latest",
+        options: DownloadConfig = {},
+        segments: int = DEFAULT_SEGMENTS,
+        progress: Optional[ProgressCallback] = None,
+        verify_size: bool = True,
+    ) -> str:
+        """
+        Download an OS image to a file, using several parallel range requests.
+        The image is written to `<path>.part` and the progress is kept in `<path>.part.json`, so calling it
+        again after an interruption resumes the download where it stopped. The file is only moved to `path`
+        once it is complete. Servers that do not support range requests get a single sequential download.
+
+        Args:
+            path (str): destination file path.
+            device_type (str): device type slug.
+            version (str): semver-compatible version or 'latest', defaults to 'latest'.
+            * The version **must** be the exact version number.
+            options (DownloadConfig): OS configuration options to use.
+            segments (int): number of parallel range requests, defaults to 4.
+            progress (Optional[Callable[[int, Optional[int]], None]]): called with the downloaded and the total
+            number of bytes as the download advances, from the download threads. When the server does not
+            announce the total, the `get_download_size` estimate of uncompressed images is reported instead.
+            verify_size (bool): check the size of the image against the total announced by the server,
+            defaults to True.
+
+        Returns:
+            str: the path of the downloaded image.
+
+        Example:
+            >>> b.models.device_os.download_to("balena.img", "raspberrypi3", progress=lambda done, total: print(done))
+        """
+        query = self.__get_download_query(device_type, version, options)
+
+        # only an estimate, which is not reliable enough to verify the image with
+        estimated_size = None
+        if progress is not None and options.get("fileType", ".img") == ".img":
+            estimated_size = int(self.get_download_size(query["deviceType"], query["version"]))
+
+        def open_stream(byte_range: Tuple[int, int]):
+            return request(
+                method="GET",
+                settings=self.__settings,
+                path="/download",
+                qs=query,
+                return_raw=True,
+                stream=True,
+                headers={"Range": f"bytes={byte_range[0]}-{byte_range[1]}", "Accept-Encoding": "identity"},
+            )
+
+        key = json.dumps(query, sort_keys=True)
+        RangedDownload(open_stream, path, key, segments, progress, verify_size, estimated_size).run()
+        return path
+
+    def get_cached_image(
+        self,
+        device_type: str,
+        version: str = "latest",
+        options: DownloadConfig = {},
+        progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """
+        Get the path of an OS image from the local image cache, under the `cache_directory`, downloading it
+        with `download_to` first if it is not cached yet. Images are cached by device type, version and
+        download options, expire after `image_cache_time` and the least recently used ones are evicted once the
+        cache outgrows `image_cache_size`.
+        Cached images must only be read, e.g. copied or flashed, never modified in place.
+
+        Args:
+            device_type (str): device type slug.
+            version (str): semver-compatible version or 'latest', defaults to 'latest'.
+            * The version **must** be the exact version number.
+            options (DownloadConfig): OS configuration options to use.
+            progress (Optional[Callable[[int, Optional[int]], None]]): called with the downloaded and the total
+            number of bytes if the image has to be downloaded.
+
+        Returns:
+            str: the path of the cached image, named after the requested `fileType`, e.g. `.zip`.
+
+        Example:
+            >>> path = b.models.device_os.get_cached_image("raspberrypi3", "2.115.1+rev1", {"developmentMode": True})
+        """
+        cache = get_os_image_cache(self.__settings)
+        if cache is None:
+            raise exceptions.InvalidOption("cache_directory")
+
+        file_type = options.get("fileType", IMAGE_SUFFIX)
+        if file_type not in IMAGE_SUFFIXES:
+            raise exceptions.InvalidParameter("fileType", file_type)
+
+        query = self.__get_download_query(device_type, version, options)
+        key = get_image_key({**query, "api_endpoint": self.__settings.get("api_endpoint")})
+
+        def download(path: str):
+            self.download_to(path, query["deviceType"], query["version"], options, progress=progress)
+
+        return cache.fill(key, download, file_type)
+
+    def map_cached_image(
+        self,
+        device_type: str,
+        version: str = "latest",
+        options: DownloadConfig = {},
+        progress: Optional[ProgressCallback] = None,
+    ) -> mmap.mmap:
+        """
+        Memory map a read only view of an OS image from the local image cache, see `get_cached_image`.
+        The mapping stays valid even if the image is evicted from the cache meanwhile.
+
+        Args:
+            device_type (str): device type slug.
+            version (str): semver-compatible version or 'latest', defaults to 'latest'.
+            * The version **must** be the exact version number.
+            options (DownloadConfig): OS configuration options to use.
+            progress (Optional[Callable[[int, Optional[int]], None]]): called with the downloaded and the total
+            number of bytes if the image has to be downloaded.
+
+        Returns:
+            mmap.mmap: read only memory map of the image.
+
+        Example:
+            >>> with b.models.device_os.map_cached_image("raspberrypi3") as image:
+            ...    header = image[:512]
+        """
+        with open(self.get_cached_image(device_type, version, options, progress), "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def clear_image_cache(self) -> None:
+        """
+        Remove all the OS images from the local image cache.
+
+        Examples:
+            >>> balena.models.os.clear_image_cache()
+        """
+        cache = get_os_image_cache(self.__settings)
+        if cache is not None:
+            cache.clear()
+
+    def __get_download_query(self, device_type: str, version: str, options: DownloadConfig) -> Dict[str, Any]:
         slug = self.__device_type.get(device_type, {"$select": "slug"})["slug"]
 
         if version == "latest":
@@ -375,14 +606,7 @@ class DeviceOs:
         else:
             version = normalize_balena_semver(version)
 
-        return request(
-            method="GET",
-            settings=self.__settings,
-            path="/download",
-            qs={**options, "deviceType": slug, "version": version},
-            return_raw=True,
-            stream=True,
-        )
+        return {**options, "deviceType": slug, "version": version}
 
     def get_config(self, slug_or_uuid_or_id: Union[str, int], options: ImgConfigOptions):
         """
@@ -449,7 +673,7 @@ class DeviceOs:
         except exceptions.OsUpdateError:
             return False
 
-    def get_supported_os_update_versions(self, device_type: str, current_version: str):
+    def get_supported_os_update_versions(self, device_type: str, current_version: str) -> OsUpdateVersions:
         """
         Get OS supported versions.
 
@@ -461,13 +685,103 @@ class DeviceOs:
         all_versions = self.get_available_os_versions(slug)
         all_versions = [v.get("raw_version") for v in all_versions if v.get("os_type") == self.OS_TYPES["default"]]
 
+        return self.__get_supported_os_update_versions(device_type, all_versions, current_version, {})
+
+    def plan_updates(self, slug_or_uuid_or_id: Union[str, int]) -> List[OsUpdatePlan]:
+        """
+        Get the OS versions that every device of an application can be updated to.
+        The devices are fetched with a single query, the OS versions with one more query for all their
+        device types, and each distinct pair of current and target versions is only checked once.
+
+        Args:
+            slug_or_uuid_or_id (Union[str, int]): application slug (string), uuid (string) or id (number).
+
+        Returns:
+            List[OsUpdatePlan]: the supported update versions of each device, with the recommended one.
+
+        Examples:
+            >>> for plan in balena.models.os.plan_updates('myorg/myapp'):
+            ...     print(plan['uuid'], plan['os_version'], plan['recommended'])
+        """
+        app_id = self.__application.get_id(slug_or_uuid_or_id)
+        devices = self.__pine.get(
+            {
+                "resource": "device",
+                "options": {
+                    "$select": ["id", "uuid", "os_version", "os_variant"],
+                    "$expand": {"is_of__device_type": {"$select": "slug"}},
+                    "$filter": {"belongs_to__application": app_id},
+                },
+            }
+        )
+
+        def get_device_type(device: Any) -> Optional[str]:
+            device_type = device.get("is_of__device_type")
+            return device_type[0]["slug"] if device_type else None
+
+        device_types = sorted({dt for dt in (get_device_type(device) for device in devices) if dt is not None})
+        versions_by_dt = self.__get_all_os_versions(device_types, True) if device_types else {}
+        update_versions_by_dt = {
+            dt: [v["raw_version"] for v in versions if v.get("os_type") == self.OS_TYPES["default"]]
+            for dt, versions in versions_by_dt.items()
+        }
+
+        supported_updates: Dict[Tuple[str, str, str], bool] = {}
+        plans_by_version: Dict[Tuple[Optional[str], Optional[str]], OsUpdateVersions] = {}
+        plans: List[OsUpdatePlan] = []
+
+        for device in devices:
+            device_type = get_device_type(device)
+            try:
+                os_version = get_device_os_semver_with_variant(device.get("os_version"), device.get("os_variant"))
+            except ValueError:
+                os_version = None
+
+            key = (device_type, os_version)
+            if key not in plans_by_version:
+                if device_type is None or os_version is None:
+                    plans_by_version[key] = {"versions": [], "recommended": None, "current": None}
+                else:
+                    plans_by_version[key] = self.__get_supported_os_update_versions(
+                        device_type, update_versions_by_dt.get(device_type, []), os_version, supported_updates
+                    )
+
+            plan = plans_by_version[key]
+            plans.append(
+                {
+                    "id": device["id"],
+                    "uuid": device["uuid"],
+                    "device_type": device_type,
+                    "os_version": os_version,
+                    "versions": list(plan["versions"]),
+                    "recommended": plan["recommended"],
+                    "current": plan["current"],
+                }
+            )
+
+        return plans
+
+    def __get_supported_os_update_versions(
+        self,
+        device_type: str,
+        all_versions: List[str],
+        current_version: str,
+        supported_updates: Dict[Tuple[str, str, str], bool],
+    ) -> OsUpdateVersions:
         current = next(
-            (v for v in all_versions if str(Version.parse(v)) == str(Version.parse(current_version))),
+            (v for v in all_versions if str(parse_semver(v)) == str(parse_semver(current_version))),
             None,
         )
 
-        versions = [v for v in all_versions if self.is_supported_os_update(device_type, current_version, v)]
-        recommended = next((v for v in versions if not Version.parse(v).prerelease), None)
+        versions = []
+        for version in all_versions:
+            key = (device_type, current_version, version)
+            if key not in supported_updates:
+                supported_updates[key] = self.is_supported_os_update(device_type, current_version, version)
+            if supported_updates[key]:
+                versions.append(version)
+
+        recommended = next((v for v in versions if not parse_semver(v).prerelease), None)
 
         return {"versions": versions, "recommended": recommended, "current": current}
 
@@ -609,8 +923,10 @@ class DeviceOs:
             options,
         )
 
-        return self.__pine.get(
-            {
+        return self.__pine.chunked(
+            "get",
+            device_types,
+            lambda chunk: {
                 "resource": "application",
                 "options": {
                     "$select": "is_for__device_type",
@@ -624,15 +940,27 @@ class DeviceOs:
                         "is_for__device_type": {
                             "$any": {
                                 "$alias": "dt",
-                                "$expr": {"dt": {"slug": {"$in": device_types}}},
+                                "$expr": {"dt": {"slug": {"$in": chunk}}},
                             }
                         },
                     },
                 },
-            }
+            },
         )
 
     def __get_all_os_versions(self, device_types: List[str], listed_by_default: bool = False):
+        versions_by_dt, missing = self.__os_versions_cache.get(listed_by_default, device_types)
+        if not missing:
+            return versions_by_dt
+
+        fetched = self.__fetch_all_os_versions(missing, listed_by_default)
+        self.__os_versions_cache.put(
+            listed_by_default, {dt: fetched.get(dt, []) for dt in missing}, self.__os_versions_cache_time
+        )
+        versions_by_dt.update(fetched)
+        return versions_by_dt
+
+    def __fetch_all_os_versions(self, device_types: List[str], listed_by_default: bool):
         listed_by_filter = (
             {
                 "$filter": {
@@ -676,7 +1004,7 @@ class DeviceOs:
             tag_map = self.__tags_to_dict(release.get("release_tag", []))
 
             release_semver_obj = (
-                Version.parse(release["raw_version"]) if not release["raw_version"].startswith("0.0.0") else None
+                parse_semver(release["raw_version"]) if not release["raw_version"].startswith("0.0.0") else None
             )
 
             variant = release.get("variant")
@@ -735,7 +1063,9 @@ class DeviceOs:
             )
 
         for device_type in os_versions_by_device_type:
-            os_versions_by_device_type[device_type].sort(reverse=True, key=cmp_to_key(sort_version))
+            os_versions_by_device_type[device_type].sort(
+                reverse=True, key=lambda version: get_balena_version_sort_key(version["raw_version"])
+            )
             recommended_per_os_type: Dict[str, bool] = {}
 
             for version in os_versions_by_device_type[device_type]:
@@ -743,7 +1073,7 @@ class DeviceOs:
                     if (
                         version["variant"] != "dev"
                         and not version["known_issue_list"]
-                        and not Version.parse(version["raw_version"]).prerelease
+                        and not parse_semver(version["raw_version"]).prerelease
                     ):
                         additional_format = (
                             f" ({version['line']}, recommended)" if version.get("line") else " (recommended)"
@@ -1,18 +1,107 @@
-from typing import Any, Optional, cast
-from urllib.parse import urljoin
+from typing import Any, Callable, List, Literal, Optional, Tuple, TypedDict, cast
+from urllib.parse import urljoin, urlparse
 from ratelimit import limits, sleep_and_retry
-from time import sleep
+from threading import Lock
+from time import sleep, perf_counter
+import gzip
+import json
 import mimetypes
 import io
 import requests
 import os
+import zlib
 from pine_client import PinejsClientCore
 from pine_client.client import Params
 
 from .balena_auth import get_token
+from .batch import DEFAULT_BATCH_SIZE, PineBatch
+from .chunking import (
+    DEFAULT_CHUNK_CONCURRENCY,
+    DEFAULT_MAX_URL_LENGTH,
+    chunk_by_url_length,
+    get_url_length,
+    run_in_chunks,
+)
+from .codec import decode_body, decode_json
 from .exceptions import RequestError, InvalidOption
+from .http_cache import get_response_cache
+from .resource_cache import RESOURCE_CACHE_POLICIES, get_cache_scope, get_resource_cache, parse_resource_path
 from .settings import Settings
 
+# Size of the chunks read from the wire while decompressing a response
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+ACCEPT_ENCODING = "gzip, deflate"
+
+
+class TransferStats(TypedDict):
+    requests: int
+    # bytes of the request bodies before and after compression
+    content_bytes_sent: int
+    wire_bytes_sent: int
+    # bytes of the response bodies as received and after decompression
+    wire_bytes_received: int
+    content_bytes_received: int
+    # seconds spent decompressing response bodies
+    decompression_time: float
+    # GET requests answered with a 304 and served from the response cache
+    not_modified: int
+
+
+def _empty_transfer_stats() -> TransferStats:
+    return {
+        "requests": 0,
+        "content_bytes_sent": 0,
+        "wire_bytes_sent": 0,
+        "wire_bytes_received": 0,
+        "content_bytes_received": 0,
+        "decompression_time": 0.0,
+        "not_modified": 0,
+    }
+
+
+def _read_response(response: requests.Response):
+    """
+    Read a streamed response, decompressing it chunk by chunk.
+
+    Returns:
+        tuple: body, bytes received on the wire and seconds spent decompressing.
+    """
+    encoding = response.headers.get("content-encoding", "").strip().lower()
+    if encoding not in ("", "identity", "gzip", "deflate"):
+        # let urllib3 decode encodings we did not ask for
+        content = response.content
+        return content, response.raw.tell() or len(content), 0.0
+
+    # gzip and zlib streams are detected from their header, raw deflate is tried as a fallback
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32) if encoding in ("gzip", "deflate") else None
+    chunks = []
+    wire_bytes = 0
+    decompression_time = 0.0
+
+    for chunk in response.raw.stream(RESPONSE_CHUNK_SIZE, decode_content=False):
+        wire_bytes += len(chunk)
+        if decompressor is None:
+            chunks.append(chunk)
+            continue
+
+        start = perf_counter()
+        try:
+            chunks.append(decompressor.decompress(chunk))
+        except zlib.error:
+            if wire_bytes != len(chunk) or encoding != "deflate":
+                raise
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            chunks.append(decompressor.decompress(chunk))
+        decompression_time += perf_counter() - start
+
+    if decompressor is not None:
+        start = perf_counter()
+        chunks.append(decompressor.flush())
+        decompression_time += perf_counter() - start
+
+    return b"".join(chunks), wire_bytes, decompression_time
+
 
 class PineClient(PinejsClientCore):
     def __init__(self, settings: Settings, sdk_version: str, params: Optional[Params] = None):
@@ -21,6 +110,14 @@ class PineClient(PinejsClientCore):
 
         self.__settings = settings
         self.__sdk_version = sdk_version
+        self.__stats_lock = Lock()
+        self.__stats = _empty_transfer_stats()
+        self.__response_cache = get_response_cache(settings)
+
+        try:
+            self.__compression_threshold: Optional[int] = int(self.__settings.get("request_compression_threshold"))
+        except InvalidOption:
+            self.__compression_threshold = None
 
         api_url = cast(str, settings.get("api_endpoint"))
         api_version = cast(str, settings.get("api_version"))
@@ -29,19 +126,246 @@ class PineClient(PinejsClientCore):
             calls = int(self.__settings.get("request_limit"))
             period = int(self.__settings.get("request_limit_interval"))
 
-            self.__request = sleep_and_retry(limits(calls=calls, period=period)(self.__base_request))
+            # batch requests share the limit of the other requests
+            self.__rate_limit: Callable[[Callable[[], Any]], Any] = sleep_and_retry(
+                limits(calls=calls, period=period)(lambda send: send())
+            )
+            self.__request = lambda method, url, body=None: self.__rate_limit(
+                lambda: self.__base_request(method, url, body)
+            )
         except InvalidOption:
+            self.__rate_limit = lambda send: send()
             self.__request = self.__base_request
 
-        super().__init__({**params, "api_prefix": urljoin(api_url, api_version) + "/"})
+        self.__api_url = api_url
+        self.__api_prefix = urljoin(api_url, api_version) + "/"
+        super().__init__({**params, "api_prefix": self.__api_prefix})
 
     def _request(self, method: str, url: str, body: Optional[Any] = None) -> Any:
-        return self.__request(method, url, body)
+        # the cache is opt-in, its setting is checked on every request so it can be toggled at any time
+        resource_cache = get_resource_cache(self.__settings)
+        if resource_cache is None or not url.startswith(self.__api_prefix):
+            return self.__request(method, url, body)
+
+        resource, key, query = parse_resource_path(url.replace(self.__api_prefix, "", 1))
+        if method != "GET":
+            try:
+                return self.__request(method, url, body)
+            finally:
+                resource_cache.invalidate(resource)
+
+        policy = RESOURCE_CACHE_POLICIES.get(resource)
+        if policy is None or not policy.matches(key, query):
+            return self.__request(method, url, body)
+
+        cache_key = f"{get_cache_scope(get_token(self.__settings))} {self.__api_prefix}{resource}({key})?{query}"
+        cached = resource_cache.get(cache_key)
+        if cached is not None:
+            return decode_json(cached)
+
+        result = self.__request(method, url, body)
+        if policy.is_cacheable(result):
+            resource_cache.put(cache_key, resource, json.dumps(result).encode(), policy.ttl)
+        return result
+
+    def api_request(self, method: str, path: str, body: Optional[Any] = None) -> Any:
+        """
+        Send a request to an API endpoint outside of the OData resources, e.g. the supervisor ones, sharing the
+        rate limit, the retries of rate limited requests and the compression of the pine requests.
+
+        Args:
+            method (str): HTTP method.
+            path (str): path relative to the api endpoint.
+            body (Optional[Any]): JSON body.
+
+        Returns:
+            Any: the decoded response.
+
+        Examples:
+            >>> balena.pine.api_request('POST', '/supervisor/v1/blink', {'uuid': '8deb12a7d7592c2b7f9e44735c2b0a41'})
+        """
+        return self.__request(method, urljoin(self.__api_url, path), body)
+
+    def clear_cache(self) -> None:
+        """
+        Drop the cached API responses, including the persistent cache of rarely changing resources
+        (device types, cpu architectures, membership roles, final releases and images, OS host apps).
+
+        Examples:
+            >>> balena.pine.clear_cache()
+        """
+        if self.__response_cache is not None:
+            self.__response_cache.clear()
+        resource_cache = get_resource_cache(self.__settings)
+        if resource_cache is not None:
+            resource_cache.clear()
+
+    def get_transfer_stats(self) -> TransferStats:
+        """
+        Get the number of bytes sent and received by the API requests done so far, before and after
+        compression, and the time spent decompressing the responses.
+
+        Returns:
+            TransferStats: transfer stats.
+
+        Examples:
+            >>> balena.models.device.get_all()
+            >>> stats = balena.pine.get_transfer_stats()
+            >>> print(stats['content_bytes_received'] / stats['wire_bytes_received'])
+        """
+        with self.__stats_lock:
+            return cast(TransferStats, dict(self.__stats))
+
+    def reset_transfer_stats(self) -> None:
+        """
+        Reset the transfer stats.
+        """
+        with self.__stats_lock:
+            self.__stats = _empty_transfer_stats()
+
+    def chunked(
+        self,
+        method: Literal["get", "patch", "delete"],
+        values: List[Any],
+        build_params: Callable[[List[Any]], Params],
+        max_url_length: int = DEFAULT_MAX_URL_LENGTH,
+        concurrency: int = DEFAULT_CHUNK_CONCURRENCY,
+    ) -> List[Any]:
+        """
+        Run a request whose `$in` filter holds more values than fit in a URL.
+        The values are split in chunks sized by the encoded length of the URL of their request, which are
+        requested at most `concurrency` at once.
+        When the values fit in a single chunk, its failure is raised as is. Otherwise all the chunks are
+        requested and their failures, even a single one, are raised together in a ChunkedRequestError along
+        with the results of the other chunks.
+
+        Args:
+            method (Literal["get", "patch", "delete"]): pine method.
+            values (List[Any]): values of the filter.
+            build_params (Callable[[List[Any]], Params]): builds the request of a chunk of the values.
+            max_url_length (int): longest URL of a chunk, defaults to 4096.
+            concurrency (int): chunks requested at once, defaults to 4.
+
+        Returns:
+            List[Any]: the concatenated results for get, the result of every chunk otherwise.
+
+        Examples:
+            >>> balena.pine.chunked('get', ids, lambda chunk: {
+            ...     'resource': 'device', 'options': {'$filter': {'id': {'$in': chunk}}}
+            ... })
+        """
+        request = getattr(self, method)
+        chunks = chunk_by_url_length(
+            values,
+            lambda chunk: get_url_length(self.__api_prefix + self.compile(build_params(chunk))),
+            max_url_length,
+        )
+        results = run_in_chunks(lambda chunk: request(build_params(chunk)), chunks, concurrency)
+        if method == "get":
+            return [item for result in results for item in result]
+        return results
+
+    def batch(self, max_size: int = DEFAULT_BATCH_SIZE) -> PineBatch:
+        """
+        Group independent pine operations in OData $batch requests, saving a round-trip per operation.
+        The get, post, put, patch, delete and upsert operations of the batch return futures, and are sent
+        when leaving its `with` block, in requests of up to `max_size` operations. The futures are then
+        resolved with the result of their operation, or fail with its error.
+        The operations are neither ordered nor atomic, and their responses are not cached.
+
+        Args:
+            max_size (int): operations per $batch request, defaults to 100.
+
+        Returns:
+            PineBatch: the batch, to be used as a context manager.
+
+        Examples:
+            >>> with balena.pine.batch() as batch:
+            ...     note = batch.patch({'resource': 'release', 'id': 123, 'body': {'note': 'tested'}})
+            ...     tags = [batch.upsert({
+            ...         'resource': 'device_tag', 'id': {'device': id, 'tag_key': 'fleet'}, 'body': {'value': 'a'}
+            ...     }) for id in device_ids]
+            >>> note.result()
+        """
+        api_path = urlparse(self.__api_prefix).path
+
+        def on_write(path: str) -> None:
+            resource_cache = get_resource_cache(self.__settings)
+            if resource_cache is not None:
+                resource_cache.invalidate(parse_resource_path(path.replace(api_path, "", 1))[0])
+
+        return PineBatch(
+            lambda params: api_path + self.compile(params),
+            lambda content, content_type: self.__rate_limit(lambda: self.__send_batch(content, content_type)),
+            self.transform_get_result,
+            on_write,
+            max_size,
+        )
+
+    def __send_batch(self, content: bytes, content_type: str) -> Tuple[str, bytes]:
+        token = get_token(self.__settings)
+
+        headers = {
+            "X-Balena-Client": f"balena-python-sdk/{self.__sdk_version}",
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "Content-Type": content_type,
+        }
+        if token is not None:
+            headers["Authorization"] = f"Bearer {token}"
+
+        req = requests.request("POST", url=f"{self.__api_prefix}$batch", data=content, headers=headers, stream=True)
+        with req:
+            response, wire_received, decompression_time = _read_response(req)
+        self.__record_transfer(len(content), len(content), wire_received, len(response), decompression_time)
+
+        if req.ok:
+            return req.headers.get("content-type", ""), response
+
+        retry_after = req.headers.get("retry-after")
+        if (
+            self.__settings.get("retry_rate_limited_request") is True
+            and req.status_code == 429
+            and retry_after is not None
+            and retry_after.isdigit()
+        ):
+            sleep(int(retry_after))
+            return self.__send_batch(content, content_type)
+
+        raise RequestError(body=response.decode(errors="replace"), status_code=req.status_code)
+
+    def __record_transfer(
+        self,
+        content_sent: int,
+        wire_sent: int,
+        wire_received: int,
+        content_received: int,
+        decompression_time: float,
+        not_modified: bool = False,
+    ) -> None:
+        with self.__stats_lock:
+            self.__stats["requests"] += 1
+            self.__stats["not_modified"] += not_modified
+            self.__stats["content_bytes_sent"] += content_sent
+            self.__stats["wire_bytes_sent"] += wire_sent
+            self.__stats["wire_bytes_received"] += wire_received
+            self.__stats["content_bytes_received"] += content_received
+            self.__stats["decompression_time"] += decompression_time
+
+    def __encode_body(self, body: Any, headers: dict):
+        data = json.dumps(body, allow_nan=False).encode()
+        headers["Content-Type"] = "application/json"
+        content_size = len(data)
+
+        if self.__compression_threshold is not None and content_size >= self.__compression_threshold:
+            data = gzip.compress(data, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+
+        return data, content_size
 
     def __base_request(self, method: str, url: str, body: Optional[Any] = None) -> Any:
         token = get_token(self.__settings)
 
-        headers = {"X-Balena-Client": f"balena-python-sdk/{self.__sdk_version}"}
+        headers = {"X-Balena-Client": f"balena-python-sdk/{self.__sdk_version}", "Accept-Encoding": ACCEPT_ENCODING}
         if token is not None:
             headers["Authorization"] = f"Bearer {token}"
 
@@ -58,15 +382,39 @@ class PineClient(PinejsClientCore):
                     values[k] = v
 
         if is_multipart_form_data:
-            req = requests.request(method, url=url, files=files, data=values, headers=headers)
+            req = requests.request(method, url=url, files=files, data=values, headers=headers, stream=True)
+            # the multipart body is encoded in memory by requests, it is sent as is
+            content_sent = wire_sent = len(req.request.body or b"")
+        elif body is not None:
+            data, content_sent = self.__encode_body(body, headers)
+            wire_sent = len(data)
+            req = requests.request(method, url=url, data=data, headers=headers, stream=True)
         else:
-            req = requests.request(method, url=url, json=body, headers=headers)
+            cached = None
+            if method == "GET" and self.__response_cache is not None:
+                cached = self.__response_cache.get(token, url)
+                if cached is not None:
+                    headers.update(cached.get_validators())
+
+            req = requests.request(method, url=url, headers=headers, stream=True)
+            content_sent = wire_sent = 0
+
+            if req.status_code == 304 and cached is not None:
+                with req:
+                    _, wire_received, _ = _read_response(req)
+                self.__record_transfer(0, 0, wire_received, 0, 0.0, not_modified=True)
+                # bodies are decoded again, handing out a shared object would let callers alter the cache
+                return decode_body(cached.body)
+
+        with req:
+            content, wire_received, decompression_time = _read_response(req)
+        self.__record_transfer(content_sent, wire_sent, wire_received, len(content), decompression_time)
+
+        if method == "GET" and req.ok and self.__response_cache is not None:
+            self.__response_cache.put(token, url, req.headers.get("etag"), req.headers.get("last-modified"), content)
 
         if req.ok:
-            try:
-                return req.json()
-            except Exception:
-                return req.content.decode()
+            return decode_body(content)
         else:
             retry_after = req.headers.get("retry-after")
             if (
@@ -78,4 +426,4 @@ class PineClient(PinejsClientCore):
                 sleep(int(retry_after))
                 return self.__base_request(method, url, body)
 
-            raise RequestError(body=req.content.decode(), status_code=req.status_code)
+            raise RequestError(body=content.decode(), status_code=req.status_code)
@@ -0,0 +1,276 @@
+import hashlib
+import os
+import os.path as Path
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, NamedTuple, Optional
+from weakref import WeakKeyDictionary
+
+import jwt
+
+from .exceptions import InvalidOption
+from .settings import Settings, is_enabled
+
+# Default size of the cache database, in bytes of cached bodies
+DEFAULT_RESOURCE_CACHE_SIZE = 64 * 1024 * 1024
+
+# Once the cache is full, least recently used entries are evicted down to this fraction of its size
+EVICTION_TARGET = 0.9
+
+# Access times are only refreshed after this many seconds, to keep reads from writing
+ACCESS_TIME_RESOLUTION = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entry (
+    key TEXT PRIMARY KEY,
+    resource TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entry_resource ON entry (resource);
+CREATE INDEX IF NOT EXISTS entry_accessed_at ON entry (accessed_at);
+"""
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+def _all_items(predicate: Callable[[Any], bool]) -> Callable[[Any], bool]:
+    def is_cacheable(result: Any) -> bool:
+        items = result.get("d") if isinstance(result, dict) else None
+        return isinstance(items, list) and all(isinstance(item, dict) and predicate(item) for item in items)
+
+    return is_cacheable
+
+
+def _always(result: Any) -> bool:
+    return isinstance(result, dict) and isinstance(result.get("d"), list)
+
+
+def _is_final_release(release: Any) -> bool:
+    return release.get("is_final") is True
+
+
+def _is_final_image(image: Any) -> bool:
+    return image.get("status") in ("success", "failed")
+
+
+def _is_host_app_query(query: str) -> bool:
+    return "is_host eq true" in query
+
+
+class CachePolicy(NamedTuple):
+    # seconds a cached result is served for
+    ttl: int
+    # whether a query on the resource can be cached at all
+    matches: Callable[[str, str], bool]
+    # whether the result of the query can be cached
+    is_cacheable: Callable[[Any], bool]
+
+
+# Resources that (almost) never change, releases and images only once they are final.
+# Single releases and images are only cached when looked up by id, since listings can grow.
+RESOURCE_CACHE_POLICIES: Dict[str, CachePolicy] = {
+    "device_type": CachePolicy(DAY, lambda key, query: True, _always),
+    "cpu_architecture": CachePolicy(7 * DAY, lambda key, query: True, _always),
+    "application_membership_role": CachePolicy(7 * DAY, lambda key, query: True, _always),
+    "organization_membership_role": CachePolicy(7 * DAY, lambda key, query: True, _always),
+    "application": CachePolicy(HOUR, lambda key, query: _is_host_app_query(query), _always),
+    "release": CachePolicy(DAY, lambda key, query: key != "", _all_items(_is_final_release)),
+    "image": CachePolicy(DAY, lambda key, query: key != "", _all_items(_is_final_image)),
+}
+
+
+def _split_top_level(query: str):
+    parts = []
+    depth = 0
+    quoted = False
+    start = 0
+    for i, char in enumerate(query):
+        if char == "'":
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "&" and depth == 0:
+            parts.append(query[start:i])
+            start = i + 1
+    parts.append(query[start:])
+    return parts
+
+
+def parse_resource_path(path: str):
+    """
+    Split a pine path, e.g. `release(123)?$select=id`, in resource name, key and query.
+    The top level query options are sorted, so equivalent queries share a cache entry.
+    """
+    path, _, query = path.partition("?")
+    resource, _, key = path.partition("(")
+    resource = resource.split("/")[0]
+    return resource, key.rstrip(")"), "&".join(sorted(_split_top_level(query))) if query else ""
+
+
+def get_cache_scope(token: Optional[str]) -> str:
+    """
+    Identify the actor of a token, so results are only shared by requests that can see the same data.
+    """
+    if token is None:
+        return "anonymous"
+    try:
+        return f"actor:{jwt.decode(token, algorithms=['HS256'], options={'verify_signature': False})['id']}"
+    except Exception:
+        # api keys are opaque
+        return f"key:{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+class ResourceCache:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    Persistent cache of pine query results backed by sqlite, meant for resources that (almost) never change.
+    Entries expire after the TTL of their resource class and the least recently used ones are evicted
+    once the cache outgrows its size. The database can be shared by several processes.
+    Database errors, e.g. a locked, read only or corrupt database, are treated as cache misses and never fail
+    the request.
+    """
+
+    def __init__(self, path: str, max_size: int):
+        self.__max_size = max_size
+        self.__lock = Lock()
+        self.__connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.executescript(SCHEMA)
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self.__lock:
+            try:
+                row = self.__connection.execute(
+                    "SELECT expires_at, accessed_at, body FROM entry WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+
+                expires_at, accessed_at, body = row
+                if expires_at <= now:
+                    self.__connection.execute("DELETE FROM entry WHERE key = ? AND expires_at <= ?", (key, now))
+                    return None
+                if now - accessed_at >= ACCESS_TIME_RESOLUTION:
+                    self.__connection.execute("UPDATE entry SET accessed_at = ? WHERE key = ?", (now, key))
+                return body
+            except sqlite3.Error:
+                return None
+
+    def put(self, key: str, resource: str, body: bytes, ttl: int) -> None:
+        if len(body) > self.__max_size * (1 - EVICTION_TARGET):
+            return
+
+        now = time.time()
+        with self.__lock:
+            try:
+                self.__connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error:
+                return
+            try:
+                self.__connection.execute(
+                    "INSERT OR REPLACE INTO entry (key, resource, expires_at, accessed_at, size, body) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, resource, now + ttl, now, len(body), body),
+                )
+                self.__evict(now)
+                self.__connection.execute("COMMIT")
+            except BaseException as e:
+                self.__rollback()
+                if not isinstance(e, sqlite3.Error):
+                    raise
+
+    def __rollback(self) -> None:
+        try:
+            if self.__connection.in_transaction:
+                self.__connection.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+
+    def __evict(self, now: float) -> None:
+        (size,) = self.__connection.execute("SELECT ifnull(sum(size), 0) FROM entry").fetchone()
+        if size <= self.__max_size:
+            return
+
+        self.__connection.execute("DELETE FROM entry WHERE expires_at <= ?", (now,))
+        target = self.__max_size * EVICTION_TARGET
+        rows = self.__connection.execute("SELECT key, size FROM entry ORDER BY accessed_at").fetchall()
+        (size,) = self.__connection.execute("SELECT ifnull(sum(size), 0) FROM entry").fetchone()
+
+        evicted = []
+        for key, entry_size in rows:
+            if size <= target:
+                break
+            evicted.append((key,))
+            size -= entry_size
+        self.__connection.executemany("DELETE FROM entry WHERE key = ?", evicted)
+
+    def invalidate(self, resource: str) -> None:
+        """
+        Drop the entries affected by a write to a resource, e.g. the `release` ones when a `release_tag` changes.
+        """
+        with self.__lock:
+            try:
+                self.__connection.execute(
+                    "DELETE FROM entry WHERE substr(?, 1, length(resource)) = resource", (resource,)
+                )
+            except sqlite3.Error:
+                # the entries are still dropped once they expire
+                pass
+
+    def clear(self) -> None:
+        with self.__lock:
+            try:
+                self.__connection.execute("DELETE FROM entry")
+            except sqlite3.Error:
+                pass
+
+
+__caches: "WeakKeyDictionary[Settings, Optional[ResourceCache]]" = WeakKeyDictionary()
+__caches_lock = Lock()
+
+
+def get_resource_cache(settings: Settings) -> Optional[ResourceCache]:
+    """
+    Get the resource cache shared by all the requests done with these settings, stored under `cache_directory`.
+    Entries are served without revalidation, so changes made by other clients are only seen once they expire,
+    which is why the cache has to be enabled with the `resource_cache_enabled` setting.
+    None if it is not enabled, if there is no cache directory (in memory settings) or if `resource_cache_size`
+    is set to 0.
+    """
+    try:
+        if not is_enabled(settings.get("resource_cache_enabled")):
+            return None
+    except InvalidOption:
+        return None
+
+    with __caches_lock:
+        if settings in __caches:
+            return __caches[settings]
+
+        try:
+            max_size = int(settings.get("resource_cache_size"))
+        except InvalidOption:
+            max_size = DEFAULT_RESOURCE_CACHE_SIZE
+
+        cache = None
+        try:
+            directory = str(settings.get("cache_directory"))
+            if max_size > 0:
+                os.makedirs(directory, exist_ok=True)
+                cache = ResourceCache(Path.join(directory, "resources.db"), max_size)
+        except (InvalidOption, OSError, sqlite3.Error):
+            pass
+
+        __caches[settings] = cache
+        return cache
@@ -40,6 +40,8 @@ class Message:
     INVALID_APPLICATION_TYPE = "Invalid application type: {app_type}"
     UNSUPPORTED_FEATURE = "You have to log in using credentials or Auth Token to use this function!"
     OS_UPDATE_ERROR = "OS update failed: {message}"
+    OS_DOWNLOAD_ERROR = "OS download failed: {message}"
+    CHUNKED_REQUEST_ERROR = "{failed} of {total} chunked requests failed: {message}"
     DEVICE_NOT_PROVISIONED = "Device is not yet fully provisioned"
     DEVICE_OS_NOT_SUPPORT_LOCAL_MODE = "Device OS version does not support local mode"
     DEVICE_SUPERVISOR_NOT_SUPPORT_LOCAL_MODE = "Device supervisor version does not support local mode"
@@ -0,0 +1,263 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Literal, Optional, TypedDict, Union, cast
+
+from . import exceptions
+
+DEFAULT_WAVE_SIZE = 50
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_FAILURE_THRESHOLD = 0.1
+DEFAULT_POLL_INTERVAL = 30
+DEFAULT_STALL_TIMEOUT = 15 * 60
+DEFAULT_UPDATE_TIMEOUT = 60 * 60
+
+# Fields of a device whose changes show that its update progresses
+PROGRESS_FIELDS = ["status", "provisioning_state", "provisioning_progress", "is_online", "os_version"]
+
+
+class OsUpdateProgress(TypedDict):
+    status: Optional[str]
+    provisioning_state: Optional[str]
+    provisioning_progress: Optional[int]
+    is_online: Optional[bool]
+    os_version: Optional[str]
+    # time of the last change of any of the above
+    changed_at: float
+
+
+class OsUpdateRolloutState(TypedDict):
+    target_os_version: str
+    status: Literal["running", "paused", "completed"]
+    # devices of the next waves, as given until they are validated and then by uuid
+    pending: List[Union[str, int]]
+    # uuids of the validated devices of the current wave that were not started yet
+    wave: List[str]
+    # uuids of the devices being updated, with the time their update was started
+    in_progress: Dict[str, float]
+    # last reported progress of the devices being updated
+    update_progress: Dict[str, OsUpdateProgress]
+    succeeded: List[str]
+    # devices whose update failed or timed out, with the reason
+    failed: Dict[str, str]
+    # devices that were never started since they are not found, offline or can not be updated, with the reason
+    rejected: Dict[str, str]
+    # succeeded and failed counts when the rollout was last resumed, the failure rate is computed from there on
+    resumed_at: List[int]
+
+
+# Fetches devices by id or uuid, keyed by the given id or uuid
+FetchDevices = Callable[[List[Union[str, int]]], Dict[Union[str, int], Any]]
+# Returns why a device can not be updated, None if it can; the flag asks to also require the device to be online
+ValidateDevice = Callable[[Any, bool], Optional[str]]
+# Whether the update of a device "succeeded" or "failed", None while it is running
+GetUpdateStatus = Callable[[Any], Optional[Literal["succeeded", "failed"]]]
+
+
+class OsUpdateRollout:
+    """
+    This is low level class and is not meant to be used by end users directly.
+
+    Updates the OS of a set of devices in waves. All the devices are validated upfront, the ones of each wave are
+    checked to be online when the wave starts, at most `max_concurrency` updates run at once, and the progress of
+    the running updates is polled with a single query. An update fails once its device status and provisioning
+    progress did not change for `stall_timeout`, or once it runs for `update_timeout`. The next wave only starts
+    once the current one finished.
+    The rollout pauses once the share of failed updates reaches `failure_threshold`, which only applies from
+    `min_failure_sample` finished updates on, one wave by default.
+    The state is saved to `state_path` after every step, so an interrupted or paused rollout can be resumed.
+    """
+
+    def __init__(
+        self,
+        target_os_version: str,
+        fetch_devices: FetchDevices,
+        validate_device: ValidateDevice,
+        start_update: Callable[[str], Any],
+        get_update_status: GetUpdateStatus,
+        wave_size: int = DEFAULT_WAVE_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        failure_threshold: float = DEFAULT_FAILURE_THRESHOLD,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        update_timeout: float = DEFAULT_UPDATE_TIMEOUT,
+        state_path: Optional[str] = None,
+        progress: Optional[Callable[[OsUpdateRolloutState], None]] = None,
+        stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+        min_failure_sample: Optional[int] = None,
+    ):
+        self.__target_os_version = target_os_version
+        self.__fetch_devices = fetch_devices
+        self.__validate_device = validate_device
+        self.__start_update = start_update
+        self.__get_update_status = get_update_status
+        self.__wave_size = max(1, wave_size)
+        self.__max_concurrency = max(1, max_concurrency)
+        self.__failure_threshold = failure_threshold
+        self.__poll_interval = poll_interval
+        self.__update_timeout = update_timeout
+        self.__state_path = state_path
+        self.__progress = progress
+        self.__stall_timeout = stall_timeout
+        self.__min_failure_sample = max(1, self.__wave_size if min_failure_sample is None else min_failure_sample)
+
+    def run(self, uuids_or_ids: List[Union[str, int]]) -> OsUpdateRolloutState:
+        """
+        Run the rollout until all the devices are updated or it pauses.
+        A saved state is resumed instead of starting over, in which case the given devices are ignored.
+        """
+        state = self.__load_state()
+        if state is None:
+            state = {
+                "target_os_version": self.__target_os_version,
+                "status": "running",
+                "pending": list(dict.fromkeys(uuids_or_ids)),
+                "wave": [],
+                "in_progress": {},
+                "update_progress": {},
+                "succeeded": [],
+                "failed": {},
+                "rejected": {},
+                "resumed_at": [0, 0],
+            }
+        elif state["status"] == "paused":
+            # resuming a paused rollout accepts the failures so far
+            state["resumed_at"] = [len(state["succeeded"]), len(state["failed"])]
+        state["status"] = "running"
+
+        self.__validate_pending(state)
+        while state["status"] == "running":
+            if not state["wave"] and not state["in_progress"]:
+                if not state["pending"]:
+                    state["status"] = "completed"
+                    self.__save_state(state)
+                    break
+                self.__start_wave(state)
+
+            self.__start_updates(state)
+            if state["in_progress"] and not self.__exceeds_failure_threshold(state):
+                time.sleep(self.__poll_interval)
+                self.__poll(state)
+
+            if self.__exceeds_failure_threshold(state):
+                state["status"] = "paused"
+            self.__save_state(state)
+            if self.__progress is not None:
+                self.__progress(state)
+
+        return state
+
+    def __load_state(self) -> Optional[OsUpdateRolloutState]:
+        if self.__state_path is None or not os.path.exists(self.__state_path):
+            return None
+
+        with open(self.__state_path) as f:
+            state = json.load(f)
+        if state["target_os_version"] != self.__target_os_version:
+            raise exceptions.OsUpdateError(
+                f"{self.__state_path} holds a rollout to {state['target_os_version']}, not {self.__target_os_version}"
+            )
+        # the progress of the running updates is tracked again from the time they are resumed
+        state["update_progress"] = {}
+        return state
+
+    def __save_state(self, state: OsUpdateRolloutState) -> None:
+        if self.__state_path is None:
+            return
+
+        tmp_path = f"{self.__state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.__state_path)
+
+    def __validate(self, state: OsUpdateRolloutState, uuids_or_ids: List[Union[str, int]], online: bool) -> List[str]:
+        devices = self.__fetch_devices(uuids_or_ids)
+        valid = []
+        for uuid_or_id in uuids_or_ids:
+            device = devices.get(uuid_or_id)
+            if device is None:
+                state["rejected"][str(uuid_or_id)] = exceptions.DeviceNotFound(uuid_or_id).message
+                continue
+
+            reason = self.__validate_device(device, online)
+            if reason is not None:
+                state["rejected"][device["uuid"]] = reason
+            else:
+                valid.append(device["uuid"])
+        return valid
+
+    def __validate_pending(self, state: OsUpdateRolloutState) -> None:
+        # every device is checked against the OS catalog upfront, whether it is online is checked by wave
+        state["pending"] = list(dict.fromkeys(self.__validate(state, state["pending"], False)))
+        self.__save_state(state)
+
+    def __start_wave(self, state: OsUpdateRolloutState) -> None:
+        size = self.__wave_size
+        wave = state["pending"][:size]
+        state["wave"] = self.__validate(state, wave, True)
+        del state["pending"][:size]
+        self.__save_state(state)
+
+    def __start_updates(self, state: OsUpdateRolloutState) -> None:
+        slots = max(0, self.__max_concurrency - len(state["in_progress"]))
+        uuids = state["wave"][:slots]
+        if not uuids:
+            return
+
+        def start(uuid: str) -> Optional[str]:
+            try:
+                self.__start_update(uuid)
+                return None
+            except exceptions.BalenaException as e:
+                return e.message
+            except Exception as e:
+                return str(e)
+
+        with ThreadPoolExecutor(max_workers=len(uuids)) as executor:
+            for uuid, error in zip(uuids, executor.map(start, uuids)):
+                if error is None:
+                    state["in_progress"][uuid] = time.time()
+                else:
+                    state["failed"][uuid] = error
+        del state["wave"][:slots]
+        self.__save_state(state)
+
+    def __track_progress(self, state: OsUpdateRolloutState, uuid: str, device: Any, now: float) -> float:
+        # returns the time the update last progressed, counted from its first poll
+        previous = state["update_progress"].get(uuid)
+        current = {field: device.get(field) for field in PROGRESS_FIELDS}
+        if previous is None or any(previous[field] != current[field] for field in PROGRESS_FIELDS):
+            state["update_progress"][uuid] = cast(OsUpdateProgress, {**current, "changed_at": now})
+        return state["update_progress"][uuid]["changed_at"]
+
+    def __poll(self, state: OsUpdateRolloutState) -> None:
+        devices = self.__fetch_devices(list(state["in_progress"]))
+        now = time.time()
+        for uuid, started_at in list(state["in_progress"].items()):
+            device = devices.get(uuid)
+            status = self.__get_update_status(device) if device is not None else "failed"
+            progressed_at = self.__track_progress(state, uuid, device, now) if device is not None else now
+            if status is None and now - started_at >= self.__update_timeout:
+                state["failed"][uuid] = "OS update timed out"
+            elif status is None and now - progressed_at >= self.__stall_timeout:
+                state["failed"][uuid] = "OS update stalled"
+            elif status == "succeeded":
+                state["succeeded"].append(uuid)
+            elif status == "failed":
+                state["failed"][uuid] = exceptions.OsUpdateError(
+                    (device.get("provisioning_state") or device.get("status"))
+                    if device is not None
+                    else "device not found"
+                ).message
+            else:
+                continue
+            del state["in_progress"][uuid]
+            state["update_progress"].pop(uuid, None)
+
+    def __exceeds_failure_threshold(self, state: OsUpdateRolloutState) -> bool:
+        succeeded = len(state["succeeded"]) - state["resumed_at"][0]
+        failed = len(state["failed"]) - state["resumed_at"][1]
+        # a few early failures are not a rate yet
+        if succeeded + failed < self.__min_failure_sample:
+            return False
+        return failed > 0 and failed / (succeeded + failed) >= self.__failure_threshold
@@ -22,6 +22,19 @@ class SettingsConfig(TypedDict, total=False):
     request_limit: str
     request_limit_interval: str
     retry_rate_limited_request: bool
+    request_compression_threshold: str
+    response_cache_size: str
+    response_cache_on_disk: bool
+    resource_cache_enabled: bool
+    resource_cache_size: str
+    image_cache_size: str
+
+
+def is_enabled(value: Union[str, bool]) -> bool:
+    """
+    Whether a boolean setting is on, either set to True or read back as "true" from the settings file.
+    """
+    return value is True or str(value).lower() == "true"
 
 
 class SettingsProviderInterface(ABC):
@@ -1,7 +1,8 @@
 import numbers
 import re
 from collections import defaultdict
-from typing import Any, Callable, Dict, Literal, Optional, TypeVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, TypeVar
 from .types.models import TypeDevice, TypeDeviceWithServices
 
 from semver.version import Version
@@ -10,6 +11,31 @@ from .exceptions import RequestError, SupervisorLocked
 
 SUPERVISOR_LOCKED_STATUS_CODE = 423
 
+# Fleets only report a few hundred distinct OS and supervisor versions,
+# so normalized and parsed versions are memoized by their raw string.
+VERSION_CACHE_SIZE = 4096
+
+BALENA_SEMVER_SUBSTITUTIONS = [
+    # fix major.minor.patch.rev to use rev as build metadata
+    (re.compile(r"(\.[0-9]+)\.rev"), r"\1+rev"),
+    # fix major.minor.patch.prod to be treat .dev & .prod as build metadata
+    (re.compile(r"([0-9]+\.[0-9]+\.[0-9]+)\.(dev|prod)"), r"\1+\2"),
+    # if there are no build metadata, then treat the parenthesized value as one
+    (re.compile(r"([0-9]+\.[0-9]+\.[0-9]+(?:[-\.][0-9a-z]+)*) \(([0-9a-z]+)\)"), r"\1+\2"),
+    # if there are build metadata, then treat the parenthesized value as point value
+    (re.compile(r"([0-9]+\.[0-9]+\.[0-9]+(?:[-\+\.][0-9a-z]+)*) \(([0-9a-z]+)\)"), r"\1.\2"),
+    # Remove "Resin OS" and "Balena OS" text
+    (re.compile(r"(resin|balena)\s*os\s*", flags=re.IGNORECASE), ""),
+    # remove optional versioning, eg "(prod)", "(dev)"
+    (re.compile(r"\s+\(\w+\)$"), ""),
+    # remove "v" prefix
+    (re.compile(r"^v"), ""),
+]
+
+SEMVER_RANGE_WILDCARDS = ("x", "X", "*")
+SEMVER_RANGE_OPERATOR_SPACING = re.compile(r"(>=|<=|==|!=|>|<|=|\^|~)\s+")
+SEMVER_RANGE_COMPARATOR = re.compile(r"^(>=|<=|==|!=|>|<|=|\^|~)?v?(.+)$")
+
 
 def is_id(value: Any) -> bool:
     """
@@ -231,6 +257,7 @@ def with_supervisor_locked_error(fn: Callable[[], T]) -> T:
         raise e
 
 
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
 def normalize_balena_semver(os_version: str) -> str:
     """
     safeSemver and trimOsText from resin-semver in Python.
@@ -238,31 +265,170 @@ def normalize_balena_semver(os_version: str) -> str:
 
     """
 
-    # fix major.minor.patch.rev to use rev as build metadata
-    version = re.sub(r"(\.[0-9]+)\.rev", r"\1+rev", os_version)
-    # fix major.minor.patch.prod to be treat .dev & .prod as build metadata
-    version = re.sub(r"([0-9]+\.[0-9]+\.[0-9]+)\.(dev|prod)", r"\1+\2", version)
-    # if there are no build metadata, then treat the parenthesized value as one
-    version = re.sub(
-        r"([0-9]+\.[0-9]+\.[0-9]+(?:[-\.][0-9a-z]+)*) \(([0-9a-z]+)\)",
-        r"\1+\2",
-        version,
-    )
-    # if there are build metadata, then treat the parenthesized value as point value
-    version = re.sub(
-        r"([0-9]+\.[0-9]+\.[0-9]+(?:[-\+\.][0-9a-z]+)*) \(([0-9a-z]+)\)",
-        r"\1.\2",
-        version,
-    )
-    # Remove "Resin OS" and "Balena OS" text
-    version = re.sub(r"(resin|balena)\s*os\s*", "", version, flags=re.IGNORECASE)
-    # remove optional versioning, eg "(prod)", "(dev)"
-    version = re.sub(r"\s+\(\w+\)$", "", version)
-    # remove "v" prefix
-    version = re.sub(r"^v", "", version)
+    version = os_version
+    for pattern, replacement in BALENA_SEMVER_SUBSTITUTIONS:
+        version = pattern.sub(replacement, version)
     return version
 
 
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def parse_semver(version: str) -> Version:
+    """
+    Memoized Version.parse, it raises a ValueError for invalid versions.
+    The returned versions are shared, they are immutable.
+
+    """
+
+    return Version.parse(version)
+
+
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def is_valid_semver(version: str) -> bool:
+    """
+    Memoized Version.is_valid.
+
+    """
+
+    try:
+        parse_semver(version)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _get_prerelease_precedence(prerelease: Optional[str]) -> tuple:
+    # releases after pre-releases, numeric identifiers before alphanumeric ones
+    if not prerelease:
+        return (1,)
+    return (0, tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in prerelease.split(".")))
+
+
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def get_semver_precedence(version: str) -> tuple:
+    """
+    Memoized key with the semver precedence of a version, build metadata is ignored,
+    i.e. keys compare like the parsed versions do. It raises a ValueError for invalid versions.
+
+    """
+
+    semver_obj = parse_semver(version)
+    return (semver_obj.major, semver_obj.minor, semver_obj.patch, _get_prerelease_precedence(semver_obj.prerelease))
+
+
+def _get_exclusive_upper_bound(numbers: List[int], index: int) -> tuple:
+    # the key of the next version with the part at index bumped, below all of its pre-releases, e.g. 3.0.0-0
+    bumped = [*numbers[:index], numbers[index] + 1]
+    return (*bumped, *[0] * (3 - len(bumped)), (0, ()))
+
+
+def _parse_partial_semver(version: str, comparator: str) -> List[int]:
+    # the numbers of an x-range, e.g. [2, 88] for 2.88.x, where missing parts are wildcards too
+    numbers: List[int] = []
+    has_wildcard = False
+    for part in version.split("."):
+        if part in SEMVER_RANGE_WILDCARDS:
+            has_wildcard = True
+        elif part.isdigit() and not has_wildcard:
+            numbers.append(int(part))
+        else:
+            raise ValueError(f"Invalid semver range comparator: {comparator}")
+    if len(numbers) >= 3 or len(version.split(".")) > 3:
+        raise ValueError(f"Invalid semver range comparator: {comparator}")
+    return numbers
+
+
+def _compile_semver_comparator(comparator: str) -> Callable[[tuple], bool]:
+    match = SEMVER_RANGE_COMPARATOR.match(comparator)
+    if match is None:
+        raise ValueError(f"Invalid semver range comparator: {comparator}")
+    operator, version = match.groups()
+
+    if operator in ("^", "~"):
+        if is_valid_semver(version):
+            lower = get_semver_precedence(version)
+            numbers = list(lower[:3])
+        else:
+            numbers = _parse_partial_semver(version, comparator)
+            if not numbers:
+                return lambda key: True
+            lower = (*numbers, *[0] * (3 - len(numbers)), (1,))
+
+        if operator == "~":
+            # ~1.2.3 and ~1.2 allow patch updates, ~1 minor ones
+            upper = _get_exclusive_upper_bound(numbers, min(1, len(numbers) - 1))
+        else:
+            # ^1.2.3 allows minor updates, ^0.2.3 patch ones and ^0.0.3 none, the same goes for x-ranges
+            index = next((i for i, number in enumerate(numbers) if number != 0), len(numbers) - 1)
+            upper = _get_exclusive_upper_bound(numbers, index)
+        return lambda key: lower <= key < upper
+
+    if is_valid_semver(version):
+        bound = get_semver_precedence(version)
+        if operator in (None, "=", "=="):
+            return lambda key: key == bound
+        if operator == "!=":
+            return lambda key: key != bound
+        if operator == ">=":
+            return lambda key: key >= bound
+        if operator == ">":
+            return lambda key: key > bound
+        if operator == "<=":
+            return lambda key: key <= bound
+        return lambda key: key < bound
+
+    # x-range, e.g. 2.88.x, 2.x or *
+    numbers = _parse_partial_semver(version, comparator)
+    if not numbers:
+        return (lambda key: False) if operator in ("!=", "<", ">") else (lambda key: True)
+
+    # 2.x matches from 2.0.0 up to, but excluding, 3.0.0 and its pre-releases
+    lower = (*numbers, *[0] * (3 - len(numbers)), (1,))
+    upper = _get_exclusive_upper_bound(numbers, len(numbers) - 1)
+
+    if operator in (None, "=", "=="):
+        return lambda key: lower <= key < upper
+    if operator == "!=":
+        return lambda key: not lower <= key < upper
+    if operator == ">=":
+        return lambda key: key >= lower
+    if operator == ">":
+        return lambda key: key >= upper
+    if operator == "<=":
+        return lambda key: key < upper
+    return lambda key: key < lower
+
+
+@lru_cache(maxsize=256)
+def compile_semver_range(version_range: str) -> Callable[[tuple], bool]:
+    """
+    Compile a semver range once into a predicate over precedence keys (see `get_semver_precedence`).
+    Supported are exact versions, comparators (`>=2.88.0`, `<3.0.0`, `!=2.88.4`, ...), x-ranges with
+    `x`, `X` or `*` wildcards (`2.88.x`, `2.x`, `*`), caret (`^2.88.0`) and tilde (`~2.88.0`) ranges,
+    space separated comparator sets and `||` alternatives.
+    Pre-releases of the version following an x-range, caret or tilde range are not part of it, e.g. 2.x
+    does not match 3.0.0-rc1.
+    It raises a ValueError for invalid ranges.
+
+    Examples:
+        >>> matches = compile_semver_range(">=2.80.0 <2.90.0 || 3.x")
+        >>> matches(get_semver_precedence("2.88.4+rev1"))
+        True
+
+    """
+
+    alternatives: List[Tuple[Callable[[tuple], bool], ...]] = []
+    for alternative in version_range.split("||"):
+        comparators = SEMVER_RANGE_OPERATOR_SPACING.sub(r"\1", alternative).split()
+        if not comparators:
+            raise ValueError(f"Invalid semver range: {version_range}")
+        alternatives.append(tuple(_compile_semver_comparator(comparator) for comparator in comparators))
+
+    if len(alternatives) == 1 and len(alternatives[0]) == 1:
+        return alternatives[0][0]
+
+    return lambda key: any(all(predicate(key) for predicate in predicates) for predicates in alternatives)
+
+
 def ensure_version_compatibility(
     version: str,
     min_version: str,
@@ -270,7 +436,7 @@ def ensure_version_compatibility(
 ) -> None:
     version = normalize_balena_semver(version)
 
-    if version and Version.parse(version) < Version.parse(min_version):
+    if version and parse_semver(version) < parse_semver(min_version):
         raise ValueError(f"Incompatible {version_type} version: {version} - must be >= {min_version}")
 
 
@@ -278,7 +444,7 @@ def get_device_os_semver_with_variant(os_version: str, os_variant: Optional[str]
     if not os_version:
         return None
 
-    version_info = Version.parse(normalize_balena_semver(os_version))
+    version_info = parse_semver(normalize_balena_semver(os_version))
 
     if not version_info:
         return os_version
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark of the balenaOS version ordering used by `balena.models.os` on host app release lists.
+
+Usage:
+    PYTHONPATH=. python benchmarks/os_version_sort.py
+"""
+
+import random
+import timeit
+from functools import cmp_to_key
+
+from balena.models.os import (
+    compare_balena_version,
+    get_balena_version_sort_key,
+    get_rev_version,
+    is_development_version,
+)
+from balena.utils import compare, normalize_balena_semver
+from semver.version import Version
+
+RELEASES_PER_DEVICE_TYPE = 400
+DEVICE_TYPES = 20
+REPEAT = 5
+
+
+def make_host_app_releases(count, seed):
+    rnd = random.Random(seed)
+    releases = []
+    for _ in range(count):
+        major = rnd.choice([2, 2, 2, 3, 4, 5, 6])
+        version = f"{major}.{rnd.randint(0, 120)}.{rnd.randint(0, 30)}"
+        if rnd.random() < 0.05:
+            version += f"-{rnd.randint(1600000000000, 1700000000000)}"
+        if major == 2 and rnd.random() < 0.6:
+            version += f"+rev{rnd.randint(1, 5)}" + rnd.choice(["", ".dev", ".prod"])
+        releases.append({"raw_version": version})
+    return releases
+
+
+def legacy_compare(version_a, version_b):
+    # the comparison as it was before sort keys: normalize and parse both sides on every call
+    if not version_a:
+        return 0 if not version_b else -1
+    if not version_b:
+        return 1
+    normalized_a = normalize_balena_semver(version_a)
+    normalized_b = normalize_balena_semver(version_b)
+    valid_a = Version.is_valid(normalized_a)
+    valid_b = Version.is_valid(normalized_b)
+    if not valid_a or not valid_b:
+        return 1 if valid_a else -1 if valid_b else 0
+    semver_a = Version.parse(normalized_a)
+    semver_b = Version.parse(normalized_b)
+    return (
+        semver_a.compare(semver_b)
+        or compare(get_rev_version(semver_a), get_rev_version(semver_b))
+        or compare(is_development_version(semver_a), is_development_version(semver_b))
+        or compare(normalized_a, normalized_b)
+    )
+
+
+def main():
+    device_types = [make_host_app_releases(RELEASES_PER_DEVICE_TYPE, seed) for seed in range(DEVICE_TYPES)]
+
+    def sort_with_cmp():
+        for releases in device_types:
+            sorted(
+                releases, reverse=True, key=cmp_to_key(lambda a, b: legacy_compare(a["raw_version"], b["raw_version"]))
+            )
+
+    def sort_with_keys_cold():
+        get_balena_version_sort_key.cache_clear()
+        for releases in device_types:
+            sorted(releases, reverse=True, key=lambda r: get_balena_version_sort_key(r["raw_version"]))
+
+    def sort_with_keys_warm():
+        for releases in device_types:
+            sorted(releases, reverse=True, key=lambda r: get_balena_version_sort_key(r["raw_version"]))
+
+    for releases in device_types:
+        expected = sorted(
+            releases, reverse=True, key=cmp_to_key(lambda a, b: legacy_compare(a["raw_version"], b["raw_version"]))
+        )
+        actual = sorted(releases, reverse=True, key=lambda r: get_balena_version_sort_key(r["raw_version"]))
+        assert expected == actual
+        assert all(compare_balena_version(a["raw_version"], b["raw_version"]) >= 0 for a, b in zip(actual, actual[1:]))
+
+    print(f"{DEVICE_TYPES} device types x {RELEASES_PER_DEVICE_TYPE} releases, best of {REPEAT}")
+    baseline = min(timeit.repeat(sort_with_cmp, number=1, repeat=REPEAT))
+    print(f"  compare per pair (previous):        {baseline * 1000:8.1f} ms")
+    for name, fn in [("sort keys, cold", sort_with_keys_cold), ("sort keys, warm", sort_with_keys_warm)]:
+        elapsed = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+        print(f"  {name + ':':35}{elapsed * 1000:8.1f} ms ({baseline / elapsed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark of the version normalization and parsing done per device, e.g. by `get_device_os_semver_with_variant`
+and `ensure_version_compatibility`, over the OS and supervisor version columns of a 100k devices fleet.
+
+Usage:
+    PYTHONPATH=. python benchmarks/version_parsing.py
+"""
+
+import random
+import re
+import timeit
+
+from semver.version import Version
+
+from balena.utils import is_valid_semver, normalize_balena_semver, parse_semver
+
+DEVICES = 100_000
+DISTINCT_OS_VERSIONS = 300
+DISTINCT_SUPERVISOR_VERSIONS = 150
+REPEAT = 3
+
+
+def legacy_normalize_balena_semver(os_version):
+    # normalize_balena_semver as it was before precompiled patterns and memoization
+    version = re.sub(r"(\.[0-9]+)\.rev", r"\1+rev", os_version)
+    version = re.sub(r"([0-9]+\.[0-9]+\.[0-9]+)\.(dev|prod)", r"\1+\2", version)
+    version = re.sub(r"([0-9]+\.[0-9]+\.[0-9]+(?:[-\.][0-9a-z]+)*) \(([0-9a-z]+)\)", r"\1+\2", version)
+    version = re.sub(r"([0-9]+\.[0-9]+\.[0-9]+(?:[-\+\.][0-9a-z]+)*) \(([0-9a-z]+)\)", r"\1.\2", version)
+    version = re.sub(r"(resin|balena)\s*os\s*", "", version, flags=re.IGNORECASE)
+    version = re.sub(r"\s+\(\w+\)$", "", version)
+    version = re.sub(r"^v", "", version)
+    return version
+
+
+def make_version_columns(seed):
+    rnd = random.Random(seed)
+    os_versions = []
+    for _ in range(DISTINCT_OS_VERSIONS):
+        version = f"{rnd.choice([2, 3, 4, 5, 6])}.{rnd.randint(0, 120)}.{rnd.randint(0, 30)}"
+        os_versions.append(
+            rnd.choice(
+                [
+                    f"balenaOS {version}",
+                    f"balenaOS {version}+rev{rnd.randint(1, 5)}",
+                    f"Resin OS {version} (prod)",
+                    f"Resin OS {version}.rev{rnd.randint(1, 5)} (dev)",
+                ]
+            )
+        )
+    supervisor_versions = [
+        f"{rnd.randint(7, 16)}.{rnd.randint(0, 12)}.{rnd.randint(0, 20)}" for _ in range(DISTINCT_SUPERVISOR_VERSIONS)
+    ]
+    return (
+        [rnd.choice(os_versions) for _ in range(DEVICES)],
+        [rnd.choice(supervisor_versions) for _ in range(DEVICES)],
+    )
+
+
+def main():
+    os_column, supervisor_column = make_version_columns(0)
+    min_os_version = Version.parse("2.14.0")
+    min_supervisor_version = Version.parse("7.0.0")
+
+    def legacy():
+        for os_version, supervisor_version in zip(os_column, supervisor_column):
+            normalized = legacy_normalize_balena_semver(os_version)
+            if Version.is_valid(normalized):
+                Version.parse(normalized) >= min_os_version
+            Version.parse(legacy_normalize_balena_semver(supervisor_version)) >= min_supervisor_version
+
+    def memoized():
+        for os_version, supervisor_version in zip(os_column, supervisor_column):
+            normalized = normalize_balena_semver(os_version)
+            if is_valid_semver(normalized):
+                parse_semver(normalized) >= min_os_version
+            parse_semver(normalize_balena_semver(supervisor_version)) >= min_supervisor_version
+
+    for version in set(os_column) | set(supervisor_column):
+        assert normalize_balena_semver(version) == legacy_normalize_balena_semver(version)
+
+    print(f"{DEVICES} devices, {DISTINCT_OS_VERSIONS} OS and {DISTINCT_SUPERVISOR_VERSIONS} supervisor versions")
+    baseline = min(timeit.repeat(legacy, number=1, repeat=REPEAT))
+    print(f"  re.sub + Version.parse (previous): {baseline * 1000:8.1f} ms")
+    normalize_balena_semver.cache_clear()
+    parse_semver.cache_clear()
+    is_valid_semver.cache_clear()
+    elapsed = min(timeit.repeat(memoized, number=1, repeat=REPEAT))
+    print(f"  memoized normalize + parse:        {elapsed * 1000:8.1f} ms ({baseline / elapsed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
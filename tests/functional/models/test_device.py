@@ -180,6 +180,25 @@ class TestDevice(unittest.TestCase):
         with self.assertRaises(self.helper.balena_exceptions.IncompatibleApplication):
             self.balena.models.device.move(device["uuid"], app3["slug"])
 
+        # should check that the device can run the application, not the other way round.
+        app4 = self.balena.models.application.create(
+            "FooBarRpi", "raspberry-pi", self.helper.default_organization["id"]
+        )
+        rpi_device = self.balena.models.device.register(app4["id"], self.balena.models.device.generate_uuid())
+        with self.assertRaises(self.helper.balena_exceptions.IncompatibleApplication):
+            self.balena.models.device.move(rpi_device["uuid"], app2["slug"])
+        self.assertEqual(self.balena.models.device.get_application_name(rpi_device["uuid"]), app4["app_name"])
+
+        self.balena.models.device.move(device["uuid"], app4["slug"])
+        self.assertEqual(self.balena.models.device.get_application_name(device["uuid"]), app4["app_name"])
+
+        # should reject moving a device to an application of an unrelated architecture in either direction.
+        with self.assertRaises(self.helper.balena_exceptions.IncompatibleApplication):
+            self.balena.models.device.move(device["uuid"], app3["slug"])
+        nuc_device = self.balena.models.device.register(app3["id"], self.balena.models.device.generate_uuid())
+        with self.assertRaises(self.helper.balena_exceptions.IncompatibleApplication):
+            self.balena.models.device.move(nuc_device["uuid"], app2["slug"])
+
     def test_19_set_custom_location(self):
         location: LocationType = {"latitude": "41.383333", "longitude": "2.183333"}
 
@@ -411,6 +430,99 @@ class TestDevice(unittest.TestCase):
         self.assertNotIn(uuid, device_uuids)
         self.assertNotIn(uuid2, device_uuids)
 
+    def test_31_move_many(self):
+        devices = [
+            self.balena.models.device.register(self.app["id"], self.balena.models.device.generate_uuid())
+            for _ in range(3)
+        ]
+        app = self.balena.models.application.create(
+            "FooBarMany", "raspberrypi3", self.helper.default_organization["id"]
+        )
+        nuc_app = self.balena.models.application.create(
+            "FooBarManyNuc", "intel-nuc", self.helper.default_organization["id"]
+        )
+
+        # should move all the devices, whether given by id or uuid.
+        uuids_or_ids = [devices[0]["id"], devices[1]["uuid"], devices[2]["id"]]
+        result = self.balena.models.device.move_many(uuids_or_ids, app["slug"])
+        self.assertEqual(result, {"updated": uuids_or_ids, "failed": {}})
+        for device in devices:
+            self.assertEqual(self.balena.models.device.get_application_name(device["uuid"]), app["app_name"])
+
+        # should report the devices that are incompatible or not found, without moving them.
+        missing_uuid = self.balena.models.device.generate_uuid()
+        result = self.balena.models.device.move_many([devices[0]["id"], missing_uuid], nuc_app["id"])
+        self.assertEqual(result["updated"], [])
+        self.assertEqual(set(result["failed"]), {devices[0]["id"], missing_uuid})
+        self.assertEqual(self.balena.models.device.get_application_name(devices[0]["uuid"]), app["app_name"])
+
+    def test_32_pin_many_to_release(self):
+        app_info = self.helper.create_multicontainer_app(app_name="FooBarPinMany")
+        device = self.balena.models.device.register(app_info["app"]["id"], self.balena.models.device.generate_uuid())
+        other_device = self.balena.models.device.register(self.app["id"], self.balena.models.device.generate_uuid())
+
+        # should pin the devices of the application of the release and reject the other ones.
+        result = self.balena.models.device.pin_many_to_release(
+            [app_info["device"]["uuid"], device["id"], other_device["id"]], app_info["old_release"]["commit"]
+        )
+        self.assertEqual(result["updated"], [app_info["device"]["uuid"], device["id"]])
+        self.assertEqual(list(result["failed"]), [other_device["id"]])
+        self.assertFalse(self.balena.models.device.is_tracking_application_release(device["uuid"]))
+        self.assertEqual(
+            self.balena.models.device.get(device["id"], {"$select": "is_pinned_on__release"})["is_pinned_on__release"],
+            {"__id": app_info["old_release"]["id"]},
+        )
+        self.assertTrue(self.balena.models.device.is_tracking_application_release(other_device["uuid"]))
+
+    def test_33_pin_many_to_supervisor_release(self):
+        devices = [
+            self.balena.models.device.register(self.app["id"], self.balena.models.device.generate_uuid())
+            for _ in range(2)
+        ]
+        self.balena.pine.patch(
+            {
+                "resource": "device",
+                "id": devices[1]["id"],
+                "body": {"supervisor_version": "6.0.0", "os_version": "balenaOS 2.83.21+rev1"},
+            }
+        )
+        supervisor_release = self.balena.models.os.get_supervisor_releases_for_cpu_architecture(
+            "armv7hf", {"$top": 1, "$orderby": "created_at desc"}
+        )[0]
+
+        # should pin the compatible devices and reject the ones with a too old supervisor.
+        result = self.balena.models.device.pin_many_to_supervisor_release(
+            [device["id"] for device in devices], supervisor_release["raw_version"]
+        )
+        self.assertEqual(result["updated"], [devices[0]["id"]])
+        self.assertEqual(list(result["failed"]), [devices[1]["id"]])
+        device = self.balena.models.device.get(devices[0]["id"], {"$select": "should_be_managed_by__release"})
+        self.assertEqual(device["should_be_managed_by__release"], {"__id": supervisor_release["id"]})
+
+    def test_34_bulk(self):
+        device = self.balena.models.device.register(self.app["id"], self.balena.models.device.generate_uuid())
+
+        with self.assertRaises(self.helper.balena_exceptions.InvalidParameter):
+            self.balena.models.device.bulk("foo", [device["id"]])
+
+        with self.assertRaises(self.helper.balena_exceptions.InvalidParameter):
+            self.balena.models.device.bulk("purge", [device["id"]], force=True)
+
+        with self.assertRaises(self.helper.balena_exceptions.InvalidParameter):
+            self.balena.models.device.bulk("start_service", [device["id"]])
+
+        # should report every device on its own, without stopping at the ones that fail.
+        progress = []
+        results = list(
+            self.balena.models.device.bulk(
+                "ping", [device["id"], 99999999], progress=lambda done, total: progress.append((done, total))
+            )
+        )
+        self.assertEqual(sorted(result["target"] for result in results), [device["id"], 99999999])
+        self.assertEqual(progress[-1], (2, 2))
+        missing = next(result for result in results if result["target"] == 99999999)
+        self.assertIsInstance(missing["error"], self.helper.balena_exceptions.DeviceNotFound)
+
 
 if __name__ == "__main__":
     unittest.main()
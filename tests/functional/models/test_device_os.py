@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 
 from balena.hup import get_hup_action_type
@@ -164,6 +166,121 @@ class TestDevice(unittest.TestCase):
 
         self.balena.models.device.pin_to_os_release(uuid, "6.0.10")
 
+    def test_08_os_versions_cache(self):
+        # should fetch the versions of all the prefetched device types at once.
+        self.balena.models.os.clear_os_versions_cache()
+        self.balena.pine.clear_cache()
+        self.balena.pine.reset_transfer_stats()
+        self.balena.models.os.prefetch_os_versions(["raspberrypi3", "raspberrypi4-64"])
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 1)
+
+        # should serve them from the cache afterwards.
+        versions = self.balena.models.os.get_available_os_versions("raspberrypi3")
+        self.assertGreater(len(versions), 0)
+        self.balena.models.os.get_available_os_versions(["raspberrypi3", "raspberrypi4-64"])
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 1)
+
+        # should fetch them again once invalidated.
+        self.balena.models.os.clear_os_versions_cache("raspberrypi3")
+        self.balena.pine.clear_cache()
+        self.assertEqual(self.balena.models.os.get_available_os_versions("raspberrypi3"), versions)
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 2)
+
+    def test_09_plan_updates(self):
+        uuid = self.balena.models.device.generate_uuid()
+        device = self.balena.models.device.register(self.app["id"], uuid)
+        self.balena.pine.patch(
+            {
+                "resource": "device",
+                "id": device["id"],
+                "body": {"os_version": "balenaOS 2.83.21+rev1", "os_variant": "prod"},
+            }
+        )
+
+        # should plan the update of every device of the application.
+        plans = {plan["uuid"]: plan for plan in self.balena.models.os.plan_updates(self.app["id"])}
+        plan = plans[uuid]
+        self.assertEqual(plan["os_version"], "2.83.21+rev1.prod")
+
+        # should match the supported versions of the device.
+        supported = self.balena.models.os.get_supported_os_update_versions("raspberrypi3", "2.83.21+rev1.prod")
+        self.assertEqual(plan["versions"], supported["versions"])
+        self.assertIn(plan["recommended"], plan["versions"])
+
+    def test_10_download_to(self):
+        version = self.balena.models.os.get_max_satisfying_version("raspberrypi3", "latest")
+        progress = []
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "balena.img")
+
+            # should download the whole image in parallel segments.
+            self.assertEqual(
+                self.balena.models.os.download_to(
+                    path, "raspberrypi3", version, progress=lambda done, total: progress.append((done, total))
+                ),
+                path,
+            )
+            # the size is the one announced by the server, the download size is only an estimate.
+            size = os.path.getsize(path)
+            self.assertEqual(progress[-1], (size, size))
+            self.assertFalse(os.path.exists(f"{path}.part.json"))
+
+    def test_11_image_cache(self):
+        self.balena.models.os.clear_image_cache()
+
+        # should download the image once and serve it from the cache afterwards.
+        options = {"developmentMode": True}
+        path = self.balena.models.os.get_cached_image("raspberrypi3", "latest", options)
+        mtime = os.path.getmtime(path)
+        self.assertEqual(self.balena.models.os.get_cached_image("raspberrypi3", "latest", options), path)
+        self.assertEqual(os.path.getmtime(path), mtime)
+
+        # should map the cached image.
+        with self.balena.models.os.map_cached_image("raspberrypi3", "latest", options) as image:
+            self.assertEqual(len(image), os.path.getsize(path))
+
+        # should key the images by their configuration.
+        self.assertNotEqual(
+            self.balena.models.os.get_cached_image("raspberrypi3", "latest", {"developmentMode": False}), path
+        )
+        self.balena.models.os.clear_image_cache()
+        self.assertFalse(os.path.exists(path))
+
+    def test_12_rollout_os_update(self):
+        devices = [
+            self.balena.models.device.register(self.app["id"], self.balena.models.device.generate_uuid())
+            for _ in range(2)
+        ]
+        self.balena.pine.patch(
+            {
+                "resource": "device",
+                "id": devices[0]["id"],
+                "body": {"is_online": False, "os_version": "balenaOS 5.3.21"},
+            }
+        )
+
+        with self.assertRaises(self.helper.balena_exceptions.InvalidParameter):
+            self.balena.models.device.rollout_os_update([devices[0]["id"]], None)
+
+        with tempfile.TemporaryDirectory() as directory:
+            state_path = os.path.join(directory, "rollout.json")
+            # should reject the devices that can not be updated without starting any update.
+            state = self.balena.models.device.rollout_os_update(
+                [devices[0]["uuid"], devices[1]["id"], 99999999], "6.0.10", poll_interval=0, state_path=state_path
+            )
+            self.assertEqual(state["status"], "completed")
+            self.assertEqual(state["succeeded"], [])
+            self.assertEqual(state["failed"], {})
+            self.assertIn("device is offline", state["rejected"][devices[0]["uuid"]])
+            self.assertIn(devices[1]["uuid"], state["rejected"])
+            self.assertIn("99999999", state["rejected"])
+            self.assertTrue(os.path.exists(state_path))
+
+            # should refuse to resume the state of a rollout to another version.
+            with self.assertRaises(self.helper.balena_exceptions.OsUpdateError):
+                self.balena.models.device.rollout_os_update([], "6.0.11", state_path=state_path)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 
+from balena.models.device_type import DeviceTypeCatalog
 from tests.helper import TestHelper
 
 
@@ -46,6 +47,19 @@ class TestDeviceType(unittest.TestCase):
         with self.assertRaises(self.helper.balena_exceptions.InvalidDeviceType):
             self.balena.models.device_type.get("PYTHONSDK")
 
+        # should not match aliases, which only get resolves.
+        dt = next(
+            dt
+            for dt in self.balena.models.device_type.get_catalog().get_all()
+            if any(alias["is_referenced_by__alias"] != dt["slug"] for alias in dt["device_type_alias"])
+        )
+        alias = next(
+            a["is_referenced_by__alias"] for a in dt["device_type_alias"] if a["is_referenced_by__alias"] != dt["slug"]
+        )
+        self.assertEqual(self.balena.models.device_type.get(alias)["slug"], dt["slug"])
+        with self.assertRaises(self.helper.balena_exceptions.InvalidDeviceType):
+            self.balena.models.device_type.get_by_slug_or_name(alias)
+
     def test_get_name(self):
         # should get the display name for a known slug.
         self.assertEqual(
@@ -76,6 +90,110 @@ class TestDeviceType(unittest.TestCase):
         for dev_type in self.balena.models.device_type.get_all_supported():
             self.assertTrue(self.balena.models.device_type.get(dev_type["slug"]))
 
+    def test_transfer_stats(self):
+        # should receive the responses compressed and report both sizes.
+        self.balena.pine.clear_cache()
+        self.balena.pine.reset_transfer_stats()
+        self.balena.models.device_type.get_all()
+        stats = self.balena.pine.get_transfer_stats()
+        self.assertEqual(stats["requests"], 1)
+        self.assertGreater(stats["content_bytes_received"], 0)
+        self.assertLess(stats["wire_bytes_received"], stats["content_bytes_received"])
+
+    def test_resource_cache(self):
+        # should query the API on every lookup unless the persistent cache is enabled.
+        self.balena.models.device_type.refresh_catalog()
+        self.balena.models.device_type.get("raspberry-pi")
+        self.balena.pine.reset_transfer_stats()
+        self.balena.models.device_type.refresh_catalog()
+        self.balena.models.device_type.get("raspberry-pi")
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 1)
+
+        # should serve repeated device type queries from the persistent cache.
+        self.balena.settings.set("resource_cache_enabled", True)
+        self.addCleanup(self.balena.settings.remove, "resource_cache_enabled")
+        self.balena.models.device_type.refresh_catalog()
+        self.balena.models.device_type.get("raspberry-pi")
+        self.balena.models.device_type.refresh_catalog()
+        self.balena.pine.reset_transfer_stats()
+        dt = self.balena.models.device_type.get("raspberry-pi")
+        self.assertEqual(dt["slug"], "raspberry-pi")
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 0)
+
+        # should query the API again once the cache is cleared.
+        self.balena.pine.clear_cache()
+        self.balena.models.device_type.refresh_catalog()
+        self.balena.models.device_type.get("raspberry-pi")
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 1)
+
+    def test_catalog(self):
+        # should resolve device types by id, slug, alias and name without any request.
+        self.balena.models.device_type.refresh_catalog()
+        dt = self.balena.models.device_type.get_catalog().get("raspberry-pi")
+        self.balena.pine.reset_transfer_stats()
+        self.assertEqual(self.balena.models.device_type.get(dt["id"], {"$select": "slug"}), {"slug": "raspberry-pi"})
+        self.assertEqual(self.balena.models.device_type.get_slug_by_name(dt["name"]), "raspberry-pi")
+        dt = self.balena.models.device_type.get(
+            "raspberry-pi", {"$select": "slug", "$expand": {"is_of__cpu_architecture": {"$select": "slug"}}}
+        )
+        self.assertEqual(dt["is_of__cpu_architecture"][0]["slug"], "rpi")
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 0)
+
+        # should query the API for options the catalog can not serve.
+        self.balena.pine.clear_cache()
+        self.balena.models.device_type.get("raspberry-pi", {"$select": "slug", "$expand": "describes_device"})
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 1)
+
+    def test_compatibility(self):
+        # should check the architecture compatibility of device types without any request.
+        self.balena.models.device_type.get_catalog()
+        self.balena.pine.reset_transfer_stats()
+        self.assertTrue(self.balena.models.device_type.is_compatible_with("raspberrypi4-64", "raspberrypi3"))
+        self.assertTrue(self.balena.models.device_type.is_compatible_with("raspberrypi3", "raspberry-pi"))
+        self.assertFalse(self.balena.models.device_type.is_compatible_with("raspberry-pi", "raspberrypi3"))
+        self.assertFalse(self.balena.models.device_type.is_compatible_with("intel-nuc", "raspberrypi3"))
+        self.assertIn("raspberrypi4-64", self.balena.models.device_type.get_compatible_device_types("raspberry-pi"))
+        self.assertEqual(self.balena.pine.get_transfer_stats()["requests"], 0)
+
+
+class TestDeviceTypeCatalog(unittest.TestCase):
+    def setUp(self):
+        self.catalog = DeviceTypeCatalog(
+            [
+                {
+                    "id": 1,
+                    "slug": "raspberry-pi",
+                    "name": "Raspberry Pi (v1 / Zero / Zero W)",
+                    "is_of__cpu_architecture": [{"slug": "rpi"}],
+                    "device_type_alias": [
+                        {"is_referenced_by__alias": "raspberry-pi"},
+                        {"is_referenced_by__alias": "raspberrypi"},
+                    ],
+                },
+                {
+                    "id": 2,
+                    "slug": "raspberrypi3",
+                    "name": "Raspberry Pi 3",
+                    "is_of__cpu_architecture": [{"slug": "armv7hf"}],
+                    "device_type_alias": [{"is_referenced_by__alias": "raspberrypi3"}],
+                },
+            ]
+        )
+
+    def test_get(self):
+        # should resolve ids, slugs and aliases.
+        self.assertEqual(self.catalog.get(2)["slug"], "raspberrypi3")
+        self.assertEqual(self.catalog.get("raspberrypi3")["id"], 2)
+        self.assertEqual(self.catalog.get("raspberrypi")["id"], 1)
+        self.assertIsNone(self.catalog.get("Raspberry Pi 3"))
+        self.assertIsNone(self.catalog.get(3))
+
+    def test_get_by_slug_or_name(self):
+        # should only resolve slugs and names, like the API filter it stands in for.
+        self.assertEqual(self.catalog.get_by_slug_or_name("raspberry-pi")["id"], 1)
+        self.assertEqual(self.catalog.get_by_slug_or_name("Raspberry Pi 3")["id"], 2)
+        self.assertIsNone(self.catalog.get_by_slug_or_name("raspberrypi"))
+
 
 if __name__ == "__main__":
     unittest.main()
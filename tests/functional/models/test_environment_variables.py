@@ -150,6 +150,24 @@ class TestDeviceEnvironmentVariables(unittest.TestCase):
                 self.device_env_var.get(self.device[resource], f"EDITOR_BY_{resource}"),
             )
 
+    def test_07_can_get_and_remove_the_vars_of_many_devices(self):
+        other_device = self.balena.models.device.register(self.app["id"], self.balena.models.device.generate_uuid())
+        device_ids = [self.device["id"], other_device["id"]]
+        for device_id in device_ids:
+            self.device_env_var.set(device_id, "EDITOR", "vim")
+
+        device_vars = self.device_env_var.get_all_by_device(device_ids)
+        self.assertEqual(
+            sorted(entry["device"]["__id"] for entry in device_vars if entry["name"] == "EDITOR"), sorted(device_ids)
+        )
+
+        self.device_env_var.remove(device_ids, "EDITOR")
+        for device_id in device_ids:
+            self.assertIsNone(self.device_env_var.get(device_id, "EDITOR"))
+
+        with self.assertRaises(self.helper.balena_exceptions.InvalidParameter):
+            self.device_env_var.get_all_by_device([self.device["uuid"]])
+
 
 class TestDeviceServiceEnvironmentVariables(unittest.TestCase):
     @classmethod
@@ -0,0 +1,57 @@
+import json
+import sys
+import types
+import unittest
+from unittest.mock import patch
+
+from balena.codec import decode_body, decode_json, get_json_decoder, set_json_decoder
+
+
+class TestCodec(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(set_json_decoder, None)
+
+    def test_defaults_to_orjson_when_installed(self):
+        orjson = types.ModuleType("orjson")
+        orjson.loads = lambda data: {"decoded_by": "orjson"}  # type: ignore[attr-defined]
+        with patch.dict(sys.modules, {"orjson": orjson}):
+            set_json_decoder(None)
+        self.assertIs(get_json_decoder(), orjson.loads)  # type: ignore[attr-defined]
+        self.assertEqual(decode_json(b"{}"), {"decoded_by": "orjson"})
+
+    def test_falls_back_to_json(self):
+        # a None entry makes the import fail, as if orjson was not installed
+        with patch.dict(sys.modules, {"orjson": None}):
+            set_json_decoder(None)
+        self.assertIs(get_json_decoder(), json.loads)
+        self.assertEqual(decode_json(b'{"id": 1}'), {"id": 1})
+        self.assertEqual(decode_json('{"id": 1}'), {"id": 1})
+
+    def test_set_json_decoder(self):
+        decoded = []
+
+        def decoder(data):
+            decoded.append(data)
+            return json.loads(data)
+
+        set_json_decoder(decoder)
+        self.assertIs(get_json_decoder(), decoder)
+        self.assertEqual(decode_json(b"[1]"), [1])
+        self.assertEqual(decode_body(b'{"d": []}'), {"d": []})
+        self.assertEqual(decoded, [b"[1]", b'{"d": []}'])
+
+        # None restores the default decoder
+        with patch.dict(sys.modules, {"orjson": None}):
+            set_json_decoder(None)
+        self.assertIs(get_json_decoder(), json.loads)
+
+    def test_decode_body(self):
+        self.assertEqual(decode_body(b'{"d": [{"id": 1}]}'), {"d": [{"id": 1}]})
+        # bodies that are not JSON are returned as text
+        self.assertEqual(decode_body(b"OK"), "OK")
+        self.assertEqual(decode_body("café".encode()), "café")
+        self.assertEqual(decode_body(b""), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+
+from balena import exceptions
+from balena.balena_auth import request
+from balena.download import RangedDownload
+from balena.models.os import DeviceOs
+from balena.pine import PineClient
+from balena.settings import Settings
+
+IMAGE = bytes(range(256)) * 4096
+# small enough for the image to be split in several segments, and to persist the progress of each chunk
+DOWNLOAD_LIMITS = {
+    "MIN_SEGMENT_SIZE": 64 * 1024,
+    "CHUNK_SIZE": 16 * 1024,
+    "STATE_SAVE_INTERVAL": 16 * 1024,
+    "MAX_RETRY_DELAY": 0,
+}
+DEVICE_TYPE = {
+    "id": 1,
+    "slug": "raspberrypi3",
+    "name": "Raspberry Pi 3",
+    "device_type_alias": [{"is_referenced_by__alias": "raspberrypi3"}],
+    "is_of__cpu_architecture": [{"id": 1, "slug": "armv7hf"}],
+    "is_default_for__application": [],
+}
+
+
+class Interrupted(Exception):
+    pass
+
+
+class DownloadStandIn(BaseHTTPRequestHandler):
+    """
+    Local stand-in of the image download endpoint. Range requests are only honored on /ranged and /download,
+    and /truncated announces a longer image than it sends.
+    The API /download endpoint drops the connection of, or cuts short, the next segment requests while there are
+    `faults` left.
+    """
+
+    protocol_version = "HTTP/1.1"
+    attempts = {}
+    served_ranges = []
+    faults = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/v7/device_type"):
+            content = json.dumps({"d": [DEVICE_TYPE]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+
+        match = re.match(r"^bytes=(\d+)-(\d+)$", self.headers.get("Range", ""))
+        endpoint = self.path.split("?")[0]
+        if endpoint in ("/ranged", "/download") and match is not None:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(IMAGE) - 1)
+            DownloadStandIn.attempts[start] = DownloadStandIn.attempts.get(start, 0) + 1
+            fault = DownloadStandIn.faults.pop(0) if endpoint == "/download" and start > 0 and self.faults else None
+            if fault == "drop":
+                self.close_connection = True
+                return
+
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(IMAGE)}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            if fault == "cut":
+                end = start + (end - start) // 2
+                self.close_connection = True
+            DownloadStandIn.served_ranges.append((start, end))
+            self.wfile.write(IMAGE[start : end + 1])  # noqa: E203
+            return
+
+        self.send_response(200)
+        if self.path == "/truncated":
+            self.send_header("Content-Length", str(len(IMAGE)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(IMAGE[:1000])
+            return
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.write(f"{len(IMAGE):x}\r\n".encode() + IMAGE + b"\r\n0\r\n\r\n")
+
+
+class StandInServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # the clients interrupted on purpose reset their connections
+        pass
+
+
+class TestRangedDownload(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandInServer(("127.0.0.1", 0), DownloadStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "balena.img")
+        patcher = patch.multiple("balena.download", **DOWNLOAD_LIMITS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        DownloadStandIn.attempts.clear()
+        DownloadStandIn.served_ranges.clear()
+        DownloadStandIn.faults.clear()
+
+    def __download(self, endpoint, progress=None, **options):
+        def open_stream(byte_range):
+            return requests.get(
+                f"http://127.0.0.1:{self.server.server_address[1]}/{endpoint}",
+                headers={"Range": f"bytes={byte_range[0]}-{byte_range[1]}"},
+                stream=True,
+            )
+
+        reported = []
+
+        def report(done, total):
+            reported.append((done, total))
+            if progress is not None:
+                progress(done, total)
+
+        size = RangedDownload(open_stream, self.path, endpoint, progress=report, **options).run()
+        return size, reported
+
+    def test_verifies_the_size_announced_by_the_server(self):
+        # a wrong estimate does not fail a complete image
+        size, progress = self.__download("ranged", estimated_size=len(IMAGE) + 4096)
+        self.assertEqual(size, len(IMAGE))
+        self.assertEqual(progress[-1], (len(IMAGE), len(IMAGE)))
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), IMAGE)
+        # the probe and one request for each of the segments
+        self.assertEqual(sorted(DownloadStandIn.attempts), [0, 262144, 524288, 786432])
+
+    def test_reports_the_estimate_when_the_size_is_not_announced(self):
+        size, progress = self.__download("sequential", estimated_size=len(IMAGE) - 4096)
+        self.assertEqual(size, len(IMAGE))
+        self.assertEqual(progress[-1], (len(IMAGE), len(IMAGE) - 4096))
+
+    def test_rejects_truncated_images(self):
+        with self.assertRaises((exceptions.OsDownloadError, requests.RequestException)):
+            self.__download("truncated")
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_resumes_interrupted_downloads(self):
+        def interrupt(done, total):
+            if done >= len(IMAGE) // 2:
+                raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            self.__download("ranged", progress=interrupt)
+        self.assertFalse(os.path.exists(self.path))
+        with open(f"{self.path}.part.json") as f:
+            ranges = json.load(f)["ranges"]
+        saved = sum(next_byte - start for start, _, next_byte in ranges)
+        self.assertGreater(saved, 0)
+        self.assertLess(saved, len(IMAGE))
+
+        # the saved progress is resumed without probing again, and no saved byte is downloaded again
+        DownloadStandIn.served_ranges.clear()
+        size, progress = self.__download("ranged")
+        self.assertEqual(size, len(IMAGE))
+        self.assertEqual(progress[-1], (len(IMAGE), len(IMAGE)))
+        self.assertNotIn((0, 0), DownloadStandIn.served_ranges)
+        self.assertEqual(sum(end - start + 1 for start, end in DownloadStandIn.served_ranges), len(IMAGE) - saved)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), IMAGE)
+        self.assertFalse(os.path.exists(f"{self.path}.part.json"))
+
+    def test_retries_the_network_errors_of_api_downloads(self):
+        settings = Settings({"data_directory": False})
+        settings.set("api_endpoint", f"http://127.0.0.1:{self.server.server_address[1]}/")
+        settings.set("token", "stand-in-token")
+
+        # network errors are not reported as authentication errors
+        with self.assertRaises(requests.ConnectionError):
+            request("GET", "/download", settings, endpoint="http://127.0.0.1:1/", return_raw=True)
+
+        DownloadStandIn.faults.extend(["drop", "cut", "drop", "cut"])
+        device_os = DeviceOs(PineClient(settings, "test"), settings)
+        self.assertEqual(device_os.download_to(self.path, "raspberrypi3", "2.88.4"), self.path)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), IMAGE)
+        # the dropped and cut short segments were resumed from where they stopped
+        self.assertEqual(DownloadStandIn.faults, [])
+        self.assertEqual(sum(end - start + 1 for start, end in DownloadStandIn.served_ranges), len(IMAGE) + 1)
+
+    def test_caches_images_by_file_type(self):
+        settings = Settings({"data_directory": False})
+        settings.set("api_endpoint", f"http://127.0.0.1:{self.server.server_address[1]}/")
+        settings.set("token", "stand-in-token")
+        settings.set("cache_directory", os.path.dirname(self.path))
+        device_os = DeviceOs(PineClient(settings, "test"), settings)
+
+        zip_path = device_os.get_cached_image("raspberrypi3", "2.88.4", {"fileType": ".zip"})
+        img_path = device_os.get_cached_image("raspberrypi3", "2.88.4")
+        self.assertTrue(zip_path.endswith(".zip"))
+        self.assertTrue(img_path.endswith(".img"))
+        self.assertEqual(device_os.get_cached_image("raspberrypi3", "2.88.4", {"fileType": ".zip"}), zip_path)
+        with open(zip_path, "rb") as f:
+            self.assertEqual(f.read(), IMAGE)
+
+        with self.assertRaises(exceptions.InvalidParameter):
+            device_os.get_cached_image("raspberrypi3", "2.88.4", {"fileType": ".tar"})  # type: ignore[typeddict-item]
+
+        device_os.clear_image_cache()
+        self.assertFalse(os.path.exists(zip_path))
+        self.assertFalse(os.path.exists(img_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
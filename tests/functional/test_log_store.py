@@ -0,0 +1,221 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from balena.log_store import LogStore
+from balena.logs import Logs
+from balena.pine import PineClient
+from balena.settings import Settings
+
+UUID = "a" * 32
+OTHER_UUID = "b" * 32
+
+
+def make_log(created_at, message, service_id=1, is_std_err=False, is_system=False):
+    return {
+        "message": message,
+        "createdAt": created_at,
+        "timestamp": created_at - 500 if created_at is not None else 1000,
+        "isStdErr": is_std_err,
+        "isSystem": is_system,
+        "serviceId": service_id,
+    }
+
+
+LOGS = [
+    make_log(2000, "starting", is_system=True, service_id=None),
+    make_log(3000, "listening on port 80"),
+    make_log(4000, "error: connection refused", is_std_err=True),
+    make_log(5000, "error: timeout", service_id=12, is_std_err=True),
+    make_log(None, "line without a creation time"),
+]
+
+
+class LogsHistoryStandIn(BaseHTTPRequestHandler):
+    """
+    Local stand-in of the device and logs history endpoints, the history honors the `start` of the request.
+    """
+
+    protocol_version = "HTTP/1.1"
+    logs = []
+    queries = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/v7/device"):
+            result = {"d": [{"id": 1, "uuid": UUID, "belongs_to__application": {"__id": 1}}]}
+        else:
+            query = parse_qs(url.query)
+            LogsHistoryStandIn.queries.append(query)
+            start = int(query["start"][0]) if "start" in query else None
+            result = [log for log in self.logs if start is None or (log["createdAt"] or 0) >= start]
+
+        content = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class TestLogStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), LogsHistoryStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.store = LogStore(":memory:")
+        self.addCleanup(self.store.close)
+
+    def test_add_ignores_stored_lines(self):
+        self.assertEqual(self.store.add(UUID, iter(LOGS)), len(LOGS))
+        # including the lines without a creation time
+        self.assertEqual(self.store.add(UUID, iter(LOGS)), 0)
+        self.assertEqual(self.store.add(UUID, [make_log(5000, "logged in the same millisecond")]), 1)
+        self.assertEqual(self.store.add(OTHER_UUID, LOGS[:1]), 1)
+
+        for log in LOGS:
+            self.store.append(log, UUID)
+        self.store.append({**LOGS[0], "uuid": OTHER_UUID})
+        self.store.flush()
+        self.assertEqual(len(self.store.query(uuid=UUID)), len(LOGS) + 1)
+        self.assertEqual(len(self.store.query(uuid=OTHER_UUID)), 1)
+
+    def test_tracks_the_last_stored_line_of_each_device(self):
+        self.assertIsNone(self.store.get_last_created_at(UUID))
+        self.store.add(UUID, LOGS)
+        self.assertEqual(self.store.get_last_created_at(UUID), 5000)
+
+        # older lines never move the last stored line back
+        self.store.add(UUID, [make_log(1000, "late line")])
+        self.store.append(make_log(1500, "late line"), UUID)
+        self.assertEqual(self.store.get_last_created_at(UUID), 5000)
+
+        self.store.append(make_log(6000, "new line"), UUID)
+        self.assertEqual(self.store.get_last_created_at(UUID), 6000)
+        self.assertIsNone(self.store.get_last_created_at(OTHER_UUID))
+
+    def test_query(self):
+        self.store.add(UUID, LOGS)
+        self.store.add(OTHER_UUID, [make_log(3500, "error: other device", is_std_err=True)])
+
+        def messages(**filters):
+            return [log["message"] for log in self.store.query(**filters)]
+
+        self.assertEqual(
+            messages(uuid=UUID),
+            [
+                "line without a creation time",
+                "starting",
+                "listening on port 80",
+                "error: connection refused",
+                "error: timeout",
+            ],
+        )
+        self.assertEqual(
+            messages(is_std_err=True), ["error: other device", "error: connection refused", "error: timeout"]
+        )
+        self.assertEqual(messages(uuid=UUID, contains="error"), ["error: connection refused", "error: timeout"])
+        self.assertEqual(messages(service_id=12), ["error: timeout"])
+        self.assertEqual(messages(is_system=True), ["starting"])
+        self.assertEqual(
+            messages(
+                from_date=datetime.fromtimestamp(2.5, timezone.utc), to_date=datetime.fromtimestamp(3.5, timezone.utc)
+            ),
+            ["listening on port 80", "error: other device", "error: connection refused"],
+        )
+        # naive dates are taken as UTC
+        self.assertEqual(messages(to_date=datetime(1970, 1, 1, 0, 0, 2)), ["line without a creation time", "starting"])
+        self.assertEqual(messages(uuid=UUID, limit=2), ["line without a creation time", "starting"])
+        self.assertEqual(
+            self.store.query(uuid=UUID, service_id=12)[0],
+            {
+                "uuid": UUID,
+                "createdAt": 5000,
+                "timestamp": 4500,
+                "serviceId": 12,
+                "isStdErr": True,
+                "isSystem": False,
+                "message": "error: timeout",
+            },
+        )
+
+    def test_append_commits_the_last_batch(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "logs.db")
+
+        with patch("balena.log_store.APPEND_COMMIT_INTERVAL", 0.05):
+            store = LogStore(path)
+            self.addCleanup(store.close)
+            store.append(LOGS[0], UUID)
+
+            connection = sqlite3.connect(path)
+            self.addCleanup(connection.close)
+            deadline = time.monotonic() + 5
+            while connection.execute("SELECT count(*) FROM log").fetchone()[0] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(connection.execute("SELECT count(*) FROM log").fetchone()[0], 1)
+
+    def test_drops_the_lines_stored_again_by_previous_versions(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "logs.db")
+
+        connection = sqlite3.connect(path)
+        connection.executescript("""
+            CREATE TABLE log (uuid TEXT NOT NULL, created_at INTEGER, timestamp INTEGER, service_id INTEGER,
+                is_std_err INTEGER, is_system INTEGER, message TEXT);
+            CREATE UNIQUE INDEX log_unique ON log (
+                uuid, created_at, timestamp, ifnull(service_id, -1), is_std_err, message);
+            """)
+        for _ in range(3):
+            connection.execute("INSERT INTO log VALUES (?, NULL, 1000, 1, 0, 0, 'no creation time')", (UUID,))
+        connection.commit()
+        connection.close()
+
+        store = LogStore(path)
+        self.addCleanup(store.close)
+        self.assertEqual(len(store.query(uuid=UUID)), 1)
+        self.assertEqual(store.add(UUID, [make_log(None, "no creation time")]), 0)
+
+    def test_sync_history_only_fetches_new_lines(self):
+        settings = Settings({"data_directory": False})
+        settings.set("api_endpoint", f"http://127.0.0.1:{self.server.server_address[1]}/")
+        settings.set("token", "stand-in-token")
+        logs = Logs(PineClient(settings, "test"), settings)
+        LogsHistoryStandIn.logs = LOGS[:4]
+        LogsHistoryStandIn.queries.clear()
+
+        self.assertEqual(logs.sync_history(self.store, UUID), 4)
+        LogsHistoryStandIn.logs = LOGS[:4] + [make_log(5000, "logged in the same millisecond"), make_log(6000, "new")]
+        self.assertEqual(logs.sync_history(self.store, UUID), 2)
+        self.assertEqual(logs.sync_history(self.store, UUID), 0)
+
+        self.assertEqual(
+            LogsHistoryStandIn.queries,
+            [{"count": ["all"]}, {"count": ["all"], "start": ["5000"]}, {"count": ["all"], "start": ["6000"]}],
+        )
+        self.assertEqual(self.store.get_last_created_at(UUID), 6000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from twisted.internet import reactor
+
+from balena import exceptions
+from balena.logs import RESUME_BACKLOG_COUNT, Subscription
+from balena.settings import Settings
+
+UUID = "f" * 32
+
+
+def make_log(created_at, message):
+    return {
+        "message": message,
+        "createdAt": created_at,
+        "timestamp": created_at,
+        "isStdErr": False,
+        "isSystem": False,
+        "serviceId": 1,
+    }
+
+
+# lines 5 and 6 are logged in the same millisecond
+LOGS = [make_log(1000 + i, f"line {i}") for i in range(1, 6)] + [make_log(1005, "line 6")]
+LOGS += [make_log(1000 + i, f"line {i}") for i in range(7, 10)]
+
+
+class LogStreamStandIn(BaseHTTPRequestHandler):
+    """
+    Local stand-in of the device logs stream. The first connection sends the first lines and drops, the second
+    one fails with a 503, and the third one replays a backlog overlapping the lines already sent before
+    streaming the next ones, and stays open until `closed` is set.
+    """
+
+    requests = []
+    closed = threading.Event()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        LogStreamStandIn.requests.append((self.path.split("?")[1], time.monotonic()))
+        attempt = len(self.requests)
+        if attempt == 2:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        lines = LOGS[:5] if attempt == 1 else LOGS[2:]
+        for log in lines:
+            self.wfile.write(json.dumps(log).encode() + b"\n")
+            self.wfile.flush()
+        if attempt > 1:
+            self.closed.wait(10)
+
+
+class TestLogStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), LogStreamStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        LogStreamStandIn.closed.set()
+        reactor.callFromThread(reactor.stop)  # type: ignore
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_resumes_dropped_streams_without_duplicates_or_gaps(self):
+        settings = Settings({"data_directory": False})
+        settings.set("api_endpoint", f"http://127.0.0.1:{self.server.server_address[1]}/")
+        settings.set("token", "stand-in-token")
+
+        logs = []
+        errors = []
+        with patch("balena.logs.MIN_RECONNECT_DELAY", 0.05):
+            subscription = Subscription(settings)
+            stream = subscription.add(UUID, logs.append, errors.append)
+
+            deadline = time.monotonic() + 10
+            while len(logs) < len(LOGS) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            subscription.stop(stream)
+
+        self.assertEqual(logs, LOGS)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], exceptions.RequestError)
+        self.assertEqual(errors[0].status_code, 503)
+
+        # the stream resumes with a backlog once lines were seen, after a longer delay for every failed attempt
+        queries = [query for query, _ in LogStreamStandIn.requests]
+        self.assertEqual(queries, ["stream=1", *[f"stream=1&count={RESUME_BACKLOG_COUNT}"] * 2])
+        self.assertGreaterEqual(LogStreamStandIn.requests[2][1] - LogStreamStandIn.requests[1][1], 0.05)
+
+        metrics = stream.get_metrics()
+        self.assertEqual(metrics["reconnects"], 2)
+        self.assertEqual(metrics["lines"], len(LOGS))
+        # lines 3 to 5 are replayed by the backlog
+        self.assertEqual(metrics["duplicates"], 3)
+        self.assertGreater(metrics["last_gap"], 0)
+        self.assertEqual(metrics["total_gap"], metrics["last_gap"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,17 @@
+import gzip
+import json
+import os
+import random
+import tempfile
 import unittest
 from typing import List, Any
 
 from balena.balena_auth import request
+from balena.log_store import LogStore
+from balena.logs import LogLineFilter, iter_json_array
 from tests.helper import TestHelper
 import time
 
-
 # Logs may sometimes take time to appear in the logs history.
 #
 # To handle this, the approach uses a more complex setup for detecting the initial burst of logs:
@@ -174,3 +180,189 @@ class TestAuth(unittest.TestCase):
         )
 
         self.assertEqual(results, [])
+
+    def test_07_subscribe_application_should_stream_tagged_logs(self):
+        results = []
+
+        def cb(data):
+            results.append((data["uuid"], data["message"]))
+
+        self.balena.logs.subscribe_application(self.app["id"], cb)
+        time.sleep(WAIT_AFTER_SUBSCRIBE_TIMEOUT_S)
+
+        send_log_messages(
+            self.uuid,
+            self.device_api_key,
+            [
+                {"message": "11 message", "timestamp": int(time.time() * 1000)},
+                {"message": "12 message", "timestamp": int(time.time() * 1000)},
+            ],
+            self.balena.settings,
+        )
+
+        time.sleep(WAIT_FOR_LOGS_TIMEOUT_S)
+        self.assertEqual(results, [(self.uuid, "11 message"), (self.uuid, "12 message")])
+
+        self.balena.logs.unsubscribe_application(self.app["id"])
+
+    def test_08_should_report_stream_metrics(self):
+        self.balena.logs.subscribe(self.uuid, lambda data: None)
+        time.sleep(WAIT_AFTER_SUBSCRIBE_TIMEOUT_S)
+
+        metrics = [m for m in self.balena.logs.get_stream_metrics() if m["uuid"] == self.uuid]
+        self.assertEqual(len(metrics), 1)
+        self.assertTrue(metrics[0]["connected"])
+        self.assertEqual(metrics[0]["reconnects"], 0)
+
+        self.balena.logs.unsubscribe(self.uuid)
+        self.assertEqual([m for m in self.balena.logs.get_stream_metrics() if m["uuid"] == self.uuid], [])
+
+    def test_09_iter_history_should_match_history(self):
+        self.assertEqual(
+            list(self.balena.logs.iter_history(self.uuid, count="all")),
+            self.balena.logs.history(self.uuid, count="all"),
+        )
+
+    def test_10_export_history_should_write_ndjson(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = self.balena.logs.export_history(
+                self.uuid, os.path.join(tmp, "logs.ndjson.gz"), "all", compress=True
+            )
+            exported = [json.loads(line) for path in paths for line in gzip.open(path)]
+
+        self.assertEqual(exported, self.balena.logs.history(self.uuid, count="all"))
+
+    def test_11_sync_history_should_only_store_new_lines(self):
+        store = LogStore(":memory:")
+        history = self.balena.logs.history(self.uuid, count="all")
+
+        self.assertEqual(self.balena.logs.sync_history(store, self.uuid), len(history))
+        self.assertEqual(self.balena.logs.sync_history(store, self.uuid), 0)
+        self.assertEqual(
+            [log["message"] for log in store.query(uuid=self.uuid, contains="1 message")],
+            [log["message"] for log in history if "1 message" in log["message"]],
+        )
+        store.close()
+
+    def test_12_history_should_apply_filters(self):
+        history = self.balena.logs.history(self.uuid, count="all")
+
+        self.assertEqual(
+            self.balena.logs.history(self.uuid, count="all", filters={"message": "^1 "}),
+            [log for log in history if log["message"].startswith("1 ")],
+        )
+        self.assertEqual(
+            list(self.balena.logs.iter_history(self.uuid, count="all", filters={"is_std_err": True})),
+            [log for log in history if log["isStdErr"]],
+        )
+
+
+class TestIterJsonArray(unittest.TestCase):
+    def test_should_decode_items_split_across_chunks(self):
+        document = b'[1234, -5.5e3, true, null, "a\\u00e9 b", {"message": "12, 34"}, [1, [2]], "\xc3\xa9"]'
+        expected = json.loads(document)
+
+        # every way of splitting the document in two, and in single bytes
+        for split in range(len(document) + 1):
+            with self.subTest(split=split):
+                self.assertEqual(list(iter_json_array([document[:split], document[split:]])), expected)
+        byte_chunks = [document[i : i + 1] for i in range(len(document))]  # noqa: E203
+        self.assertEqual(list(iter_json_array(byte_chunks)), expected)
+
+        self.assertEqual(list(iter_json_array([b"[12", b"34, 5]"])), [1234, 5])
+        self.assertEqual(list(iter_json_array([b"[12 ", b" ", b"]"])), [12])
+        self.assertEqual(list(iter_json_array([b" [", b"]"])), [])
+
+    def test_should_reject_invalid_arrays(self):
+        for chunks in ([b"[12", b"34"], [b"[1 2]"], [b"{}"], [b"[1,"]):
+            with self.subTest(chunks=chunks):
+                with self.assertRaises(ValueError):
+                    list(iter_json_array(chunks))
+
+
+class TestLogLineFilter(unittest.TestCase):
+    def __make_log(self, **fields):
+        return {
+            "message": "Started service",
+            "createdAt": 1700000000000,
+            "timestamp": 1700000000000,
+            "isStdErr": False,
+            "isSystem": False,
+            "serviceId": 1,
+            **fields,
+        }
+
+    def __assert_lines(self, line_filter, log, kept, check_rejection=True):
+        # the API encodes lines compactly, other encodings must never be rejected either
+        for line in (
+            json.dumps(log, separators=(",", ":")).encode(),
+            json.dumps(log).encode(),
+            json.dumps(log, ensure_ascii=False).encode(),
+        ):
+            with self.subTest(line=line):
+                self.assertEqual(line_filter.matches(log), kept)
+                if kept:
+                    self.assertTrue(line_filter.precheck(line))
+                elif check_rejection and b": " not in line:
+                    # the lines that do not match are rejected before decoding, unless spaced out
+                    self.assertFalse(line_filter.precheck(line))
+
+    def test_precheck_flags(self):
+        self.__assert_lines(LogLineFilter(is_system=True), self.__make_log(isSystem=True), True)
+        self.__assert_lines(LogLineFilter(is_system=True), self.__make_log(isSystem=False), False)
+        self.__assert_lines(LogLineFilter(is_system=False), self.__make_log(isSystem=True), False)
+        self.__assert_lines(LogLineFilter(is_std_err=True), self.__make_log(isStdErr=True), True)
+        self.__assert_lines(LogLineFilter(is_std_err=False), self.__make_log(isStdErr=True), False)
+        self.__assert_lines(LogLineFilter(is_system=True, is_std_err=False), self.__make_log(isSystem=True), True)
+
+        # the flags quoted in the message are escaped, so they never look like the actual keys
+        log = self.__make_log(isSystem=True, message='"isSystem":false "isStdErr":true')
+        self.__assert_lines(LogLineFilter(is_system=True, is_std_err=False), log, True)
+
+    def test_precheck_service_ids(self):
+        self.__assert_lines(LogLineFilter(service_ids={1}), self.__make_log(serviceId=1), True)
+        self.__assert_lines(LogLineFilter(service_ids={1}), self.__make_log(serviceId=12), False)
+        self.__assert_lines(LogLineFilter(service_ids={12}), self.__make_log(serviceId=1), False)
+        self.__assert_lines(LogLineFilter(service_ids={12}), self.__make_log(serviceId=123), False)
+        self.__assert_lines(LogLineFilter(service_ids={12, 123}), self.__make_log(serviceId=123), True)
+        self.__assert_lines(LogLineFilter(service_ids={None}), self.__make_log(serviceId=None), True)
+        self.__assert_lines(LogLineFilter(service_ids={1}), self.__make_log(serviceId=None), False)
+        self.__assert_lines(LogLineFilter(service_ids={1}), self.__make_log(message='"serviceId":12'), True)
+
+    def test_precheck_message(self):
+        self.__assert_lines(LogLineFilter(message="Started"), self.__make_log(), True)
+        self.__assert_lines(LogLineFilter(message="Stopped"), self.__make_log(), False)
+        # text that encoders may escape is only checked once decoded
+        for message, pattern in [
+            ('say "hi"', 'say "hi"'),
+            ("C:\\temp", "C:"),
+            ("C:\\temp", r"\\temp"),
+            ("a/b", "a/b"),
+            ("<b>", "<b>"),
+            ("caf\u00e9", "café"),
+            ("tab\there", "tab\there"),
+            ("Started", "(?i)started"),
+            ("Started", "START"),
+        ]:
+            with self.subTest(message=message, pattern=pattern):
+                line_filter = LogLineFilter(message=pattern)
+                log = self.__make_log(message=message)
+                self.__assert_lines(line_filter, log, line_filter.matches(log), check_rejection=False)
+
+    def test_precheck_never_rejects_matching_lines(self):
+        rng = random.Random(0)
+        words = ["error", "Error", "12", "1", '"serviceId":1', '"isSystem":true', "caf\u00e9", "a/b", "x\\y"]
+        for _ in range(500):
+            log = self.__make_log(
+                message=" ".join(rng.sample(words, 3)),
+                isSystem=rng.choice([True, False]),
+                isStdErr=rng.choice([True, False]),
+                serviceId=rng.choice([None, 1, 12, 123]),
+            )
+            line_filter = LogLineFilter(
+                rng.choice([None, {1}, {12}, {None, 123}]),
+                rng.choice([None, True, False]),
+                rng.choice([None, True, False]),
+                rng.choice([None, "error", "Error", "12", "a/b", "caf\\u00e9", "x\\\\y", '"isSystem":true']),
+            )
+            self.__assert_lines(line_filter, log, line_filter.matches(log), check_rejection=False)
@@ -0,0 +1,176 @@
+import json
+import re
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from balena import exceptions
+from balena.pine import PineClient
+from balena.settings import Settings
+
+TOKEN = "stand-in-token"
+
+
+class BatchStandIn(BaseHTTPRequestHandler):
+    """
+    Local stand-in of an OData service that only answers $batch requests, keeping device tags in memory.
+    A device tag is unique by device and tag key.
+    """
+
+    tags = {}
+    batch_sizes = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != "/v7/$batch":
+            return self.__reply(404, "text/plain", b"Not found")
+        if self.headers.get("Authorization") != f"Bearer {TOKEN}":
+            return self.__reply(401, "text/plain", b"Unauthorized")
+
+        request_boundary = re.search(r"boundary=([^;]+)", self.headers["Content-Type"]).group(1)
+        content = self.rfile.read(int(self.headers["Content-Length"]))
+        parts = content.split(f"--{request_boundary}".encode())[1:-1]
+        BatchStandIn.batch_sizes.append(len(parts))
+
+        response = b""
+        # answered in reverse order, the Content-ID identifies the operations
+        for part in reversed(parts):
+            part_headers, _, http_request = part.strip(b"\r\n").partition(b"\r\n\r\n")
+            content_id = re.search(rb"Content-ID: (\S+)", part_headers).group(1).decode()
+            head, _, body = http_request.partition(b"\r\n\r\n")
+            method, url, _ = head.split(b"\r\n")[0].decode().split(" ")
+            status, result = self.__run(method, unquote(url), json.loads(body) if body.strip() else None)
+            response += (
+                f"--batchresponse\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} Status\r\nContent-Type: application/json\r\n\r\n{json.dumps(result)}\r\n"
+            ).encode()
+        response += b"--batchresponse--\r\n"
+        self.__reply(200, "multipart/mixed; boundary=batchresponse", response)
+
+    def __reply(self, status, content_type, content):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __run(self, method, url, body):
+        match = re.match(r"^/v7/device_tag(?:\((\d+)\))?(?:\?\$filter=(.*))?$", url)
+        if match is None:
+            return 404, "Not found"
+
+        tag_id, dollar_filter = match.groups()
+        if dollar_filter is not None:
+            conditions = dict(re.findall(r"(\w+) eq '?([^' )]+)'?", dollar_filter))
+            matches = [tag for tag in self.tags.values() if all(str(tag[k]) == v for k, v in conditions.items())]
+        else:
+            matches = [self.tags[int(tag_id)]] if tag_id is not None and int(tag_id) in self.tags else []
+
+        if method == "GET":
+            return 200, {"d": matches}
+        if method == "POST":
+            if any(tag["device"] == body["device"] and tag["tag_key"] == body["tag_key"] for tag in self.tags.values()):
+                return 409, '"device" and "tag_key" must be unique.'
+            tag = {"id": len(self.tags) + 1, **body}
+            self.tags[tag["id"]] = tag
+            return 201, tag
+        if not matches:
+            return 404, "Not found"
+        for tag in matches:
+            if method == "PATCH":
+                tag.update(body)
+            else:
+                del self.tags[tag["id"]]
+        return 200, "OK"
+
+
+class TestPineBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), BatchStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+        cls.settings = Settings({"data_directory": False})
+        cls.settings.set("api_endpoint", f"http://127.0.0.1:{cls.server.server_address[1]}/")
+        cls.settings.set("token", TOKEN)
+        cls.pine = PineClient(cls.settings, "test")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        BatchStandIn.tags.clear()
+        BatchStandIn.batch_sizes.clear()
+
+    def test_01_resolves_the_operations_in_few_requests(self):
+        with self.pine.batch(max_size=4) as batch:
+            created = [
+                batch.post({"resource": "device_tag", "body": {"device": device, "tag_key": "fleet", "value": "a"}})
+                for device in range(1, 6)
+            ]
+            missing = batch.get({"resource": "device_tag", "id": 99})
+            self.assertFalse(created[0].done())
+
+        self.assertEqual(BatchStandIn.batch_sizes, [4, 2])
+        self.assertEqual([future.result()["device"] for future in created], [1, 2, 3, 4, 5])
+        self.assertIsNone(missing.result())
+
+        with self.pine.batch() as batch:
+            tag = batch.get({"resource": "device_tag", "id": created[0].result()["id"]})
+            tags = batch.get({"resource": "device_tag", "options": {"$filter": {"tag_key": "fleet", "device": 3}}})
+            removed = batch.delete({"resource": "device_tag", "id": created[1].result()["id"]})
+            failed = batch.delete({"resource": "device_tag", "id": 99})
+
+        self.assertEqual(tag.result()["device"], 1)
+        self.assertEqual([tag["device"] for tag in tags.result()], [3])
+        self.assertEqual(removed.result(), "OK")
+        with self.assertRaises(exceptions.RequestError) as context:
+            failed.result()
+        self.assertEqual(context.exception.status_code, 404)
+        self.assertEqual(BatchStandIn.batch_sizes, [4, 2, 4])
+
+    def test_02_upserts(self):
+        with self.pine.batch() as batch:
+            batch.post({"resource": "device_tag", "body": {"device": 1, "tag_key": "fleet", "value": "a"}})
+
+        with self.pine.batch() as batch:
+            upserts = [
+                batch.upsert(
+                    {"resource": "device_tag", "id": {"device": device, "tag_key": "fleet"}, "body": {"value": "b"}}
+                )
+                for device in (1, 2)
+            ]
+
+        # the existing tag is patched in a follow-up batch
+        self.assertEqual(BatchStandIn.batch_sizes, [1, 2, 1])
+        self.assertEqual(upserts[0].result(), "OK")
+        self.assertEqual(upserts[1].result()["value"], "b")
+        self.assertEqual(sorted(tag["value"] for tag in BatchStandIn.tags.values()), ["b", "b"])
+
+    def test_03_fails_the_operations_of_a_rejected_batch(self):
+        settings = Settings({"data_directory": False})
+        settings.set("api_endpoint", self.settings.get("api_endpoint"))
+        settings.set("token", "invalid")
+
+        with self.assertRaises(exceptions.RequestError):
+            with PineClient(settings, "test").batch() as batch:
+                tag = batch.get({"resource": "device_tag", "id": 1})
+        with self.assertRaises(exceptions.RequestError):
+            tag.result()
+
+    def test_04_cancels_the_operations_when_the_block_fails(self):
+        with self.assertRaises(ValueError):
+            with self.pine.batch() as batch:
+                tag = batch.get({"resource": "device_tag", "id": 1})
+                raise ValueError()
+        self.assertTrue(tag.cancelled())
+        self.assertEqual(BatchStandIn.batch_sizes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
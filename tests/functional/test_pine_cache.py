@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from balena.pine import PineClient
+from balena.settings import Settings
+
+TOKEN = "stand-in-token"
+OTHER_TOKEN = "other-stand-in-token"
+
+
+class CacheStandIn(BaseHTTPRequestHandler):
+    """
+    Local stand-in of an OData service keeping device types in memory, which can also be changed behind the
+    back of the clients, e.g. by the dashboard.
+    The user of each token is answered with a Last-Modified header only, and any conditional request for it
+    is answered with a 304.
+    """
+
+    device_types = {}
+    users = {TOKEN: "alice", OTHER_TOKEN: "bob"}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/v7/user":
+            return self.__reply_user()
+        match = self.__match()
+        if match is None:
+            return
+        CacheStandIn.requests.append(("GET", self.path))
+        self.__reply(200, {"d": [dt for id, dt in sorted(self.device_types.items()) if match in (None, id)]})
+
+    def do_PATCH(self):
+        match = self.__match()
+        if match is None:
+            return
+        CacheStandIn.requests.append(("PATCH", self.path))
+        self.device_types[match].update(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        self.__reply(200, "OK")
+
+    def __match(self):
+        match = re.match(r"^/v7/device_type(?:\((\d+)\))?(?:\?.*)?$", self.path)
+        if match is None or self.headers.get("Authorization") != f"Bearer {TOKEN}":
+            self.__reply(404, "Not found")
+            return None
+        return int(match.group(1)) if match.group(1) is not None else None
+
+    def __reply_user(self):
+        CacheStandIn.requests.append(("GET", self.path))
+        if self.headers.get("If-Modified-Since") is not None:
+            self.send_response(304)
+            self.end_headers()
+            return
+        username = self.users[self.headers["Authorization"].replace("Bearer ", "")]
+        self.__reply(200, {"d": [{"username": username}]}, {"Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"})
+
+    def __reply(self, status, result, headers={}):
+        content = json.dumps(result).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class TestPineCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), CacheStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        CacheStandIn.device_types.clear()
+        CacheStandIn.device_types[1] = {"id": 1, "slug": "raspberrypi3", "name": "Raspberry Pi 3"}
+        CacheStandIn.requests.clear()
+        self.cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_directory)
+
+    def __create_client(self, token=TOKEN, **settings_config):
+        settings = Settings({"data_directory": False, **settings_config})
+        settings.set("api_endpoint", f"http://127.0.0.1:{self.server.server_address[1]}/")
+        settings.set("cache_directory", self.cache_directory)
+        settings.set("token", token)
+        return PineClient(settings, "test"), settings
+
+    def __get_name(self, pine):
+        return pine.get({"resource": "device_type", "id": 1, "options": {"$select": "name"}})["name"]
+
+    def test_01_sees_changes_of_other_clients_by_default(self):
+        pine, _ = self.__create_client()
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3")
+
+        CacheStandIn.device_types[1]["name"] = "Raspberry Pi 3 (using 32bit OS)"
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3 (using 32bit OS)")
+        self.assertEqual(len(CacheStandIn.requests), 2)
+
+    def test_02_drops_the_shared_entries_on_writes_of_other_clients(self):
+        pine, _ = self.__create_client(resource_cache_enabled=True)
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3")
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3")
+        self.assertEqual(len(CacheStandIn.requests), 1)
+
+        # another client sharing the cache directory, e.g. another process
+        other_pine, _ = self.__create_client(resource_cache_enabled=True)
+        other_pine.patch({"resource": "device_type", "id": 1, "body": {"name": "Raspberry Pi 3 (using 32bit OS)"}})
+
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3 (using 32bit OS)")
+        self.assertEqual([method for method, _ in CacheStandIn.requests], ["GET", "PATCH", "GET"])
+
+    def test_03_keeps_the_cached_responses_of_each_actor_apart(self):
+        pine, settings = self.__create_client(response_cache_on_disk=True)
+        self.assertEqual(pine.get({"resource": "user"})[0]["username"], "alice")
+        self.assertEqual(pine.get({"resource": "user"})[0]["username"], "alice")
+        self.assertEqual(pine.get_transfer_stats()["not_modified"], 1)
+
+        # another actor sharing the disk tier, e.g. another process
+        other_pine, _ = self.__create_client(OTHER_TOKEN, response_cache_on_disk=True)
+        self.assertEqual(other_pine.get({"resource": "user"})[0]["username"], "bob")
+        self.assertEqual(other_pine.get_transfer_stats()["not_modified"], 0)
+
+        # switching accounts
+        settings.set("token", OTHER_TOKEN)
+        self.assertEqual(pine.get({"resource": "user"})[0]["username"], "bob")
+        settings.set("token", TOKEN)
+        self.assertEqual(pine.get({"resource": "user"})[0]["username"], "alice")
+
+    def test_04_runs_the_requests_when_the_resource_cache_fails(self):
+        pine, _ = self.__create_client(resource_cache_enabled=True)
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3")
+
+        # e.g. a corrupt database, or one another process keeps locked
+        connection = sqlite3.connect(os.path.join(self.cache_directory, "resources.db"))
+        connection.execute("DROP TABLE entry")
+        connection.close()
+
+        pine.patch({"resource": "device_type", "id": 1, "body": {"name": "Raspberry Pi 3 (using 32bit OS)"}})
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3 (using 32bit OS)")
+        self.assertEqual(self.__get_name(pine), "Raspberry Pi 3 (using 32bit OS)")
+        self.assertEqual([method for method, _ in CacheStandIn.requests], ["GET", "PATCH", "GET", "GET"])
+        pine.clear_cache()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from balena.pine import PineClient
+from balena.settings import Settings
+
+DEVICE_TYPES = [{"id": i, "slug": f"device-type-{i}", "name": f"Device type {i}"} for i in range(100)]
+COMPRESSION_THRESHOLD = 1000
+
+
+def _deflate(data, wbits):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+# Content-Encoding answered by the stand-in, and how its body is encoded
+ENCODINGS = {
+    "identity": lambda data: data,
+    "gzip": gzip.compress,
+    # zlib wrapped, as the RFC mandates
+    "deflate": lambda data: _deflate(data, zlib.MAX_WBITS),
+    # raw deflate, as some servers send it
+    "raw-deflate": lambda data: _deflate(data, -zlib.MAX_WBITS),
+}
+
+
+class TransferStandIn(BaseHTTPRequestHandler):
+    """
+    Local stand-in of an OData service which answers device types encoded with `encoding`, and records the
+    headers and the bodies of the requests as received on the wire.
+    """
+
+    protocol_version = "HTTP/1.1"
+    encoding = "identity"
+    received = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        TransferStandIn.received.append((dict(self.headers), b""))
+        body = ENCODINGS[self.encoding](json.dumps({"d": DEVICE_TYPES}).encode())
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.encoding != "identity":
+            self.send_header("Content-Encoding", self.encoding.replace("raw-", ""))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PATCH(self):
+        TransferStandIn.received.append((dict(self.headers), self.rfile.read(int(self.headers["Content-Length"]))))
+        self.__reply(b"OK")
+
+    def do_POST(self):
+        TransferStandIn.received.append((dict(self.headers), self.rfile.read(int(self.headers["Content-Length"]))))
+        self.__reply(json.dumps({"id": 1}).encode())
+
+    def __reply(self, body):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestPineTransfer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), TransferStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        TransferStandIn.received.clear()
+        settings = Settings(
+            {
+                "data_directory": False,
+                "request_compression_threshold": str(COMPRESSION_THRESHOLD),
+                "response_cache_size": "0",
+            }
+        )
+        settings.set("api_endpoint", f"http://127.0.0.1:{self.server.server_address[1]}/")
+        settings.set("token", "stand-in-token")
+        self.pine = PineClient(settings, "test")
+
+    def test_decompresses_responses(self):
+        content = json.dumps({"d": DEVICE_TYPES}).encode()
+        for encoding, encode in ENCODINGS.items():
+            with self.subTest(encoding=encoding):
+                TransferStandIn.encoding = encoding
+                self.pine.reset_transfer_stats()
+                self.assertEqual(self.pine.get({"resource": "device_type"}), DEVICE_TYPES)
+
+                stats = self.pine.get_transfer_stats()
+                self.assertEqual(stats["requests"], 1)
+                self.assertEqual(stats["wire_bytes_received"], len(encode(content)))
+                self.assertEqual(stats["content_bytes_received"], len(content))
+                self.assertEqual(TransferStandIn.received[-1][0]["Accept-Encoding"], "gzip, deflate")
+        TransferStandIn.encoding = "identity"
+
+    def test_compresses_request_bodies_above_the_threshold(self):
+        small_body = {"name": "Raspberry Pi"}
+        large_body = {"name": "Raspberry Pi" * COMPRESSION_THRESHOLD}
+        for body, compressed in [(small_body, False), (large_body, True)]:
+            with self.subTest(compressed=compressed):
+                self.pine.reset_transfer_stats()
+                self.pine.patch({"resource": "device_type", "id": 1, "body": body})
+
+                headers, received = TransferStandIn.received[-1]
+                content = json.dumps(body).encode()
+                self.assertEqual(headers.get("Content-Encoding"), "gzip" if compressed else None)
+                self.assertEqual(gzip.decompress(received) if compressed else received, content)
+
+                stats = self.pine.get_transfer_stats()
+                self.assertEqual(stats["content_bytes_sent"], len(content))
+                self.assertEqual(stats["wire_bytes_sent"], len(received))
+                if compressed:
+                    self.assertLess(stats["wire_bytes_sent"], stats["content_bytes_sent"] / 10)
+
+    def test_counts_multipart_request_bodies(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "asset.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(4096))
+
+        with open(path, "rb") as f:
+            self.pine.post({"resource": "release_asset", "body": {"asset_key": "asset.bin", "asset": f}})
+
+        headers, received = TransferStandIn.received[-1]
+        self.assertTrue(headers["Content-Type"].startswith("multipart/form-data"))
+        stats = self.pine.get_transfer_stats()
+        self.assertGreater(len(received), 4096)
+        self.assertEqual(stats["content_bytes_sent"], len(received))
+        self.assertEqual(stats["wire_bytes_sent"], len(received))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from balena import exceptions
+from balena.rollout import OsUpdateRollout
+
+TARGET_OS_VERSION = "6.0.10"
+
+
+class FakeFleet:
+    """
+    Devices whose update advances on every poll, by the given steps of provisioning progress, or fails.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.devices = {
+            uuid: {
+                "uuid": uuid,
+                "status": "Idle",
+                "provisioning_state": "",
+                "provisioning_progress": None,
+                "is_online": True,
+                "os_version": "balenaOS 5.3.21",
+            }
+            for uuid in steps
+        }
+        self.started = []
+
+    def fetch_devices(self, uuids):
+        for uuid in uuids:
+            if uuid in self.started and self.steps[uuid]:
+                step = self.steps[uuid].pop(0)
+                if step == "done":
+                    self.devices[uuid].update({"status": "Idle", "os_version": f"balenaOS {TARGET_OS_VERSION}"})
+                elif step == "fail":
+                    self.devices[uuid].update({"status": "Idle", "provisioning_state": "OS update failed"})
+                else:
+                    self.devices[uuid].update({"status": "Updating", "provisioning_progress": step})
+        return {uuid: dict(self.devices[uuid]) for uuid in uuids if uuid in self.devices}
+
+    def start_update(self, uuid):
+        self.started.append(uuid)
+
+    def run(self, uuids, target_os_version=TARGET_OS_VERSION, **options):
+        return OsUpdateRollout(
+            target_os_version,
+            self.fetch_devices,
+            lambda device, online: None,
+            self.start_update,
+            self.get_update_status,
+            poll_interval=0.01,
+            **options,
+        ).run(uuids)
+
+    @staticmethod
+    def get_update_status(device):
+        if device["os_version"] == f"balenaOS {TARGET_OS_VERSION}":
+            return "succeeded"
+        if "fail" in device["provisioning_state"]:
+            return "failed"
+        return None
+
+
+class TestOsUpdateRollout(unittest.TestCase):
+    def test_fails_stalled_updates_early(self):
+        # the first device keeps reporting the same progress, the second one keeps progressing
+        fleet = FakeFleet({"a": [10] * 1000, "b": list(range(30)) + ["done"]})
+        state = fleet.run(["a", "b"], stall_timeout=0.2, update_timeout=60, min_failure_sample=10)
+
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(state["failed"], {"a": "OS update stalled"})
+        self.assertEqual(state["succeeded"], ["b"])
+        self.assertEqual(state["update_progress"], {})
+
+    def test_only_pauses_from_the_minimum_sample_on(self):
+        steps = {"a": ["fail"], "b": [50, "done"], "c": [50, "done"], "d": [50, "done"], "e": [50, "done"]}
+
+        # the first failure of the wave does not pause the rollout, the failure rate of the wave does
+        fleet = FakeFleet({uuid: list(device_steps) for uuid, device_steps in steps.items()})
+        state = fleet.run(list(steps), wave_size=4, failure_threshold=0.2)
+        self.assertEqual(state["status"], "paused")
+        self.assertEqual(sorted(state["succeeded"]), ["b", "c", "d"])
+        self.assertEqual(list(state["failed"]), ["a"])
+        self.assertEqual(state["pending"], ["e"])
+
+        # the same failure rate below the minimum sample does not pause the rollout
+        fleet = FakeFleet({uuid: list(device_steps) for uuid, device_steps in steps.items()})
+        state = fleet.run(list(steps), wave_size=4, failure_threshold=0.2, min_failure_sample=10)
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(sorted(state["succeeded"]), ["b", "c", "d", "e"])
+
+        # a minimum sample of one update pauses on the first failure
+        fleet = FakeFleet({uuid: list(device_steps) for uuid, device_steps in steps.items()})
+        state = fleet.run(list(steps), wave_size=4, failure_threshold=0.2, min_failure_sample=1)
+        self.assertEqual(state["status"], "paused")
+        self.assertEqual(list(state["failed"]), ["a"])
+        self.assertEqual(sorted(state["in_progress"]), ["b", "c", "d"])
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestOsUpdateRolloutState(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.state_path = os.path.join(directory, "rollout.json")
+
+    def test_resumes_interrupted_rollouts(self):
+        fleet = FakeFleet({uuid: [50, "done"] for uuid in ["a", "b", "c", "d"]})
+
+        def interrupt(state):
+            raise Interrupted()
+
+        # interrupted once the first wave was started
+        with self.assertRaises(Interrupted):
+            fleet.run(["a", "b", "c", "d"], wave_size=2, state_path=self.state_path, progress=interrupt)
+        with open(self.state_path) as f:
+            saved = json.load(f)
+        self.assertEqual(saved["status"], "running")
+        self.assertEqual(sorted(saved["in_progress"]), ["a", "b"])
+        self.assertEqual(saved["pending"], ["c", "d"])
+
+        # the given devices are ignored in favor of the saved state
+        state = fleet.run(["e"], wave_size=2, state_path=self.state_path)
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(sorted(state["succeeded"]), ["a", "b", "c", "d"])
+        self.assertEqual(sorted(fleet.started), ["a", "b", "c", "d"])
+        with open(self.state_path) as f:
+            self.assertEqual(json.load(f), state)
+
+    def test_resets_the_failure_rate_when_resuming_a_paused_rollout(self):
+        steps = {"a": ["fail"], "b": [50, "done"], "c": [50, "done"], "d": [50, "done"], "e": ["fail"]}
+        fleet = FakeFleet(steps)
+        options = {"wave_size": 4, "failure_threshold": 0.2, "state_path": self.state_path}
+
+        state = fleet.run(list(steps), **options)
+        self.assertEqual(state["status"], "paused")
+        self.assertEqual(state["pending"], ["e"])
+
+        # the failures so far are accepted, a single failure of the next wave is below its minimum sample
+        state = fleet.run([], **options)
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(state["resumed_at"], [3, 1])
+        self.assertEqual(sorted(state["succeeded"]), ["b", "c", "d"])
+        self.assertEqual(sorted(state["failed"]), ["a", "e"])
+        self.assertEqual(sorted(fleet.started), ["a", "b", "c", "d", "e"])
+
+        # a completed rollout is not started again
+        self.assertEqual(fleet.run(list(steps), **options)["status"], "completed")
+        self.assertEqual(len(fleet.started), 5)
+
+    def test_rejects_the_state_of_another_target_version(self):
+        fleet = FakeFleet({"a": [50, "done"]})
+        fleet.run(["a"], state_path=self.state_path)
+
+        with self.assertRaises(exceptions.OsUpdateError):
+            fleet.run(["a"], target_os_version="7.0.0", state_path=self.state_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
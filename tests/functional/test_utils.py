@@ -0,0 +1,115 @@
+import itertools
+import random
+import unittest
+
+from semver.version import Version
+
+from balena.utils import compile_semver_range, get_semver_precedence
+
+# range, versions it matches, versions it does not match
+SEMVER_RANGE_CASES = [
+    # x-ranges
+    ("*", ["0.0.0", "2.88.4", "3.0.0-rc1"], []),
+    (
+        "2.x",
+        ["2.0.0", "2.88.4+rev1", "2.99.99", "2.1.0-rc1"],
+        ["1.99.99", "2.0.0-rc1", "3.0.0-0", "3.0.0-rc1", "3.0.0"],
+    ),
+    ("2.88.x", ["2.88.0", "2.88.4", "2.88.5-rc1"], ["2.88.0-rc1", "2.89.0-0", "2.89.0-rc1", "2.89.0", "2.87.9"]),
+    ("2.88.*", ["2.88.4"], ["2.89.0-rc1"]),
+    ("2", ["2.0.0", "2.5.0"], ["3.0.0-rc1", "3.0.0"]),
+    ("2.X.x", ["2.1.0"], ["3.0.0-rc1"]),
+    (">=2.x", ["2.0.0", "3.0.0-rc1", "3.0.0"], ["1.99.99", "2.0.0-rc1"]),
+    (">2.x", ["3.0.0-0", "3.0.0-rc1", "3.0.0"], ["2.99.99"]),
+    ("<=2.x", ["2.99.99", "1.0.0"], ["3.0.0-0", "3.0.0-rc1", "3.0.0"]),
+    ("<2.x", ["1.99.99", "2.0.0-rc1"], ["2.0.0"]),
+    ("!=2.x", ["1.99.99", "3.0.0-rc1", "3.0.0"], ["2.0.0", "2.99.99"]),
+    # caret
+    ("^2.88.0", ["2.88.0", "2.88.4+rev1", "2.99.0", "2.90.0-rc1"], ["2.87.9", "2.88.0-rc1", "3.0.0-0", "3.0.0-rc1"]),
+    ("^0.2.3", ["0.2.3", "0.2.9"], ["0.2.2", "0.3.0-0", "0.3.0-rc1", "0.3.0"]),
+    ("^0.0.3", ["0.0.3"], ["0.0.2", "0.0.4-0", "0.0.4"]),
+    ("^0.0.0", ["0.0.0"], ["0.0.1-rc1", "0.0.1"]),
+    ("^2.88.0-rc1", ["2.88.0-rc1", "2.88.0-rc2", "2.88.0"], ["2.88.0-beta", "3.0.0-rc1"]),
+    ("^2.x", ["2.0.0", "2.99.0"], ["1.99.99", "3.0.0-rc1"]),
+    ("^2.88", ["2.88.0", "2.99.0"], ["2.87.9", "3.0.0-rc1"]),
+    ("^0.x", ["0.0.0", "0.99.0"], ["1.0.0-rc1"]),
+    ("^0.0", ["0.0.0", "0.0.99"], ["0.1.0-rc1"]),
+    ("^*", ["0.0.0", "3.0.0"], []),
+    # tilde
+    ("~2.88.0", ["2.88.0", "2.88.4+rev1", "2.88.5-rc1"], ["2.87.9", "2.88.0-rc1", "2.89.0-0", "2.89.0-rc1"]),
+    ("~0.2.3", ["0.2.3", "0.2.9"], ["0.3.0-rc1"]),
+    ("~2.88", ["2.88.0", "2.88.9"], ["2.89.0-rc1", "2.89.0"]),
+    ("~2", ["2.0.0", "2.99.0"], ["3.0.0-rc1", "3.0.0"]),
+    ("~2.88.0-rc1", ["2.88.0-rc1", "2.88.0"], ["2.88.0-beta", "2.89.0-rc1"]),
+    ("~ 2.88.0", ["2.88.4"], ["2.89.0"]),
+    # comparators
+    ("2.88.4", ["2.88.4", "2.88.4+rev1"], ["2.88.4-rc1", "2.88.5"]),
+    ("v2.88.4", ["2.88.4"], ["2.88.5"]),
+    ("=2.88.4", ["2.88.4"], ["2.88.3"]),
+    ("==2.88.4", ["2.88.4"], ["2.88.3"]),
+    ("!=2.88.4", ["2.88.3", "2.88.4-rc1"], ["2.88.4", "2.88.4+rev1"]),
+    (">=2.88.4", ["2.88.4", "3.0.0-rc1"], ["2.88.4-rc1", "2.88.3"]),
+    (">2.88.4", ["2.88.5-rc1", "2.88.5"], ["2.88.4", "2.88.4+rev2"]),
+    ("<=2.88.4", ["2.88.4", "2.88.4-rc1"], ["2.88.5-0"]),
+    ("<2.88.4", ["2.88.4-rc1", "2.88.3"], ["2.88.4"]),
+    (">= 2.80.0 < 2.90.0", ["2.80.0", "2.89.9", "2.90.0-rc1"], ["2.79.9", "2.80.0-rc1", "2.90.0"]),
+    (">=2.80.0 <2.90.0 || 3.x", ["2.88.4+rev1", "3.1.0"], ["2.90.0", "4.0.0-rc1"]),
+    ("<1.0.0-rc.2", ["1.0.0-rc.1", "1.0.0-rc.1.x", "1.0.0-beta"], ["1.0.0-rc.2", "1.0.0-rc.10", "1.0.0"]),
+]
+
+INVALID_SEMVER_RANGES = ["", "||", "2.x.1", "2.88.4.1", ">=abc", "^x.1", "~2.88.0.0", "1.2.3.x"]
+
+
+class TestUtils(unittest.TestCase):
+    def test_compile_semver_range(self):
+        for version_range, matching, not_matching in SEMVER_RANGE_CASES:
+            matches = compile_semver_range(version_range)
+            for version in matching:
+                with self.subTest(version_range=version_range, version=version):
+                    self.assertTrue(matches(get_semver_precedence(version)))
+            for version in not_matching:
+                with self.subTest(version_range=version_range, version=version):
+                    self.assertFalse(matches(get_semver_precedence(version)))
+
+    def test_compile_semver_range_rejects_invalid_ranges(self):
+        for version_range in INVALID_SEMVER_RANGES:
+            with self.subTest(version_range=version_range):
+                with self.assertRaises(ValueError):
+                    compile_semver_range(version_range)
+
+    def test_compile_semver_range_parity(self):
+        # comparators should match the same versions as Version.match, which ranges were matched with before
+        rng = random.Random(0)
+        parts = [0, 1, 2, 9, 10]
+        prereleases = ["", "-0", "-rc1", "-rc.1", "-rc.10", "-alpha.beta", "-1"]
+        versions = [
+            f"{major}.{minor}.{patch}{prerelease}"
+            for major, minor, patch, prerelease in itertools.product(parts, parts, parts, prereleases)
+        ]
+        for _ in range(200):
+            bound = rng.choice(versions)
+            for operator in ("==", "!=", ">=", ">", "<=", "<"):
+                matches = compile_semver_range(f"{operator}{bound}")
+                for version in rng.sample(versions, 50) + [bound]:
+                    with self.subTest(version_range=f"{operator}{bound}", version=version):
+                        self.assertEqual(
+                            matches(get_semver_precedence(version)),
+                            Version.parse(version).match(f"{operator}{bound}"),
+                        )
+
+        # x-ranges should match the same versions as the previous minor range check, but for the pre-releases
+        # of the next version
+        for major, minor in itertools.product(parts, parts):
+            matches = compile_semver_range(f"{major}.{minor}.x")
+            max_version = str(Version.parse(f"{major}.{minor}.0").next_version("minor"))
+            for version in versions:
+                parsed_version = Version.parse(version)
+                expected = parsed_version.match(f">={major}.{minor}.0") and parsed_version.match(f"<{max_version}")
+                if parsed_version.prerelease and parsed_version.finalize_version() == Version.parse(max_version):
+                    expected = False
+                with self.subTest(version_range=f"{major}.{minor}.x", version=version):
+                    self.assertEqual(matches(get_semver_precedence(version)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()